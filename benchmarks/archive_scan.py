@@ -0,0 +1,92 @@
+# archive_scan.py
+# -*- coding: utf-8 -*-
+"""
+量測封存檔的寫入與串流分析。
+
+先以 Archiver 寫入 N 場隨機產生的對局（預設 1000000 場），
+再用 ArchiveReader 掃過全部 segment，計算「第一個道具的勝率」與「獲勝所需猜測次數分布」，
+回報寫入 / 掃描速度、檔案大小，以及掃描前後的 RSS（確認記憶體不隨場數成長）。
+
+用法：python benchmarks/archive_scan.py [--games N] [--dir 目錄]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from package.admission import rss_mb  # noqa: E402
+from package.archive import Archiver, ArchiveReader, guesses_to_win, win_rate_by_first_tool  # noqa: E402
+from package.game import Game  # noqa: E402
+from package.player import Player  # noqa: E402
+
+TOOLS = list(Game.TOOL_CARDS)
+
+
+def fake_game(rng):
+    game = Game.__new__(Game)
+    game.players = [Player("p%d" % i) for i in range(2)]
+    game.events = []
+    game.round = 1
+    winner = None
+    while winner is None and game.round < Game.MAX_ROUNDS:
+        for idx, player in enumerate(game.players):
+            target = game.players[1 - idx]
+            game.record("TOOL", player, target, rng.choice(TOOLS + [""]))
+            a = rng.randint(0, 4) if rng.random() < 0.9 else 4
+            game.record("GUESS", player, target, "".join(rng.sample("0123456789", 4)), a, 4 - a)
+            if a == 4:
+                winner = player
+                break
+        game.round += 1
+    return game, winner
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=1000000)
+    parser.add_argument("--dir", default=None, help="封存目錄，預設為暫存目錄並在結束後刪除")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="archive_scan")
+    try:
+        rng = random.Random(1)
+        # 先產生一批樣本重複使用，量測只反映封存本身
+        samples = [fake_game(rng) for _ in range(1000)]
+        archiver = Archiver(directory, batch_games=1024)
+        start = time.time()
+        for i in range(args.games):
+            game, winner = samples[i % len(samples)]
+            archiver.submit(i, game, winner)
+        archiver.close()
+        write_seconds = time.time() - start
+        size = sum(os.path.getsize(p) for p in ArchiveReader(directory).segments())
+
+        reader = ArchiveReader(directory)
+        rss_before = rss_mb()
+        start = time.time()
+        tools = win_rate_by_first_tool(reader.games())
+        counts = guesses_to_win(reader.games())
+        scan_seconds = time.time() - start
+        rss_after = rss_mb()
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print("games: %d, segment bytes: %d (%.1f bytes/game)" % (args.games, size, float(size) / args.games))
+    print("write: %.3f seconds, %.0f games/sec" % (write_seconds, args.games / write_seconds))
+    print("scan (2 passes): %.3f seconds, %.0f games/sec" % (scan_seconds, 2 * args.games / scan_seconds))
+    print("rss: %.1f MB before scan, %.1f MB after" % (rss_before, rss_after))
+    for tool, (wins, plays) in sorted(tools.items()):
+        print("  first tool %-10s win rate %.3f (%d games)" % (tool, float(wins) / plays, plays))
+    print("  guesses to win: %s" % ", ".join("%d:%d" % item for item in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
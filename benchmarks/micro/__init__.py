@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+每回合熱路徑的微基準測試。
+
+  - cases.py：各項操作與輸入大小（歷史紀錄長度、牌堆狀態）
+  - __main__.py：量測、與 baseline.json 比較，變慢超過門檻時以 exit code 1 結束
+
+每項結果都除以同一台機器上校正迴圈的耗時，不同機器的數字才能互相比較。
+
+用法：
+  python -m benchmarks.micro                    # 與 baseline 比較
+  python -m benchmarks.micro --update-baseline  # 以本次結果更新 baseline
+  python -m benchmarks.micro --filter draw --threshold 15
+"""
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+執行微基準測試並與 baseline.json 比較。
+
+每項操作與校正工作量各自找出讓一批耗時超過 --min-time 的次數，再交替各跑 --repeat 批，
+每一輪以「操作每次耗時 / 校正每次耗時」得到一個比值，取中位數作為正規化分數（與機器速度無關）。
+正規化分數比 baseline 高出 threshold 百分比以上視為變慢。
+正規化分數低於 SMALL_SCORE（不到校正工作量 1% 的操作，通常每次不到 1 微秒）
+受計時誤差與排程影響較大：以 3 倍的 --repeat 重新量測，並改用較寬的 --small-threshold。
+
+校正工作量與被量測的操作同類（JSON 編解碼、亂數洗牌、list / dict / 字串操作），
+機器變慢時兩者變慢的比例相近；兩者緊接著量測，量測途中 CPU 頻率或負載的變化會同時反映在分子與分母上。
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from benchmarks.micro import cases  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 25.0
+# 分數低於 SMALL_SCORE 的操作以 SMALL_REPEAT 倍的輪數量測，門檻預設為 DEFAULT_SMALL_THRESHOLD
+SMALL_SCORE = 0.01
+SMALL_REPEAT = 3
+DEFAULT_SMALL_THRESHOLD = 40.0
+
+
+_CALIBRATION_STATE = {
+    "players": [{"name": "p%d" % i, "answer": list("0123"), "number_hand": list("01234567"),
+                 "tool_hand": ["POS", "SHUFFLE"], "best_A": i % 4, "best_B": i % 3,
+                 "action_histories": [{"action": "RESULT %d %d\n" % (j % 4, j % 3)} for j in range(20)]}
+                for i in range(4)],
+    "events": [[r, r % 4, "GUESS", (r + 1) % 4, "0123", r % 4, r % 3] for r in range(40)],
+    "round": 10,
+}
+_CALIBRATION_DECK = [str(i % 10) for i in range(80)]
+
+
+def calibration_workload():
+    """
+    固定的工作量，組成仿照被量測的操作，代表這台機器跑這類程式碼的速度。
+    不呼叫 package 中的程式，被量測的程式碼變慢時分母不會跟著變。
+    """
+    text = json.dumps(_CALIBRATION_STATE)
+    state = json.loads(text)
+    rng = random.Random(1)
+    deck = list(_CALIBRATION_DECK)
+    rng.shuffle(deck)
+    hands = [deck[i:i + 8] for i in range(0, len(deck), 8)]
+    total = 0
+    for player in state["players"]:
+        copy = dict(player, action_histories=list(player["action_histories"]))
+        answer = copy["answer"]
+        for hand in hands:
+            guess = hand[:4]
+            total += sum(1 for a, g in zip(answer, guess) if a == g) + len(set(answer) & set(guess))
+    return total + len("".join(deck))
+
+
+def time_batch(func, number):
+    """:return: 連續呼叫 number 次，平均每次的秒數"""
+    start = time.time()
+    for _ in range(number):
+        func()
+    return (time.time() - start) / number
+
+
+def batch_size(func, min_time):
+    """:return: 讓一批耗時至少 min_time 秒的呼叫次數"""
+    number = 1
+    while True:
+        elapsed = time_batch(func, number) * number
+        if elapsed >= min_time:
+            return number
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed * 1.2)))
+
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def measure(func, min_time, repeat, calibration_number):
+    """
+    :return: (每次呼叫的秒數, 校正工作量每次的秒數, 正規化分數)，皆為 repeat 輪的中位數
+    """
+    number = batch_size(func, min_time)
+    seconds, calibrations, ratios = [], [], []
+    for _ in range(repeat):
+        op = time_batch(func, number)
+        calibration = time_batch(calibration_workload, calibration_number)
+        seconds.append(op)
+        calibrations.append(calibration)
+        ratios.append(op / calibration)
+    return _median(seconds), _median(calibrations), _median(ratios)
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="以本次結果覆寫 baseline")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="變慢超過幾 %%%% 算退步，預設為 baseline 中的設定（%d）" % DEFAULT_THRESHOLD)
+    parser.add_argument("--small-threshold", type=float, default=None,
+                        help="分數低於 %s 的操作的門檻，預設為 baseline 中的設定（%d）"
+                        % (SMALL_SCORE, DEFAULT_SMALL_THRESHOLD))
+    parser.add_argument("--filter", default=None, help="只跑名稱包含此字串的項目")
+    parser.add_argument("--min-time", type=float, default=0.05, help="每批至少量測的秒數")
+    parser.add_argument("--repeat", type=int, default=9)
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    threshold = args.threshold if args.threshold is not None else baseline.get("threshold_pct", DEFAULT_THRESHOLD)
+    small_threshold = (args.small_threshold if args.small_threshold is not None
+                       else baseline.get("small_threshold_pct", DEFAULT_SMALL_THRESHOLD))
+    expected = baseline.get("results", {})
+
+    print("%-30s %-28s %12s %10s %10s %8s" % ("operation", "input", "ns/op", "score", "baseline", "change"))
+
+    results = {}
+    regressions = []
+    calibrations = []
+    calibration_number = batch_size(calibration_workload, args.min_time)
+    try:
+        for name, size, func in cases.cases():
+            key = "%s|%s" % (name, size)
+            if args.filter and args.filter not in key:
+                continue
+            seconds, calibration, score = measure(func, args.min_time, args.repeat, calibration_number)
+            small = score < SMALL_SCORE
+            if small:
+                # 第一次量測當作暖機，以更多輪重新量測
+                seconds, calibration, score = measure(func, args.min_time, args.repeat * SMALL_REPEAT,
+                                                      calibration_number)
+            calibrations.append(calibration)
+            results[key] = round(score, 6)
+            base = expected.get(key)
+            if base:
+                change = (score - base) / base * 100
+                flag = "  SLOWER" if change > (small_threshold if small else threshold) else ""
+                if flag:
+                    regressions.append((key, change))
+                print("%-30s %-28s %12.0f %10.4f %10.4f %+7.1f%%%s" % (
+                    name, size, seconds * 1e9, score, base, change, flag))
+            else:
+                print("%-30s %-28s %12.0f %10.4f %10s %8s" % (name, size, seconds * 1e9, score, "-", "new"))
+    finally:
+        cases.cleanup()
+    calibration = _median(calibrations) if calibrations else time_batch(calibration_workload, calibration_number)
+    print("calibration workload: %.1f us" % (calibration * 1e6))
+
+    if args.update_baseline:
+        if args.filter:
+            # 只更新有跑的項目
+            merged = dict(expected)
+            merged.update(results)
+            results = merged
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "threshold_pct": threshold,
+                "small_threshold_pct": small_threshold,
+                "python": platform.python_version(),
+                "calibration_us": round(calibration * 1e6, 3),
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("baseline updated: %s" % args.baseline)
+        return
+
+    if regressions:
+        print()
+        print("%d operation(s) slower than baseline by more than %.0f%% (%.0f%% for scores under %s):"
+              % (len(regressions), threshold, small_threshold, SMALL_SCORE))
+        for key, change in regressions:
+            print("  %s %+.1f%%" % (key, change))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
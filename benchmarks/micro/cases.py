@@ -0,0 +1,171 @@
+# cases.py
+# -*- coding: utf-8 -*-
+"""
+微基準測試的項目。
+
+每個 case 產生 (名稱, 輸入大小, 要量測的 callable)。會修改輸入的操作（draw、reshuffle）
+在 callable 內先還原輸入，還原的成本每次相同，不影響前後比較。
+"""
+from __future__ import unicode_literals
+
+import json
+import random
+
+from package import config
+from package.game import Game, ToolCard
+from package.player import Player
+from package.redis_store import RedisStore
+
+# to_dict / from_dict / store 的輸入大小：(玩家數, 已進行回合數)
+GAME_SIZES = ((2, 0), (2, 10), (8, 10))
+
+
+def played_game(num_players, rounds, seed=1):
+    """依 seed 打 rounds 回合（每人每回合一次道具階段與一次猜測），得到有事件與動作紀錄的 Game。"""
+    players = [Player("p%d" % i) for i in range(num_players)]
+    game = Game(players, seed=seed)
+    rng = random.Random(seed)
+    for r in range(rounds):
+        game.round = r + 1
+        for idx, player in enumerate(players):
+            target = players[(idx + 1) % num_players]
+            player.add_action_history("TOOL\n")
+            if player.tool_hand and rng.random() < 0.5:
+                game.use_tool(player, target, player.tool_hand[0])
+            else:
+                game.record("TOOL", player, target)
+            player.add_action_history("GUESS %s\n" % ",".join(player.number_hand))
+            a, b = game.make_guess(player, target, "".join(player.number_hand[:game.NUM_GUESS_DIGITS]))
+            player.add_action_history("RESULT %d %d\n" % (a, b))
+    game.round = rounds + 1
+    return game
+
+
+def _size(num_players, rounds):
+    return "players=%d,rounds=%d" % (num_players, rounds)
+
+
+def check_guess():
+    answer = list("1234")
+    for label, guess in (("miss", list("5678")), ("mixed", list("1325")), ("hit", list("1234"))):
+        yield "Game.check_guess", label, lambda guess=guess: Game.check_guess(answer, guess)
+
+
+def draw():
+    rng = random.Random(1)
+    full = Game([Player("a"), Player("b")], seed=1).number_deck
+    # 牌堆狀態：剩很多、剩不到一手、已空（要把棄牌洗回牌堆）
+    for label, deck, discard in (("deck=full", full, []),
+                                 ("deck=3", full[:3], full[3:]),
+                                 ("deck=empty", [], full)):
+        def op(deck=deck, discard=discard):
+            hand = []
+            Game.draw(hand, list(deck), list(discard), Game.MAX_NUM_HAND, rng)
+        yield "Game.draw", label, op
+
+
+def draw_up():
+    for num_players in (2, 8):
+        game = Game([Player("p%d" % i) for i in range(num_players)], seed=1)
+        player = game.players[0]
+        number_deck, tool_deck = list(game.number_deck), list(game.tool_deck)
+
+        def op(game=game, player=player, number_deck=number_deck, tool_deck=tool_deck):
+            game.number_deck[:] = number_deck
+            game.tool_deck[:] = tool_deck
+            del player.number_hand[game.NUM_GUESS_DIGITS:]
+            del player.tool_hand[1:]
+            game.draw_up(player)
+        yield "Game.draw_up", "players=%d" % num_players, op
+
+
+def reshuffle():
+    rng = random.Random(1)
+    hand = list("01234567")
+    for deck_size in (0, 40, 160):
+        deck = [str(i % 10) for i in range(deck_size)]
+
+        def op(deck=deck):
+            ToolCard.reshuffle(list(hand), list(deck), rng)
+        yield "ToolCard.reshuffle", "deck=%d" % deck_size, op
+
+
+def serialize():
+    for num_players, rounds in GAME_SIZES:
+        game = played_game(num_players, rounds)
+        yield "Game.to_dict+json.dumps", _size(num_players, rounds), lambda game=game: json.dumps(game.to_dict())
+        yield "Game.to_log+json.dumps", _size(num_players, rounds), lambda game=game: json.dumps(game.to_log())
+
+
+def restore():
+    for num_players, rounds in GAME_SIZES:
+        game = played_game(num_players, rounds)
+        snapshot = json.loads(json.dumps(game.to_dict()))
+        log = json.loads(json.dumps(game.to_log()))
+        yield "Game.from_dict(snapshot)", _size(num_players, rounds), lambda state=snapshot: Game.from_dict(state)
+        yield "Game.from_dict(log)", _size(num_players, rounds), lambda state=log: Game.from_dict(state)
+
+
+def player_to_dict():
+    # to_dict 只回傳 list 的參照，成本與歷史長度無關；隨長度成長的是序列化
+    for history in (0, 50, 500):
+        player = Player("p")
+        for i in range(history):
+            player.add_action_history("RESULT %d %d\n" % (i % 5, i % 3))
+        yield "Player.to_dict+json.dumps", "history=%d" % history, lambda player=player: json.dumps(player.to_dict())
+
+
+def redis_standin():
+    """
+    本機 Redis 連得上就用它，否則用 fakeredis；兩者都沒有時回傳 (None, None)。
+
+    :return: (名稱, StrictRedis 相容連線)
+    """
+    try:
+        import redis
+        client = redis.StrictRedis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB,
+                                   socket_connect_timeout=0.5)
+        client.ping()
+        return "redis", client
+    except Exception:
+        pass
+    try:
+        import fakeredis
+        return "fakeredis", fakeredis.FakeStrictRedis()
+    except ImportError:
+        return None, None
+
+
+# redis_store 實際使用的連線，cleanup 清的是同一個（fakeredis 每次建立都是新的空資料庫）
+_redis_client = []
+
+
+def redis_store():
+    kind, client = redis_standin()
+    if client is None:
+        return
+    _redis_client.append(client)
+    store = RedisStore(client=client)
+    for num_players, rounds in GAME_SIZES:
+        state = played_game(num_players, rounds).to_log()
+        session_id = "bench-micro-%d-%d" % (num_players, rounds)
+        store.save_game_state(session_id, state)
+        size = "%s,%s" % (kind, _size(num_players, rounds))
+        yield "RedisStore.save_game_state", size, lambda s=session_id, st=state: store.save_game_state(s, st)
+        yield "RedisStore.read_game_state", size, lambda s=session_id: store.read_game_state(s)
+
+
+ALL = (check_guess, draw, draw_up, reshuffle, serialize, restore, player_to_dict, redis_store)
+
+
+def cases():
+    for group in ALL:
+        for case in group():
+            yield case
+
+
+def cleanup():
+    while _redis_client:
+        client = _redis_client.pop()
+        for num_players, rounds in GAME_SIZES:
+            client.delete("game:bench-micro-%d-%d" % (num_players, rounds))
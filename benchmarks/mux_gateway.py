@@ -0,0 +1,264 @@
+# mux_gateway.py
+# -*- coding: utf-8 -*-
+"""
+比較玩家各自連線與經由多工閘道連線時，server 的 CPU 與記憶體用量。
+
+server 在子程序中執行（memory store、不封存、不限准入），由本程序的機器人玩家連上去打完所有對局：
+  - sockets：每位玩家一條 TCP 連線（server 端每位玩家一條讀取執行緒與一條心跳執行緒）
+  - mux：所有玩家平均分散在 --gateways 條閘道連線上
+回報完成時間、server 消耗的 CPU 秒數、RSS 高峰與執行緒數高峰。
+
+用法：python benchmarks/mux_gateway.py [--players N] [--gateways G] [--modes sockets,mux]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import selectors
+except ImportError:
+    import selectors2 as selectors
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from package import protocol  # noqa: E402
+from package.mux import MuxClient  # noqa: E402
+
+SERVER_ENV = {
+    "GAME_STORE_BACKEND": "memory",
+    "GAME_ARCHIVE_DIR": "",
+    "GAME_MAX_CONNECTIONS": "0",
+    "GAME_MAX_SESSIONS": "0",
+    "GAME_MAX_WAITING": "0",
+    "GAME_MAX_THREADS": "0",
+    "GAME_INBOUND_RATE": "1000",
+    "GAME_METRICS_LOG_INTERVAL": "0",
+    "GAME_LOAD_PUBLISH_INTERVAL": "0",
+}
+
+
+def serve(port):
+    """子程序：只跑 accept 與配對，不做暖啟動。"""
+    import server
+    manager = server.ConnectionManager("127.0.0.1", port)
+    t = threading.Thread(target=manager.match_maker)
+    t.daemon = True
+    t.start()
+    manager.serve_forever()
+
+
+class Bot(object):
+    """依收到的訊息回答：不用道具、目標與位置選第 1 個、猜手牌前幾張。"""
+    def __init__(self):
+        self.done = False
+        self.digits = 4
+
+    def reply(self, text):
+        name, args = protocol.decode(text)
+        if name == "HEARTBEAT":
+            return "HEARTBEAT_ACK"
+        if name == "VARIANT":
+            self.digits = int(args[0])
+        if name == "TOOL":
+            return "-1"
+        if name in ("TARGET", "POS"):
+            return "1"
+        if name == "GUESS":
+            return "".join(args[0][:self.digits])
+        if name in ("WINNER", "DRAW"):
+            self.done = True
+        return None
+
+
+class ProcessSampler(object):
+    """定期讀 /proc/<pid>/status 記錄執行緒數高峰。"""
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.max_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def status(self):
+        fields = {}
+        try:
+            with open("/proc/%d/status" % self.pid) as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    fields[key] = value.split()
+        except IOError:
+            pass
+        return fields
+
+    def cpu_seconds(self):
+        with open("/proc/%d/stat" % self.pid) as f:
+            parts = f.read().rsplit(")", 1)[1].split()
+        return (int(parts[11]) + int(parts[12])) / float(os.sysconf("SC_CLK_TCK"))
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            threads = int(self.status().get("Threads", [0])[0])
+            if not threads:
+                return
+            self.max_threads = max(self.max_threads, threads)
+            time.sleep(interval)
+
+    def stop_threads(self):
+        self._stop.set()
+        self._thread.join()
+        return self.max_threads
+
+    def stop(self):
+        """:return: RSS 高峰（MB）"""
+        self.stop_threads()
+        return float(self.status().get("VmHWM", [0])[0]) / 1024.0
+
+
+def run_sockets(port, num_players, prefix):
+    sel = selectors.DefaultSelector()
+    bots = {}
+    for i in range(num_players):
+        try:
+            s = socket.create_connection(("127.0.0.1", port))
+            if not s.recv(len(protocol.CHECK_ID)):
+                raise socket.error("closed before CHECK_ID")
+            s.sendall(protocol.to_bytes("%s-%d" % (prefix, i)))
+        except socket.error as e:
+            # server 撐不住（通常是執行緒數達到系統上限）：已連上的玩家照常打完
+            print("  sockets: connection %d failed: %s" % (i, e))
+            break
+        s.setblocking(False)
+        bots[s] = [Bot(), b""]
+        sel.register(s, selectors.EVENT_READ)
+
+    finished = 0
+    while bots:
+        for key, _ in sel.select(timeout=1):
+            s = key.fileobj
+            bot, buf = bots[s]
+            try:
+                data = s.recv(65536)
+            except socket.error:
+                data = b""
+            if not data:
+                finished += bot.done
+                sel.unregister(s)
+                s.close()
+                del bots[s]
+                continue
+            buf += data
+            lines = buf.split(b"\n")
+            bots[s][1] = lines.pop()
+            replies = [bot.reply(line.decode(protocol.ENCODING)) for line in lines]
+            out = b"".join(protocol.to_bytes(r) for r in replies if r)
+            if out:
+                s.setblocking(True)
+                try:
+                    s.sendall(out)
+                except socket.error:
+                    pass
+                s.setblocking(False)
+    return finished
+
+
+def run_mux(port, num_players, num_gateways, prefix):
+    bots = {}
+    remaining = threading.Semaphore(0)
+    clients = []
+
+    def on_line(client_index):
+        def handle(channel_id, text):
+            bot = bots[(client_index, channel_id)]
+            if text is None:
+                remaining.release()
+                return
+            reply = bot.reply(text)
+            if reply:
+                clients[client_index]._send(protocol.encode("DATA", channel_id, reply))
+        return handle
+
+    for g in range(num_gateways):
+        clients.append(MuxClient(("127.0.0.1", port), on_line=on_line(g)))
+    for i in range(num_players):
+        g = i % num_gateways
+        # channel id 由各 client 依序配發，先放好 bot 再 OPEN
+        bots[(g, clients[g]._next_id)] = Bot()
+        clients[g].open("%s-%d" % (prefix, i))
+    for _ in range(num_players):
+        remaining.acquire()
+    for client in clients:
+        client.close()
+    return sum(bot.done for bot in bots.values())
+
+
+def run_mode(mode, num_players, num_gateways, port):
+    env = dict(os.environ, **SERVER_ENV)
+    with open(os.devnull, "w") as devnull:
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+                                env=env, stdout=devnull, stderr=devnull)
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except socket.error:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+        sampler = ProcessSampler(proc.pid)
+        cpu_start = sampler.cpu_seconds()
+        start = time.time()
+        if mode == "sockets":
+            finished = run_sockets(port, num_players, mode)
+        else:
+            finished = run_mux(port, num_players, num_gateways, mode)
+        elapsed = time.time() - start
+        if proc.poll() is not None:
+            # server 已經結束，/proc 讀不到資料
+            print("  %s: server exited with code %s" % (mode, proc.returncode))
+            return elapsed, float("nan"), float("nan"), sampler.stop_threads(), finished
+        cpu = sampler.cpu_seconds() - cpu_start
+        peak_rss = sampler.stop()
+        return elapsed, cpu, peak_rss, sampler.max_threads, finished
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--gateways", type=int, default=4)
+    parser.add_argument("--modes", default="sockets,mux")
+    parser.add_argument("--port", type=int, default=23500)
+    parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve is not None:
+        serve(args.serve)
+        return
+
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError):
+        pass
+
+    print("%-8s %-8s %-9s %-10s %-12s %-12s %-10s" % (
+        "mode", "players", "finished", "seconds", "server cpu", "peak rss MB", "threads"))
+    for i, mode in enumerate(args.modes.split(",")):
+        elapsed, cpu, rss, threads, finished = run_mode(mode, args.players, args.gateways, args.port + i)
+        print("%-8s %-8d %-9d %-10.2f %-12.2f %-12.1f %-10d" % (
+            mode, args.players, finished, elapsed, cpu, rss, threads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# restore_throughput.py
+# -*- coding: utf-8 -*-
+"""
+量測遊戲房間的復原速度（每秒可復原幾個房間）。
+
+  - 先檢查 from_dict(to_dict(g)) 與 from_dict(to_log(g), checkpoint) 都得到與原本相同的牌局，
+    不一致時以 exit code 1 結束
+  - snapshot：Game.from_dict(to_dict()) 直接建立，對照舊做法（先洗牌發牌再覆寫）
+  - log：Game.from_dict(to_log()) 從頭重播事件，對照有 checkpoint 時只重播之後的事件
+  - store：暖啟動時從 Redis 讀回 R 個房間，逐一讀取（每個房間兩次往返）對照 read_restore_data 一次 pipeline；
+    本機 Redis 連不上時改用 fakeredis，兩者都沒有時略過
+
+用法：python benchmarks/restore_throughput.py [--rooms R] [--players N] [--rounds K]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.micro.cases import GAME_SIZES, played_game, redis_standin  # noqa: E402
+from package.game import Game  # noqa: E402
+from package.player import Player  # noqa: E402
+from package.redis_store import RedisStore  # noqa: E402
+
+
+def rebuild_restore(state_dict):
+    """舊做法：建構 Game 時先洗牌、發牌，再以存檔內容覆寫。"""
+    players = [Player(p["name"]) for p in state_dict["players"]]
+    game = Game(players)
+    for player, data in zip(players, state_dict["players"]):
+        for field in ("answer", "number_hand", "tool_hand", "best_A", "best_B", "action_histories"):
+            setattr(player, field, data[field])
+    for field in ("number_deck", "tool_deck", "discard_number", "discard_tool", "round",
+                  "MAX_ROUNDS", "NUM_GUESS_DIGITS", "current_player_idx", "seed", "events"):
+        setattr(game, field, state_dict[field])
+    return game
+
+
+def round_trip_problems():
+    """:return: 不一致的項目說明 list"""
+    problems = []
+    for num_players, rounds in GAME_SIZES:
+        for seed in range(20):
+            game = played_game(num_players, rounds, seed)
+            expected = json.loads(json.dumps(game.to_dict()))
+            label = "players=%d,rounds=%d,seed=%d" % (num_players, rounds, seed)
+
+            restored = Game.from_dict(json.loads(json.dumps(game.to_dict())))
+            if restored.to_dict() != expected:
+                problems.append("%s: from_dict(to_dict(g)) != g" % label)
+
+            # 精簡格式只保留最後一個動作紀錄，比較時以相同方式裁切
+            trimmed = copy.deepcopy(expected)
+            for p in trimmed["players"]:
+                p["action_histories"] = p["action_histories"][-1:]
+            log = json.loads(json.dumps(game.to_log()))
+            if Game.from_dict(copy.deepcopy(log)).to_dict() != trimmed:
+                problems.append("%s: from_dict(to_log(g)) != g" % label)
+
+            checkpoint = json.loads(json.dumps(played_game(num_players, rounds // 2, seed).checkpoint()))
+            if Game.from_dict(log, checkpoint=checkpoint).to_dict() != trimmed:
+                problems.append("%s: from_dict(to_log(g), checkpoint) != g" % label)
+    return problems
+
+
+def restores_per_second(func, inputs, min_time=0.5):
+    """
+    :param inputs: 每個元素是 func 參數的 JSON 字串 tuple。復原後的 Game 會持有並修改這些 dict，
+                   所以每次呼叫都用新解碼的一份，解碼不計入時間
+    """
+    count = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        batch = [[json.loads(arg) for arg in args] for args in inputs]
+        start = time.time()
+        for args in batch:
+            func(*args)
+        elapsed += time.time() - start
+        count += len(batch)
+    return count / elapsed
+
+
+def bench_store(client, rooms, num_players, rounds):
+    store = RedisStore(client=client)
+    ids = ["bench-restore-%d" % i for i in range(rooms)]
+    for i, game_session_id in enumerate(ids):
+        store.save_game_state(game_session_id, played_game(num_players, rounds, i).to_log())
+        store.save_checkpoint(game_session_id, played_game(num_players, rounds // 2, i).checkpoint())
+    try:
+        def one_by_one():
+            for game_session_id, state in store.read_game_states(ids).items():
+                Game.from_dict(state, checkpoint=store.read_checkpoint(game_session_id))
+
+        def pipelined():
+            for state, checkpoint in store.read_restore_data(ids).values():
+                Game.from_dict(state, checkpoint=checkpoint)
+
+        results = []
+        for name, func in (("read_checkpoint each", one_by_one), ("read_restore_data", pipelined)):
+            start = time.time()
+            func()
+            results.append((name, rooms / (time.time() - start)))
+        return results
+    finally:
+        client.delete(*[store._game_key(i) for i in ids] + [store._checkpoint_key(i) for i in ids])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=8)
+    args = parser.parse_args()
+
+    problems = round_trip_problems()
+    for problem in problems:
+        print("MISMATCH %s" % problem)
+    print("round trip: %d mismatches" % len(problems))
+
+    games = [played_game(args.players, args.rounds, seed) for seed in range(100)]
+    snapshots = [(json.dumps(g.to_dict()),) for g in games]
+    logs = [(json.dumps(g.to_log()),) for g in games]
+    logs_with_checkpoint = [(json.dumps(g.to_log()),
+                             json.dumps(played_game(args.players, args.rounds // 2, seed).checkpoint()))
+                            for seed, g in enumerate(games)]
+
+    print()
+    print("players=%d, rounds=%d" % (args.players, args.rounds))
+    print("%-10s %-28s %14s" % ("format", "method", "restores/sec"))
+    for fmt, method, func, inputs in (
+            ("snapshot", "rebuild then overwrite", rebuild_restore, snapshots),
+            ("snapshot", "Game.from_dict", Game.from_dict, snapshots),
+            ("log", "replay all events", Game.from_dict, logs),
+            ("log", "from checkpoint", lambda s, c: Game.from_dict(s, checkpoint=c), logs_with_checkpoint)):
+        print("%-10s %-28s %14.0f" % (fmt, method, restores_per_second(func, inputs)))
+
+    kind, client = redis_standin()
+    if client is None:
+        print("store: redis / fakeredis not available, skipped")
+    else:
+        for method, rate in bench_store(client, args.rooms, args.players, args.rounds):
+            print("%-10s %-28s %14.0f" % (kind, method, rate))
+
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
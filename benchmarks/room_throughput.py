@@ -0,0 +1,190 @@
+# room_throughput.py
+# -*- coding: utf-8 -*-
+"""
+量測單一程序能同時承載多少個遊戲房間。
+
+機器人玩家以 socketpair 連上 ConnectionManager（不經過 listener 與 Redis）：
+伺服器端走真實的 OutboundQueue 送出、LineBuffer 讀取與 Expectation 階段檢查，
+機器人端由一條 selector 執行緒讀提示並回答。
+對不同的同時房間數與房間人數，各跑到全部結束，回報每秒完成房間數與每回合平均耗時。
+每個房間的 seed 固定為房間編號，牌局可用 python -m package.replay 重現。
+另外跑一場單淘汰賽程，量測整個 bracket 的完成時間。
+
+用法：python benchmarks/room_throughput.py [房間數 ...]
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import socket
+import sys
+import threading
+import time
+
+try:
+    import selectors
+except ImportError:
+    import selectors2 as selectors
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.mux_gateway import Bot  # noqa: E402
+from server import ConnectionManager, GameSession  # noqa: E402
+from package import config, protocol  # noqa: E402
+from package.game import Game  # noqa: E402
+from package.player import Player  # noqa: E402
+from package.tournament import EliminationBracket  # noqa: E402
+
+
+class NullStore(object):
+    """不做任何事的 store，讓量測只反映遊戲邏輯本身。"""
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class NullOutput(object):
+    """
+    吞掉遊戲執行緒的 log 輸出。
+    不用 open(os.devnull)：大量執行緒同時寫同一個 TextIOWrapper 會讓 RSS 不斷上升，干擾量測。
+    """
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BotClients(object):
+    """
+    機器人 client：每位玩家一組 socketpair，伺服器端交給 ConnectionManager._init_player_connection，
+    另一端由單一 selector 執行緒讀取，以 mux_gateway.Bot 回答提示與心跳。
+    """
+    def __init__(self, manager):
+        self.manager = manager
+        self.selector = selectors.DefaultSelector()
+        t = threading.Thread(target=self._loop)
+        t.daemon = True
+        t.start()
+
+    def connect(self, player):
+        server_end, bot_end = socket.socketpair()
+        # 不經過 _handshake / try_admit，自行佔用連線名額，和 _cmd_reader 結束時的 connection_closed 對應
+        self.manager.admission.connection_opened()
+        self.manager._init_player_connection(player, server_end, ("bot", player.name))
+        bot_end.setblocking(False)
+        self.selector.register(bot_end, selectors.EVENT_READ, [Bot(), b""])
+        return player
+
+    def _loop(self):
+        while True:
+            # 其他執行緒註冊的新連線在下一次 select 才會納入
+            for key, _ in self.selector.select(timeout=0.1):
+                s = key.fileobj
+                bot, buf = key.data
+                try:
+                    data = s.recv(65536)
+                except socket.error:
+                    data = b""
+                if not data:
+                    self.selector.unregister(s)
+                    s.close()
+                    continue
+                lines = (buf + data).split(b"\n")
+                key.data[1] = lines.pop()
+                replies = [bot.reply(line.decode(protocol.ENCODING)) for line in lines]
+                out = b"".join(protocol.to_bytes(r) for r in replies if r)
+                if out:
+                    s.setblocking(True)
+                    try:
+                        s.sendall(out)
+                    except socket.error:
+                        pass
+                    s.setblocking(False)
+
+
+def bot_clients():
+    """
+    建立不對外 listen 的 ConnectionManager（port 0、記憶體 store）與機器人 client。
+    量測的是處理速度，關掉每條連線的每秒行數上限；TokenBucket 仍照常檢查。
+    """
+    config.STORE_BACKEND = "memory"
+    config.INBOUND_RATE = config.INBOUND_BURST = 10 ** 9
+    manager = ConnectionManager("127.0.0.1", 0)
+    manager.listener.close()
+    return BotClients(manager)
+
+
+def make_player(name, bots):
+    return bots.connect(Player(name))
+
+
+def run_rooms(bots, num_rooms, room_size):
+    store = NullStore()
+    done = threading.Semaphore(0)
+    turns = [0]
+
+    def on_finish(session, standings):
+        turns[0] += session.game.round * len(session.players)
+        done.release()
+
+    start = time.time()
+    for i in range(num_rooms):
+        players = [make_player("bot%d-%d" % (i, j), bots) for j in range(room_size)]
+        session = GameSession(Game(players, seed=i), store=store, on_finish=on_finish)
+        t = threading.Thread(target=session.run)
+        t.daemon = True
+        t.start()
+    for _ in range(num_rooms):
+        done.acquire()
+    elapsed = time.time() - start
+    return elapsed, turns[0]
+
+
+def run_bracket(bots, num_players, room_size):
+    store = NullStore()
+    finished = threading.Event()
+
+    def start_room(room):
+        session = GameSession(Game(room.players), store=store, keep_connections=True,
+                              on_finish=lambda s, standings: bracket.room_finished(room, standings))
+        t = threading.Thread(target=session.run)
+        t.daemon = True
+        t.start()
+
+    players = [make_player("bot%d" % i, bots) for i in range(num_players)]
+    bracket = EliminationBracket(players, start_room, room_size=room_size,
+                                 on_complete=lambda champion: finished.set())
+    start = time.time()
+    bracket.start()
+    finished.wait()
+    return time.time() - start, sum(len(r) for r in bracket.rounds)
+
+
+def main():
+    levels = [int(arg) for arg in sys.argv[1:]] or [50, 100, 200, 400]
+    results = []
+    bots = bot_clients()
+
+    # 遊戲執行緒會大量輸出 log，量測期間丟棄
+    real_stdout = sys.stdout
+    sys.stdout = NullOutput()
+    try:
+        for room_size in (2, 4, 8):
+            for num_rooms in levels:
+                elapsed, turns = run_rooms(bots, num_rooms, room_size)
+                results.append((room_size, num_rooms, elapsed, turns))
+        bracket_elapsed, bracket_rooms = run_bracket(bots, 512, 4)
+    finally:
+        sys.stdout = real_stdout
+
+    print("%-6s %-8s %-10s %-12s %-12s" % ("size", "rooms", "seconds", "rooms/sec", "us/turn"))
+    for room_size, num_rooms, elapsed, turns in results:
+        print("%-6d %-8d %-10.3f %-12.1f %-12.1f" % (
+            room_size, num_rooms, elapsed, num_rooms / elapsed, elapsed * 1e6 / max(turns, 1)))
+    print("elimination bracket: 512 players, %d rooms, %.3f seconds" % (bracket_rooms, bracket_elapsed))
+
+
+if __name__ == "__main__":
+    main()
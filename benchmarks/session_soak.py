@@ -0,0 +1,84 @@
+# session_soak.py
+# -*- coding: utf-8 -*-
+"""
+長時間跑大量對局，確認結束的房間都會從 SessionRegistry 移除、記憶體不會持續成長。
+
+以機器人玩家（經 socketpair 連上 ConnectionManager，見 room_throughput.BotClients）
+跑完 N 場（預設 100000 場），每完成 10% 記錄一次 RSS。
+暖機（前 10%）之後 RSS 成長超過 --max-growth MB 即以非 0 結束。
+
+用法：python benchmarks/session_soak.py [--matches N] [--concurrency C] [--max-growth MB]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import gc
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.room_throughput import NullOutput, NullStore, bot_clients, make_player  # noqa: E402
+from server import GameSession  # noqa: E402
+from package.admission import rss_mb  # noqa: E402
+from package.game import Game  # noqa: E402
+from package.lifecycle import SessionRegistry  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--max-growth", type=float, default=20.0)
+    options = parser.parse_args()
+
+    registry = SessionRegistry()
+    bots = bot_clients()
+    store = NullStore()
+    slots = threading.Semaphore(options.concurrency)
+    finished = [0]
+    finished_lock = threading.Lock()
+
+    def on_finish(session, standings):
+        registry.unregister(session)
+        with finished_lock:
+            finished[0] += 1
+        slots.release()
+
+    samples = []
+    step = max(1, options.matches // 10)
+    real_stdout = sys.stdout
+    sys.stdout = NullOutput()
+    start = time.time()
+    try:
+        for i in range(options.matches):
+            slots.acquire()
+            players = [make_player("soak%d-%d" % (i, j), bots) for j in range(2)]
+            session = GameSession(Game(players), store=store, on_finish=on_finish)
+            registry.register(session)
+            session.start()
+            if (i + 1) % step == 0:
+                gc.collect()
+                samples.append((i + 1, rss_mb(), len(registry)))
+        for _ in range(options.concurrency):
+            slots.acquire()
+    finally:
+        sys.stdout = real_stdout
+
+    elapsed = time.time() - start
+    print("%-10s %-10s %-10s" % ("matches", "rss(MB)", "live"))
+    for matches, rss, live in samples:
+        print("%-10d %-10.1f %-10d" % (matches, rss, live))
+    print("completed %d matches in %.1f seconds, %d sessions left registered"
+          % (finished[0], elapsed, len(registry)))
+
+    growth = samples[-1][1] - samples[0][1]
+    print("RSS growth after warm-up: %.1f MB (limit %.1f MB)" % (growth, options.max_growth))
+    if growth > options.max_growth or len(registry):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# store_latency.py
+# -*- coding: utf-8 -*-
+"""
+比較各種 store 每回合存檔的延遲。
+
+每條執行緒模擬一個房間，連續執行 N 個回合，每回合做一次 save_game_state（與 GameSession 的
+_end_turn 相同），最後讀回一次確認資料正確。回報每次存檔的 p50 / p99 / 最大延遲與整體吞吐量。
+Redis 連不上時略過。
+
+用法：python benchmarks/store_latency.py [--turns N] [--rooms R] [--backends redis,memory,sqlite]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from package import config  # noqa: E402
+from package.game import Game  # noqa: E402
+from package.player import Player  # noqa: E402
+from package.store import BACKENDS, create_store  # noqa: E402
+
+
+def percentile(samples, pct):
+    index = min(len(samples) - 1, int(len(samples) * pct / 100.0))
+    return samples[index]
+
+
+def run_backend(store, rooms, turns):
+    latencies = [[] for _ in range(rooms)]
+    errors = []
+
+    def room(i):
+        game = Game([Player("bench%d-%d" % (i, j)) for j in range(2)])
+        session_id = "bench-%d" % i
+        samples = latencies[i]
+        for turn in range(turns):
+            game.round = turn
+            state = game.to_log()
+            start = time.time()
+            store.save_game_state(session_id, state)
+            samples.append(time.time() - start)
+        if (store.read_game_state(session_id) or {}).get("round") != turns - 1:
+            errors.append(session_id)
+        store.delete_game_state(session_id)
+
+    threads = [threading.Thread(target=room, args=(i,)) for i in range(rooms)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store.flush()
+    elapsed = time.time() - start
+
+    samples = sorted(s for room_samples in latencies for s in room_samples)
+    return elapsed, samples, errors
+
+
+def open_store(backend, workdir):
+    if backend == "sqlite":
+        config.SQLITE_PATH = os.path.join(workdir, "bench.db")
+    store = create_store(backend)
+    if backend == "redis":
+        try:
+            store.r.ping()
+        except Exception as e:
+            print("redis: skipped (%s)" % e)
+            return None
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--rooms", type=int, default=8)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="store_latency")
+    results = []
+    try:
+        for backend in args.backends.split(","):
+            store = open_store(backend, workdir)
+            if store is None:
+                continue
+            elapsed, samples, errors = run_backend(store, args.rooms, args.turns)
+            store.close()
+            results.append((backend, elapsed, samples, errors))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("%-8s %-10s %-10s %-10s %-10s %-12s %s" % (
+        "backend", "seconds", "p50 us", "p99 us", "max us", "saves/sec", "errors"))
+    for backend, elapsed, samples, errors in results:
+        print("%-8s %-10.3f %-10.1f %-10.1f %-10.1f %-12.0f %d" % (
+            backend, elapsed, percentile(samples, 50) * 1e6, percentile(samples, 99) * 1e6,
+            samples[-1] * 1e6, len(samples) / elapsed, len(errors)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# variant_solver.py
+# -*- coding: utf-8 -*-
+"""
+各遊戲變體下 solver 的速度。
+
+每個變體回報：
+  - 展開整個答案空間的時間
+  - 對整個空間計分一次的速度（每秒幾個 code）：逐一呼叫 Game.check_guess、solver 純 Python、solver numpy
+  - 解題：每局從整個空間開始，每次挑一個候選答案猜、依結果刪減，直到猜中；
+    回報平均猜測次數與每局耗時（含展開）
+  - SHUFFLE 後重建候選答案的時間
+check_guess 只量測一部分 code 再換算；純 Python 只跑 --python-max 以下的空間，沒有 numpy 時略過 numpy。
+
+用法：python benchmarks/variant_solver.py [--variants classic,hard,expert,expert_repeat] [--games N]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from package import solver, variant  # noqa: E402
+from package.game import Game  # noqa: E402
+from package.solver import Candidates, CodeSpace  # noqa: E402
+
+CHECK_GUESS_SAMPLE = 20000
+
+
+def timed(func):
+    start = time.time()
+    result = func()
+    return result, time.time() - start
+
+
+def naive_rate(space, rng):
+    """逐一以 Game.check_guess 計分，每秒幾個 code。"""
+    codes, _ = space.enumerate()
+    answers = [list(space.unpack(int(codes[rng.randrange(len(codes))]))) for _ in range(CHECK_GUESS_SAMPLE)]
+    guess = space.variant.random_code(rng)
+    _, elapsed = timed(lambda: [Game.check_guess(answer, guess) for answer in answers])
+    return len(answers) / elapsed
+
+
+def score_rate(space, rng):
+    codes, masks = space.enumerate()
+    guess = space.variant.random_code(rng)
+    _, elapsed = timed(lambda: space.score(codes, masks, guess))
+    return len(codes) / elapsed
+
+
+def solve(space, rng):
+    """:return: 猜中前的猜測次數"""
+    answer = space.variant.random_code(rng)
+    candidates = Candidates(space)
+    guesses = 0
+    while True:
+        guess = candidates.pick(rng=rng)
+        guesses += 1
+        a, b = Game.check_guess(answer, list(guess))
+        if a == space.digits:
+            return guesses
+        candidates.guess(guess, a, b)
+
+
+def shuffle_time(space, rng):
+    """猜兩次後 SHUFFLE 重建候選答案的時間。"""
+    answer = space.variant.random_code(rng)
+    candidates = Candidates(space)
+    for _ in range(2):
+        guess = space.variant.random_code(rng)
+        candidates.guess(guess, *Game.check_guess(answer, guess))
+    _, elapsed = timed(candidates.shuffled)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", default="classic,hard,expert,expert_repeat")
+    parser.add_argument("--games", type=int, default=5, help="每個變體解題的局數")
+    parser.add_argument("--python-max", type=int, default=600000, help="純 Python 只跑答案數不超過此值的變體")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    backends = [False]
+    if solver.numpy is not None:
+        backends.append(True)
+    else:
+        print("numpy not installed: numpy backend skipped")
+
+    print("%-14s %-8s %10s %9s %14s %9s %12s %10s" % (
+        "variant", "backend", "codes", "enum s", "score codes/s", "speedup", "guesses/game", "s/game"))
+    for name in args.variants.split(","):
+        v = variant.get(name)
+        check_rate = None
+        for use_numpy in backends:
+            if not use_numpy and v.size > args.python_max:
+                continue
+            rng = random.Random(args.seed)
+            space = CodeSpace(v, use_numpy=use_numpy)
+            if check_rate is None:
+                check_rate = naive_rate(space, rng)
+                print("%-14s %-8s %10d %9s %14.0f %9s %12s %10s" % (
+                    name, "check", v.size, "-", check_rate, "1.0x", "-", "-"))
+            _, enum_seconds = timed(space.enumerate)
+            rate = score_rate(space, rng)
+            results, elapsed = timed(lambda: [solve(space, rng) for _ in range(args.games)])
+            print("%-14s %-8s %10d %9.3f %14.0f %8.1fx %12.1f %10.3f" % (
+                name, "numpy" if use_numpy else "python", v.size, enum_seconds, rate, rate / check_rate,
+                sum(results) / float(len(results)), elapsed / args.games))
+            print("%-14s %-8s shuffle rebuild %.3f s" % ("", "", shuffle_time(space, rng)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
 # client.py
 # -*- coding: utf-8 -*-
 from __future__ import print_function, unicode_literals
+import random
 import socket
 import threading
+import time
 from six.moves import queue
 import os
 import sys
 import uuid
 
+from package import protocol
 from package.game import Game
+from package.renderer import create_renderer
+from package.variant import CLASSIC, Variant
 
 try:
     input = raw_input  # Python 2 使用 raw_input
@@ -18,181 +23,466 @@ except NameError:
 ENCODING = sys.stdout.encoding or 'utf-8'
 ID_FILE = "player_id.txt"
 
-# 嘗試讀取或建立 UUID
-# if os.path.exists(ID_FILE):
-#     with open(ID_FILE, "r") as f:
-#         PLAYER_ID = f.read().strip()
-# else:
-#     PLAYER_ID = str(uuid.uuid4())
-#     with open(ID_FILE, "w") as f:
-#         f.write(PLAYER_ID)
+# 斷線重連：第 n 次重連前等待 0 ~ min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2^n) 秒
+RECONNECT_BASE_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+# 連續重連失敗幾次後放棄，0 表示不限
+RECONNECT_ATTEMPTS = 50
+# 連線維持超過此秒數才算恢復正常，退避次數歸零
+RECONNECT_STABLE = 10.0
+CONNECT_TIMEOUT = 10.0
 
-PLAYER_ID = 'Player2'.encode("utf-8")
+
+def load_player_id(path=ID_FILE):
+    """讀取上次使用的玩家 ID，沒有時建立新的 UUID 並寫入檔案；重連時以同一個 ID 接回原本的房間。"""
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            player_id = f.read().strip()
+        if player_id:
+            return player_id
+    player_id = str(uuid.uuid4())
+    with open(path, "w") as f:
+        f.write(player_id)
+    return player_id
+
+
+# 在 __main__ 中由 load_player_id() 設定
+PLAYER_ID = None
 
 # 用來在收到需要玩家回覆的指令時，把 prompt 推到這個隊列
 prompt_queue = queue.Queue()
+# 提示的世代：逾時或重連時遞增，玩家對舊世代提示的輸入不再送出
+prompt_generation = 0
 guess_histories = list()
+# 還在等 RESULT 的猜測紀錄在 guess_histories 中的位置，None 表示沒有
+pending_guess = None
+# 參加賽事時，單場結束後不離線，等待下一場
+in_bracket = False
+# 本局的變體（答案位數、可用數字），由 server 開局時的 VARIANT 訊息更新
+variant = CLASSIC
+renderer = create_renderer()
+
 
-def handle_message(msg):
-    parts = msg.split()
-    cmd = parts[0]
-
-    if cmd == "HAND":
-        body = msg[len("HAND "):]
-        nums, tools = body.split(";")
-        if os.name == "nt":
-            os.system("cls")
-        else:
-            os.system("clear")
+class Connection(object):
+    """
+    目前與伺服器的連線。重連時換上新的 socket，prompt_loop 一直透過同一個物件送出回答。
 
-        for history in guess_histories:
-            print(history)
+    :ivar retry_after: 伺服器在 FULL / SERVER_DRAIN 中建議的重連秒數，下一次重連以它為準
+    """
+    def __init__(self):
+        self.socket = None
+        self.retry_after = None
+        self._lock = threading.Lock()
 
-        print("你的數字手牌:", ",".join(nums.split(",")))
-        print("你的道具手牌:", ",".join(tools.split(",")) + "\n")
-        return None
+    def attach(self, sock):
+        with self._lock:
+            self.socket = sock
+            self.retry_after = None
 
-    elif cmd == "TOOL":
-        choices = [str(c + 1) for c in range(Game.MAX_TOOL_HAND)]
-        choices.append(str(-1))
-        prompt_text = u"是否使用道具卡？輸入編號或輸入 -1 跳過:\n"
-        prompt_queue.put({"type": "TOOL", "prompt": prompt_text, "choices": choices})
-        return None
+    def detach(self):
+        with self._lock:
+            sock, self.socket = self.socket, None
+        if sock is not None:
+            sock.close()
 
-    elif cmd == "USED_TOOL":
-        print("你使用了道具:", parts[1], "\n")
-        return None
+    def sendall(self, data):
+        with self._lock:
+            sock = self.socket
+        if sock is None:
+            raise socket.error("not connected")
+        sock.sendall(data)
 
-    elif cmd == "POS":
-        prompt_text = "請輸入要查看的位置 (1~4)：\n"
-        valid = [str(i) for i in range(1, Game.NUM_GUESS_DIGITS + 1)]
-        prompt_queue.put({"type": "POS", "prompt": prompt_text, "choices": valid})
-        return None
 
-    elif cmd == "POS_RESULT":
-        msg = "位置 %s 的數字是 %s" % (parts[1], parts[2])
-        guess_histories.append(msg)
-        print(msg + "\n")
+connection = Connection()
+
+
+def _prompt(item):
+    item["generation"] = prompt_generation
+    prompt_queue.put(item)
+
+
+def _open_guess(guess):
+    """
+    新增一筆等待 RESULT 的猜測紀錄。
+
+    前一筆還沒等到結果時，表示伺服器沒有收到那次猜測（斷線重連後重新要求猜測），直接換掉它。
+    """
+    global pending_guess
+    if pending_guess is not None and pending_guess == len(guess_histories) - 1:
+        guess_histories.pop()
+    guess_histories.append("%s => " % guess)
+    pending_guess = len(guess_histories) - 1
+
+dispatcher = protocol.Dispatcher(default=lambda args, msg: renderer.message(msg + "\n"))
+
+
+@dispatcher.on("VARIANT")
+def _on_variant(args, msg):
+    global variant
+    variant = Variant(int(args[0]), args[1], args[2] == "1")
+    if variant != CLASSIC:
+        renderer.message("本局答案為 %d 位，可用數字 %s%s\n" % (
+            variant.digits, variant.alphabet, "，可重複" if variant.repeats else ""))
+    return None
+
+
+@dispatcher.on("HAND")
+def _on_hand(args, msg):
+    nums, tools = args
+    renderer.set_hand(nums, tools)
+    return None
+
+
+@dispatcher.on("TOOL")
+def _on_tool(args, msg):
+    choices = [str(c + 1) for c in range(Game.MAX_TOOL_HAND)]
+    choices.append(str(-1))
+    prompt_text = u"是否使用道具卡？輸入編號或輸入 -1 跳過:\n"
+    _prompt({"type": "TOOL", "prompt": prompt_text, "choices": choices})
+    return None
+
+
+@dispatcher.on("USED_TOOL")
+def _on_used_tool(args, msg):
+    renderer.message("你使用了道具: %s \n" % args[0])
+    return None
+
+
+@dispatcher.on("POS")
+def _on_pos(args, msg):
+    prompt_text = "請輸入要查看的位置 (1~%d)：\n" % variant.digits
+    valid = [str(i) for i in range(1, variant.digits + 1)]
+    _prompt({"type": "POS", "prompt": prompt_text, "choices": valid})
+    return None
+
+
+@dispatcher.on("POS_RESULT")
+def _on_pos_result(args, msg):
+    msg = "位置 %s 的數字是 %s" % (args[0], args[1])
+    guess_histories.append(msg)
+    renderer.add_history(msg)
+    return None
+
+
+@dispatcher.on("SHUFFLE_RESULT")
+def _on_shuffle_result(args, msg):
+    msg = "打亂對方答案數字: %s" % args[0]
+    guess_histories.append(msg)
+    renderer.add_history(msg)
+    return None
+
+
+@dispatcher.on("EXCLUDE_RESULT")
+def _on_exclude_result(args, msg):
+    renderer.message("數字 %s 不在對方答案中\n" % args[0])
+    return None
+
+
+@dispatcher.on("DOUBLE_ACTIVE")
+def _on_double_active(args, msg):
+    renderer.message("雙重猜測已啟動，本回合可猜兩次\n")
+    return None
+
+
+@dispatcher.on("RESHUFFLE_DONE")
+def _on_reshuffle_done(args, msg):
+    renderer.message("已經重洗數字手牌\n")
+    return None
+
+
+@dispatcher.on("GUESS")
+def _on_guess(args, msg):
+    number_hand = args[0]
+    prompt_text = "請輸入猜測 (連續輸 %d 位數字):\n" % variant.digits
+    _prompt({"type": "GUESS", "prompt": prompt_text, "number_hand": number_hand})
+    return None
+
+
+@dispatcher.on("AUTO_GUESS")
+def _on_auto_guess(args, msg):
+    # 猜測階段逾時，伺服器代為出牌
+    _open_guess(args[0])
+    renderer.message("猜測逾時，系統代為猜 %s\n" % args[0])
+    return None
+
+
+@dispatcher.on("RESULT")
+def _on_result(args, msg):
+    global pending_guess
+    if pending_guess is None or pending_guess >= len(guess_histories):
+        # 沒有等待結果的猜測（例如重連後伺服器重送的 RESULT），忽略
         return None
+    guess_histories[pending_guess] += "%sA%sB" % (args[0], args[1])
+    renderer.add_history(guess_histories[pending_guess])
+    pending_guess = None
+    return None
+
 
-    elif cmd == "SHUFFLE_RESULT":
-        msg = "打亂對方答案數字: %s" % parts[1]
+@dispatcher.on("OPP_TOOL")
+def _on_opp_tool(args, msg):
+    msg = "%s 使用了 %s" % (args[0], args[1])
+    if args[1] == "SHUFFLE":
         guess_histories.append(msg)
-        print(msg + "\n")
-        return None
+        renderer.add_history(msg)
+    else:
+        renderer.message(msg)
+    return None
 
-    elif cmd == "EXCLUDE_RESULT":
-        print("數字 %s 不在對方答案中\n" % parts[1])
-        return None
 
-    elif cmd == "DOUBLE_ACTIVE":
-        print("雙重猜測已啟動，本回合可猜兩次\n")
-        return None
+@dispatcher.on("OPP_GUESS")
+def _on_opp_guess(args, msg):
+    renderer.message("%s 猜了 %s => %sA%sB\n" % (args[0], args[1], args[2], args[3]))
+    return None
 
-    elif cmd == "RESHUFFLE_DONE":
-        print("已經重洗數字手牌\n")
-        return None
 
-    elif cmd == "GUESS":
-        number_hand = parts[1]
-        prompt_text = "請輸入猜測 (連續輸 4 位數字):\n"
-        prompt_queue.put({"type": "GUESS", "prompt": prompt_text, "number_hand": number_hand})
-        return None
+@dispatcher.on("TARGET")
+def _on_target(args, msg):
+    names = args[0]
+    lines = ["[%d] %s" % (i + 1, name) for i, name in enumerate(names)]
+    prompt_text = u"請選擇要猜的對象：\n%s\n" % "\n".join(lines)
+    choices = [str(i + 1) for i in range(len(names))]
+    _prompt({"type": "TARGET", "prompt": prompt_text, "choices": choices})
+    return None
 
-    elif cmd == "RESULT":
-        print("你的結果: %sA%sB\n" % (parts[1], parts[2]))
-        guess_histories[-1] += "%sA%sB" % (parts[1], parts[2])
-        return None
 
-    elif cmd == "OPP_TOOL":
-        msg = "%s 使用了 %s" % (parts[1], parts[2])
-        print(msg)
-        if parts[2] == "SHUFFLE":
-            guess_histories.append(msg)
-        return None
+@dispatcher.on("OPP_TARGET")
+def _on_opp_target(args, msg):
+    renderer.message("%s 正在猜 %s 的答案\n" % (args[0], args[1]))
+    return None
 
-    elif cmd == "OPP_GUESS":
-        print("%s 猜了 %s => %sA%sB\n" % (parts[1], parts[2], parts[3], parts[4]))
-        return None
 
-    elif cmd == "WINNER":
-        print("遊戲結束，勝利者：", parts[1], "\n")
-        if os.path.exists(ID_FILE):
-            os.remove(ID_FILE)
-        return str("exit")
+@dispatcher.on("DEADLINE")
+def _on_deadline(args, msg):
+    renderer.message("%s 的 %s 階段限時 %s 秒" % (args[0], args[1], args[2]))
+    return None
 
-    elif cmd == "DRAW":
-        print("遊戲結束，平局！\n")
-        if os.path.exists(ID_FILE):
-            os.remove(ID_FILE)
-        return str("exit")
 
-    elif cmd == "DISCONNECTED":
-        print("%s 失去連線...\n" % parts[1])
-        return None
+@dispatcher.on("TIMEOUT")
+def _on_timeout(args, msg):
+    # 還在等玩家輸入的提示已失效，晚到的輸入不能被當成下一個階段的回答
+    _expire_prompts()
+    renderer.message("%s 階段已逾時，系統自動代為處理\n" % args[0])
+    return None
+
+
+@dispatcher.on("FORFEIT")
+def _on_forfeit(args, msg):
+    renderer.message("%s 連續逾時，判定棄權\n" % args[0])
+    return None
+
+
+@dispatcher.on("BRACKET")
+def _on_bracket(args, msg):
+    global in_bracket, pending_guess
+    in_bracket = True
+    del guess_histories[:]
+    pending_guess = None
+    renderer.message("賽事第 %s 輪開始\n" % args[0])
+    return None
+
 
-    elif cmd == "HEARTBEAT":
-        return str("HEARTBEAT_ACK")
+@dispatcher.on("ELIMINATED")
+def _on_eliminated(args, msg):
+    renderer.message("賽事結束，未能奪冠\n")
+    return str("exit")
 
-    elif cmd == "STATUS":
-        print("等待 {} 使用道具跟猜測中...\n".format(parts[1]))
+
+@dispatcher.on("CHAMPION")
+def _on_champion(args, msg):
+    renderer.message("恭喜 %s 獲得賽事冠軍！\n" % args[0])
+    return str("exit")
+
+
+@dispatcher.on("WINNER")
+def _on_winner(args, msg):
+    renderer.message("遊戲結束，勝利者： %s \n" % args[0])
+    if in_bracket:
         return None
+    if os.path.exists(ID_FILE):
+        os.remove(ID_FILE)
+    return str("exit")
 
-    elif cmd == "CHECK_ID":
-        return PLAYER_ID
 
-    elif cmd == "FULL":
-        print("房間人數已滿~\n")
+@dispatcher.on("DRAW")
+def _on_draw(args, msg):
+    renderer.message("遊戲結束，平局！\n")
+    if in_bracket:
         return None
+    if os.path.exists(ID_FILE):
+        os.remove(ID_FILE)
+    return str("exit")
+
+
+@dispatcher.on("DISCONNECTED")
+def _on_disconnected(args, msg):
+    renderer.message("%s 失去連線...\n" % args[0])
+    return None
+
+
+@dispatcher.on("HEARTBEAT")
+def _on_heartbeat(args, msg):
+    return protocol.HEARTBEAT_ACK
+
+
+@dispatcher.on("STATUS")
+def _on_status(args, msg):
+    renderer.message("等待 {} 使用道具跟猜測中...\n".format(args[0]))
+    return None
+
+
+@dispatcher.on("CHECK_ID")
+def _on_check_id(args, msg):
+    return PLAYER_ID
+
+
+@dispatcher.on("SERVER_DRAIN")
+def _on_server_drain(args, msg):
+    connection.retry_after = int(args[0])
+    renderer.message("伺服器維護中，%s 秒後自動重新連線\n" % args[0])
+    return None
+
+
+@dispatcher.on("SPECTATING")
+def _on_spectating(args, msg):
+    renderer.message("開始觀戰房間 %s\n" % args[0])
+    return None
 
+
+@dispatcher.on("NO_SESSION")
+def _on_no_session(args, msg):
+    renderer.message("找不到可觀戰的房間\n")
+    return str("exit")
+
+
+@dispatcher.on("FULL")
+def _on_full(args, msg):
+    # 舊版 server 的 FULL 沒有重試秒數
+    if args:
+        connection.retry_after = int(args[0])
+        renderer.message("伺服器人數已滿，%s 秒後自動重新連線\n" % args[0])
     else:
-        print(msg + "\n")
-        return None
+        renderer.message("房間人數已滿~\n")
+    return None
+
+
+def handle_message(msg):
+    return dispatcher.dispatch(msg)
 
 
 def recv_and_handle(client_socket):
-    _buffer = ""
+    """
+    讀取並處理伺服器訊息，直到連線中斷或遊戲結束。
+
+    :return: "exit" 表示遊戲結束、不需重連；None 表示連線中斷
+    """
+    _buffer = b""
     while True:
         try:
-            data = client_socket.recv(1024).decode("utf-8")
-        except Exception as e:
-            err_no, raw_msg = e.args
-            readable = raw_msg.decode('cp950', errors='replace')
-
-            print("Errno %d: %s" % (err_no, readable))
-            print("與伺服器連線異常，結束")
-            break
+            data = client_socket.recv(1024)
+        except socket.error as e:
+            renderer.message("與伺服器連線異常: %s" % e)
+            return None
 
         if not data:
-            print("伺服器已關閉連線")
-            break
+            renderer.message("伺服器已關閉連線")
+            return None
 
+        # 以 bytes 切行後再解碼，多位元組字元被切在兩次 recv 之間也不會出錯
         _buffer += data
-        while "\n" in _buffer:
-            line, _buffer = _buffer.split("\n", 1)
-            text = line
+        while b"\n" in _buffer:
+            line, _buffer = _buffer.split(b"\n", 1)
+            text = line.decode("utf-8")
             if not text:
                 continue
             reply = handle_message(text)
-            if isinstance(reply, str):
-                send_text = reply + "\n"
+            if reply is not None:
                 try:
-                    client_socket.sendall(send_text.encode("utf-8"))
-                except Exception:
-                    print("回覆伺服器失敗，結束")
-                    return
+                    client_socket.sendall(protocol.to_bytes(reply))
+                except socket.error:
+                    renderer.message("回覆伺服器失敗")
+                    return None
                 if reply == "exit":
-                    client_socket.close()
-                    raise SystemExit
+                    return "exit"
+
+
+def reconnect_delay(attempt, retry_after=None, rng=random):
+    """
+    第 attempt 次重連前等待的秒數。
 
-def prompt_loop(client_socket):
+    指數退避加上 full jitter：在 0 到退避上限之間隨機取值，斷線的玩家不會在同一刻一起重連。
+    伺服器給了 retry_after 時至少等這麼久，再隨機延後最多同樣的秒數（不超過 RECONNECT_MAX_DELAY），
+    drain 或人數已滿時收到同一個秒數的玩家也會分散回來。
+    """
+    if retry_after:
+        return retry_after + rng.uniform(0, min(RECONNECT_MAX_DELAY, retry_after))
+    return rng.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt))
+
+
+def _expire_prompts():
+    """
+    讓目前的提示失效：丟掉還沒顯示的提示，正在等待輸入的提示回答後也不送出。
+    重連後伺服器會重送最後一個提示，逾時則由伺服器代為處理。
+    """
+    global prompt_generation
+    prompt_generation += 1
+    while True:
+        try:
+            prompt_queue.get_nowait()
+        except queue.Empty:
+            return
+
+
+def connect_forever(host, port):
+    """
+    連線並處理訊息，斷線後以同一個玩家 ID 自動重連（server 以 CHECK_ID 認出玩家並接回房間），
+    直到遊戲結束或連續重連失敗 RECONNECT_ATTEMPTS 次。
+    """
+    attempt = 0
+    while True:
+        started = time.time()
+        try:
+            sock = socket.create_connection((host, port), CONNECT_TIMEOUT)
+            sock.settimeout(None)
+        except socket.error as e:
+            renderer.message("無法連線到伺服器: %s" % e)
+            result = None
+        else:
+            renderer.message("伺服器建立連線成功…" if not attempt else "已重新連線…")
+            if attempt:
+                _expire_prompts()
+            connection.attach(sock)
+            try:
+                result = recv_and_handle(sock)
+            finally:
+                connection.detach()
+        if result == "exit":
+            return
+
+        if time.time() - started >= RECONNECT_STABLE:
+            attempt = 0
+        attempt += 1
+        if RECONNECT_ATTEMPTS and attempt > RECONNECT_ATTEMPTS:
+            renderer.message("重新連線失敗次數過多，結束")
+            return
+        delay = reconnect_delay(attempt, connection.retry_after)
+        renderer.message("%.1f 秒後重新連線（第 %d 次）…" % (delay, attempt))
+        time.sleep(delay)
+
+
+def prompt_loop(conn):
+    """
+    讀取玩家輸入並透過 conn 送出。送出失敗時不結束：重連後伺服器會重送最後一個提示。
+    """
     while True:
         item = prompt_queue.get()
         ptype = item.get("type")
+        if ptype == "exit":
+            return
 
         prompt_text = item["prompt"].encode(sys.stdout.encoding or 'utf-8', 'replace')
+        renderer.before_prompt()
 
-        if ptype == "TOOL":
+        if ptype in ("TOOL", "TARGET"):
             choices = item["choices"]
             while True:
                 choice = input(prompt_text).strip()
@@ -200,11 +490,6 @@ def prompt_loop(client_socket):
                     break
                 print("輸入不在選項內，請重新輸入。")
             send = choice + "\n"
-            try:
-                client_socket.sendall(send.encode("utf-8"))
-            except Exception:
-                print("傳送選擇失敗，結束")
-                return
 
         elif ptype == "POS":
             choices = item["choices"]
@@ -212,56 +497,54 @@ def prompt_loop(client_socket):
                 pos = input(prompt_text).strip()
                 if pos in choices:
                     break
-                print("輸入不合法，請輸入 1~4 之間的整數。")
+                print("輸入不合法，請輸入 1~%d 之間的整數。" % len(choices))
             send = pos + "\n"
-            try:
-                client_socket.sendall(send.encode("utf-8"))
-            except Exception:
-                print("傳送 POS 失敗，結束")
-                return
 
         elif ptype == "GUESS":
             number_hand = item["number_hand"]
             while True:
-                guess = list(input(prompt_text).strip())
-                if len(guess) != Game.NUM_GUESS_DIGITS:
+                guess = list(input(prompt_text).strip().lower())
+                if len(guess) != variant.digits:
                     print("長度錯誤，請重新輸入。")
                     continue
                 if any(d not in number_hand for d in guess):
                     print("有數字不在手牌中，請重新輸入。")
                     continue
                 break
-            guess_str = "".join(guess) + "\n"
-            try:
-                guess_histories.append("%s => " % guess_str[:-1])
-                client_socket.sendall(guess_str.encode("utf-8"))
-            except Exception:
-                print("傳送猜測失敗，結束")
-                return
-        elif ptype == "exit":
-            return
+            send = "".join(guess) + "\n"
         else:
             continue
 
-if __name__ == "__main__":
-    HOST, PORT = "localhost", 12345
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if item["generation"] != prompt_generation:
+            print("此提示已逾時或失效，輸入未送出。")
+            continue
+        if ptype == "GUESS":
+            _open_guess(send[:-1])
 
-    try:
-        sock.connect((HOST, PORT))
-        print("伺服器建立連線成功…")
+        try:
+            conn.sendall(send.encode("utf-8"))
+        except socket.error:
+            print("傳送失敗，等待重新連線…")
 
-        t_recv = threading.Thread(target=recv_and_handle, args=(sock,))
-        t_recv.start()
 
-        t_input = threading.Thread(target=prompt_loop, args=(sock,))
-        t_input.start()
+if __name__ == "__main__":
+    HOST, PORT = "localhost", 12345
 
-        t_recv.join()
-        t_input.join()
+    # python client.py --spectate [session_id]：以觀戰者身分連線
+    if len(sys.argv) > 1 and sys.argv[1] == "--spectate":
+        PLAYER_ID = " ".join(["SPECTATE"] + sys.argv[2:3]).encode("utf-8")
+    else:
+        PLAYER_ID = load_player_id().encode("utf-8")
+
+    # 輸入執行緒跨越重連持續存在；可能正停在 input()，設為 daemon 以便遊戲結束時直接離開
+    t_input = threading.Thread(target=prompt_loop, args=(connection,))
+    t_input.daemon = True
+    t_input.start()
 
-    except Exception:
-        print("與伺服器連線異常…")
+    try:
+        connect_forever(HOST, PORT)
+    except KeyboardInterrupt:
+        pass
     finally:
-        sock.close()
+        prompt_queue.put({"type": "exit"})
         print("連線已關閉")
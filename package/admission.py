@@ -0,0 +1,124 @@
+# admission.py
+# -*- coding: utf-8 -*-
+"""
+連線時的准入控制。
+
+新連線在讀到玩家 ID 後先檢查目前負載：
+  - 連線數、進行中房間數、等待配對人數，以及程序記憶體（RSS）與執行緒數的水位
+  - 超過上限時回覆 FULL 與建議的重試秒數，不建立任何執行緒
+  - try_admit 在同一把鎖內檢查並佔用一個連線名額，同時進行的交握不會一起通過檢查而超收
+  - 斷線重連（已有進行中房間）的玩家不受房間數與等待人數限制，
+    連線數、記憶體與執行緒另外保留 reserve 比例的空間給他們，新玩家只能用到 (1 - reserve)
+上限設為 0 表示不限制該項。
+"""
+from __future__ import unicode_literals
+
+import os
+import threading
+
+
+def rss_mb():
+    """目前程序的常駐記憶體（MB）；無法取得時回傳 0。"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+    except (IOError, OSError, ValueError):
+        return 0.0
+
+
+class AdmissionController(object):
+    """
+    :param max_connections: 同時連線的玩家數上限
+    :param max_sessions: 進行中房間數上限
+    :param max_waiting: 等待配對的人數上限
+    :param max_rss_mb: 記憶體水位（MB）
+    :param max_threads: 執行緒數水位
+    :param reconnect_reserve: 保留給重連玩家的比例
+    """
+    def __init__(self, max_connections=0, max_sessions=0, max_waiting=0, max_rss_mb=0, max_threads=0,
+                 reconnect_reserve=0.1):
+        self.max_connections = max_connections
+        self.max_sessions = max_sessions
+        self.max_waiting = max_waiting
+        self.max_rss_mb = max_rss_mb
+        self.max_threads = max_threads
+        self.reconnect_reserve = reconnect_reserve
+
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.admitted = 0
+        self.rejected = {}
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.connections -= 1
+
+    def load(self, sessions, waiting):
+        """
+        :return: 目前負載；score 為各項使用率中最高者（沒有上限的項目不計）
+        """
+        load = {
+            "connections": self.connections,
+            "sessions": sessions,
+            "waiting": waiting,
+            "rss_mb": round(rss_mb(), 1),
+            "threads": threading.active_count(),
+        }
+        ratios = [float(load[field]) / limit for field, limit in self._limits() if limit > 0]
+        load["score"] = round(max(ratios), 3) if ratios else 0.0
+        return load
+
+    def _limits(self):
+        return (("connections", self.max_connections), ("sessions", self.max_sessions),
+                ("waiting", self.max_waiting), ("rss_mb", self.max_rss_mb), ("threads", self.max_threads))
+
+    def admit(self, sessions, waiting, reconnecting=False):
+        """
+        :param reconnecting: 是否為已有進行中房間的玩家
+        :return: None 表示准入，否則為拒絕原因（超過上限的項目名稱）
+        """
+        return self._admit(self.load(sessions, waiting), reconnecting, reserve=False)
+
+    def try_admit(self, sessions, waiting, reconnecting=False):
+        """
+        與 admit 相同，但准入時在同一把鎖內把連線數加一（佔用名額）。
+        准入後連線沒有建立起來時，呼叫 connection_closed() 歸還名額。
+        """
+        load = self.load(sessions, waiting)
+        return self._admit(load, reconnecting, reserve=True)
+
+    def _admit(self, load, reconnecting, reserve):
+        scale = 1.0 if reconnecting else 1.0 - self.reconnect_reserve
+        with self._lock:
+            # 連線數在鎖內重新讀取，其他執行緒剛佔用的名額也算在內
+            load["connections"] = self.connections
+            reason = None
+            for field, limit in self._limits():
+                if limit <= 0:
+                    continue
+                if reconnecting and field in ("sessions", "waiting"):
+                    continue
+                # 房間數與等待人數只限制新玩家，不必再打折
+                bound = limit if field in ("sessions", "waiting") else limit * scale
+                if load[field] >= bound:
+                    reason = field
+                    break
+            if reason is None:
+                self.admitted += 1
+                if reserve:
+                    self.connections += 1
+            else:
+                self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return reason
+
+    def snapshot(self):
+        with self._lock:
+            stats = {"connections": self.connections, "admitted": self.admitted}
+            for reason, count in self.rejected.items():
+                stats["rejected_" + reason] = count
+            return stats
@@ -0,0 +1,316 @@
+# archive.py
+# -*- coding: utf-8 -*-
+"""
+已結束對局的封存與分析。
+
+寫入（Archiver）：
+  遊戲執行緒只把結束的對局放進佇列，由背景執行緒每累積 batch_games 場（或每 flush_interval 秒）
+  編成一個 block，append 到目前的 segment 檔；segment 超過 segment_bytes 就換新檔，舊檔不再修改。
+
+block 格式：
+  frame = MAGIC | 壓縮後長度 (uint32) | crc32 (uint32) | zlib(payload)
+  payload 依欄位存放（同一欄的值連續排列，壓縮率較好，也不需要逐筆解析 JSON）：
+    games：id, ended_at, winner, rounds, players
+    events（每回合事件一筆）：game, round, player, kind, target, a, b, value
+  程序中途結束只會留下不完整的最後一個 frame，讀取時略過。
+
+讀取（ArchiveReader）：
+  以 mmap 逐個 frame 解碼，每次只有一個 block 在記憶體中，
+  games() / events() 都是 generator，可以串接過濾與彙總，處理上百萬場對局也不會佔用大量記憶體。
+
+用法：python -m package.archive [封存目錄]
+"""
+from __future__ import print_function, unicode_literals
+
+import collections
+import glob
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from uuid import uuid4
+
+from package.utils import format_log
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+MAGIC = b"1A2B"
+FRAME = struct.Struct("<4sII")
+COUNTS = struct.Struct("<II")
+NAME_SEPARATOR = "\x1f"
+
+# 事件種類代碼，0 保留給未知種類
+KINDS = ("TOOL", "GUESS", "TIMEOUT", "FORFEIT")
+_KIND_CODES = dict((kind, i + 1) for i, kind in enumerate(KINDS))
+
+GameRecord = collections.namedtuple("GameRecord", "id ended_at winner rounds players events")
+Event = collections.namedtuple("Event", "round player kind target value a b")
+
+
+def _pack(fmt, values):
+    return struct.pack("<%d%s" % (len(values), fmt), *values)
+
+
+def _pack_strings(values):
+    encoded = [v.encode("utf-8") for v in values]
+    return _pack("I", [len(v) for v in encoded]) + b"".join(encoded)
+
+
+class _Cursor(object):
+    """依序從 payload 取出欄位。"""
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def ints(self, fmt, count):
+        values = struct.unpack_from("<%d%s" % (count, fmt), self.data, self.offset)
+        self.offset += struct.calcsize("<%d%s" % (count, fmt))
+        return values
+
+    def strings(self, count):
+        lengths = self.ints("I", count)
+        values = []
+        for length in lengths:
+            values.append(self.data[self.offset:self.offset + length].decode("utf-8"))
+            self.offset += length
+        return values
+
+
+def encode_block(records):
+    """
+    :param records: [(game_id, ended_at, winner, rounds, player_names, events), ...]
+    :return: 壓縮後的完整 frame（bytes）
+    """
+    events = [(gi, e) for gi, record in enumerate(records) for e in record[5]]
+    payload = b"".join([
+        COUNTS.pack(len(records), len(events)),
+        _pack_strings([r[0] for r in records]),
+        _pack("d", [r[1] for r in records]),
+        _pack("b", [r[2] for r in records]),
+        _pack("H", [r[3] for r in records]),
+        _pack_strings([NAME_SEPARATOR.join(r[4]) for r in records]),
+        _pack("I", [gi for gi, e in events]),
+        _pack("H", [e[0] for gi, e in events]),
+        _pack("B", [e[1] for gi, e in events]),
+        _pack("B", [_KIND_CODES.get(e[2], 0) for gi, e in events]),
+        _pack("b", [e[3] for gi, e in events]),
+        _pack("b", [e[5] for gi, e in events]),
+        _pack("b", [e[6] for gi, e in events]),
+        _pack_strings([e[4] for gi, e in events]),
+    ])
+    compressed = zlib.compress(payload)
+    return FRAME.pack(MAGIC, len(compressed), zlib.crc32(compressed) & 0xffffffff) + compressed
+
+
+def decode_block(payload):
+    """:return: GameRecord 的 generator"""
+    cursor = _Cursor(payload)
+    num_games, num_events = COUNTS.unpack_from(payload, 0)
+    cursor.offset = COUNTS.size
+    ids = cursor.strings(num_games)
+    ended_at = cursor.ints("d", num_games)
+    winners = cursor.ints("b", num_games)
+    rounds = cursor.ints("H", num_games)
+    players = cursor.strings(num_games)
+    game_idx = cursor.ints("I", num_events)
+    event_rounds = cursor.ints("H", num_events)
+    event_players = cursor.ints("B", num_events)
+    kinds = cursor.ints("B", num_events)
+    targets = cursor.ints("b", num_events)
+    a_values = cursor.ints("b", num_events)
+    b_values = cursor.ints("b", num_events)
+    values = cursor.strings(num_events)
+
+    # 同一場的事件連續存放
+    start = 0
+    for gi in range(num_games):
+        end = start
+        while end < num_events and game_idx[end] == gi:
+            end += 1
+        events = [Event(event_rounds[i], event_players[i], KINDS[kinds[i] - 1] if kinds[i] else "",
+                        targets[i], values[i], a_values[i], b_values[i])
+                  for i in range(start, end)]
+        yield GameRecord(ids[gi], ended_at[gi], winners[gi], rounds[gi],
+                         players[gi].split(NAME_SEPARATOR), events)
+        start = end
+
+
+class Archiver(object):
+    """
+    背景封存執行緒。
+
+    :param directory: segment 檔存放目錄
+    :param segment_bytes: 單一 segment 檔的大小上限
+    :param batch_games: 累積幾場寫成一個 block
+    :param flush_interval: 最多等幾秒就把累積的對局寫出
+    """
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, batch_games=256, flush_interval=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.batch_games = batch_games
+        self.flush_interval = flush_interval
+        self.games_written = 0
+        self.blocks_written = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._queue = queue.Queue()
+        self._segment = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, game_id, game, winner=None):
+        """遊戲執行緒呼叫：只取出需要的欄位放進佇列，立即返回。"""
+        winner_idx = game.players.index(winner) if winner is not None else -1
+        self._queue.put((str(game_id), time.time(), winner_idx, game.round,
+                         [str(p.name) for p in game.players], game.events))
+
+    def close(self, timeout=None):
+        """寫出剩下的對局並關閉 segment 檔。"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _open_segment(self):
+        name = "segment-%s-%s.seg" % (time.strftime("%Y%m%d%H%M%S"), uuid4().hex[:8])
+        self._segment = open(os.path.join(self.directory, name), "ab")
+
+    def _write(self, records):
+        if self._segment is None or self._segment.tell() >= self.segment_bytes:
+            if self._segment is not None:
+                self._segment.close()
+            self._open_segment()
+        self._segment.write(encode_block(records))
+        self._segment.flush()
+        self.games_written += len(records)
+        self.blocks_written += 1
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.time())
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = False
+
+            if record:
+                pending.append(record)
+                if deadline is None:
+                    deadline = time.time() + self.flush_interval
+            # 收到結束訊號、等待逾時或湊滿一批時寫出
+            if pending and (not record or len(pending) >= self.batch_games):
+                try:
+                    self._write(pending)
+                except Exception as e:
+                    print(format_log("寫入封存檔失敗: %s" % e))
+                pending = []
+                deadline = None
+            if record is None:
+                if self._segment is not None:
+                    os.fsync(self._segment.fileno())
+                    self._segment.close()
+                    self._segment = None
+                return
+
+
+class ArchiveReader(object):
+    def __init__(self, directory):
+        self.directory = directory
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "*.seg")))
+
+    def blocks(self):
+        """逐個產生解壓縮後的 block payload。"""
+        for path in self.segments():
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    offset = 0
+                    while offset + FRAME.size <= len(m):
+                        magic, length, crc = FRAME.unpack_from(m, offset)
+                        start = offset + FRAME.size
+                        if magic != MAGIC or start + length > len(m):
+                            # 不完整的最後一個 frame（寫入中或程序中途結束）
+                            break
+                        compressed = m[start:start + length]
+                        if zlib.crc32(compressed) & 0xffffffff != crc:
+                            break
+                        yield zlib.decompress(compressed)
+                        offset = start + length
+                finally:
+                    m.close()
+
+    def games(self, where=None):
+        """
+        :param where: where(game) 為 True 的對局才產生
+        :return: GameRecord 的 generator
+        """
+        for payload in self.blocks():
+            for game in decode_block(payload):
+                if where is None or where(game):
+                    yield game
+
+    def events(self, kinds=None):
+        """:return: (GameRecord, Event) 的 generator，可依事件種類過濾"""
+        for game in self.games():
+            for event in game.events:
+                if kinds is None or event.kind in kinds:
+                    yield game, event
+
+
+def first_tool(game, player):
+    """玩家第一次道具階段的選擇，沒有使用道具為 "NONE"。"""
+    for event in game.events:
+        if event.player == player and event.kind == "TOOL":
+            return event.value or "NONE"
+    return "NONE"
+
+
+def win_rate_by_first_tool(games):
+    """:return: {第一個道具: (勝場, 場數)}"""
+    stats = {}
+    for game in games:
+        for player in range(len(game.players)):
+            tool = first_tool(game, player)
+            wins, plays = stats.get(tool, (0, 0))
+            stats[tool] = (wins + (player == game.winner), plays + 1)
+    return stats
+
+
+def guesses_to_win(games):
+    """:return: Counter {獲勝者猜了幾次: 場數}，平局不計"""
+    counts = collections.Counter()
+    for game in games:
+        if game.winner < 0:
+            continue
+        counts[sum(1 for e in game.events if e.player == game.winner and e.kind == "GUESS")] += 1
+    return counts
+
+
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else "archive"
+    reader = ArchiveReader(directory)
+
+    print("%-12s %-8s %-8s %s" % ("first tool", "wins", "plays", "win rate"))
+    for tool, (wins, plays) in sorted(win_rate_by_first_tool(reader.games()).items()):
+        print("%-12s %-8d %-8d %.3f" % (tool, wins, plays, float(wins) / plays))
+
+    print()
+    print("%-8s %s" % ("guesses", "games"))
+    for guesses, count in sorted(guesses_to_win(reader.games()).items()):
+        print("%-8d %d" % (guesses, count))
+
+
+if __name__ == "__main__":
+    main()
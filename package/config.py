@@ -0,0 +1,101 @@
+# config.py
+# -*- coding: utf-8 -*-
+"""
+伺服器可調整的參數。每一項都可以用 GAME_<名稱> 環境變數覆寫，例如 GAME_GUESS_DEADLINE=90。
+"""
+import os
+
+
+def _env(name, default, cast=float):
+    value = os.environ.get("GAME_" + name)
+    if value is None:
+        return default
+    return cast(value)
+
+
+# 新房間的遊戲變體：classic / hard / expert / expert_repeat，或 "<位數>x<數字種類>[r]"（見 package/variant.py）
+VARIANT = _env("VARIANT", "classic", str)
+
+# 每房人數（2-8）
+ROOM_SIZE = _env("ROOM_SIZE", 2, int)
+# 賽事模式：空字串為一般配對；elimination / swiss 則湊滿 TOURNAMENT_PLAYERS 人開一場賽事，每房 ROOM_SIZE 人。
+# 淘汰賽每房前 TOURNAMENT_ADVANCE 名晉級，瑞士制進行 TOURNAMENT_ROUNDS 輪
+TOURNAMENT = _env("TOURNAMENT", "", str)
+TOURNAMENT_PLAYERS = _env("TOURNAMENT_PLAYERS", 16, int)
+TOURNAMENT_ADVANCE = _env("TOURNAMENT_ADVANCE", 1, int)
+TOURNAMENT_ROUNDS = _env("TOURNAMENT_ROUNDS", 3, int)
+
+# 各階段的作答期限（秒），0 表示不限時
+TOOL_DEADLINE = _env("TOOL_DEADLINE", 30.0)
+POS_DEADLINE = _env("POS_DEADLINE", 15.0)
+TARGET_DEADLINE = _env("TARGET_DEADLINE", 15.0)
+GUESS_DEADLINE = _env("GUESS_DEADLINE", 60.0)
+# 連續逾時幾次判定棄權
+MAX_DEADLINE_EXPIRIES = _env("MAX_DEADLINE_EXPIRIES", 3, int)
+
+DEADLINES = {
+    "TOOL": TOOL_DEADLINE,
+    "POS": POS_DEADLINE,
+    "TARGET": TARGET_DEADLINE,
+    "GUESS": GUESS_DEADLINE,
+}
+
+# 所有玩家離線超過此秒數的房間會被回收，以及回收檢查的間隔
+SESSION_GRACE_PERIOD = _env("SESSION_GRACE_PERIOD", 300.0)
+SESSION_REAP_INTERVAL = _env("SESSION_REAP_INTERVAL", 30.0)
+
+# 每條連線送出佇列的長度上限，以及佇列滿時的處理方式（drop_heartbeat / disconnect）
+OUTBOUND_QUEUE_SIZE = _env("OUTBOUND_QUEUE_SIZE", 256, int)
+OUTBOUND_POLICY = _env("OUTBOUND_POLICY", "drop_heartbeat", str)
+# 多工閘道連線的送出佇列長度（整條連線上所有玩家共用）
+GATEWAY_QUEUE_SIZE = _env("GATEWAY_QUEUE_SIZE", 65536, int)
+# 定期輸出送出佇列統計的間隔秒數，0 表示不輸出
+METRICS_LOG_INTERVAL = _env("METRICS_LOG_INTERVAL", 60.0)
+
+# 准入控制：listen backlog、同時連線數、進行中房間數、等待配對人數、記憶體（MB）與執行緒數上限（0 表示不限制），
+# 保留給重連玩家的比例，以及回覆 FULL 時建議的重試秒數
+LISTEN_BACKLOG = _env("LISTEN_BACKLOG", 128, int)
+MAX_CONNECTIONS = _env("MAX_CONNECTIONS", 2000, int)
+MAX_SESSIONS = _env("MAX_SESSIONS", 500, int)
+MAX_WAITING = _env("MAX_WAITING", 200, int)
+MAX_RSS_MB = _env("MAX_RSS_MB", 0.0)
+MAX_THREADS = _env("MAX_THREADS", 6000, int)
+RECONNECT_RESERVE = _env("RECONNECT_RESERVE", 0.1)
+# 同時進行交握（尚未准入）的連線數上限，超過時新連線直接收到 FULL
+MAX_HANDSHAKES = _env("MAX_HANDSHAKES", 256, int)
+ADMISSION_RETRY_AFTER = _env("ADMISSION_RETRY_AFTER", 10, int)
+# 公開本節點負載到 store 的間隔秒數，0 表示不公開
+LOAD_PUBLISH_INTERVAL = _env("LOAD_PUBLISH_INTERVAL", 5.0)
+
+# 接收端限制：等待 client 送出 ID 的秒數、單行最大 bytes 數、每條連線每秒可送的行數與瞬間上限
+HANDSHAKE_TIMEOUT = _env("HANDSHAKE_TIMEOUT", 5.0)
+INBOUND_MAX_LINE = _env("INBOUND_MAX_LINE", 256, int)
+INBOUND_RATE = _env("INBOUND_RATE", 5.0)
+INBOUND_BURST = _env("INBOUND_BURST", 10, int)
+
+# 遊戲狀態儲存：redis / memory / sqlite
+STORE_BACKEND = _env("STORE_BACKEND", "redis", str)
+REDIS_HOST = _env("REDIS_HOST", "localhost", str)
+REDIS_PORT = _env("REDIS_PORT", 6379, int)
+REDIS_DB = _env("REDIS_DB", 0, int)
+# memory store 的鎖分段數
+MEMORY_STORE_STRIPES = _env("MEMORY_STORE_STRIPES", 16, int)
+# sqlite store 的檔案路徑、批次 commit 間隔（秒）與批次大小
+SQLITE_PATH = _env("SQLITE_PATH", "game_state.db", str)
+SQLITE_FLUSH_INTERVAL = _env("SQLITE_FLUSH_INTERVAL", 0.05)
+SQLITE_BATCH_SIZE = _env("SQLITE_BATCH_SIZE", 500, int)
+
+# 多節點部署：節點名稱、其他節點轉送玩家連線用的 "host:port"（預設為 hostname:port），
+# 以及 session lease 的有效秒數（節點失聯後最多這麼久由其他節點接手）
+NODE_ID = _env("NODE_ID", "", str)
+NODE_ADDRESS = _env("NODE_ADDRESS", "", str)
+LEASE_TTL = _env("LEASE_TTL", 10.0)
+# 轉送玩家連線時，連到擁有者節點並等它送出 CHECK_ID 的秒數上限（期間佔用該連線的交握執行緒）
+RELAY_TIMEOUT = _env("RELAY_TIMEOUT", 2.0)
+
+# 已結束對局的封存目錄（空字串表示不封存）與單一 segment 檔大小上限
+ARCHIVE_DIR = _env("ARCHIVE_DIR", "archive", str)
+ARCHIVE_SEGMENT_BYTES = _env("ARCHIVE_SEGMENT_BYTES", 64 * 1024 * 1024, int)
+
+# 每隔幾回合保存一次完整快照（checkpoint），其餘回合只存 seed 與事件紀錄；0 表示不建立 checkpoint
+CHECKPOINT_ROUNDS = _env("CHECKPOINT_ROUNDS", 3, int)
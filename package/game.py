@@ -4,6 +4,7 @@ import random
 import sys
 
 from package.player import Player
+from package.variant import CLASSIC, Variant
 
 try:
     input = raw_input
@@ -23,8 +24,15 @@ class Game(object):
     MAX_TOOL_HAND = 3
     MAX_ROUNDS = 10
     NUM_GUESS_DIGITS = 4
+    MIN_PLAYERS = 2
+    MAX_PLAYERS = 8
 
-    def __init__(self, players):
+    def __init__(self, players, seed=None, variant=None):
+        """
+        :param variant: variant.Variant，預設為 4 位、0-9 不重複
+        """
+        self.variant = variant or CLASSIC
+        self.NUM_GUESS_DIGITS = self.variant.digits
         self.discard_tool = None
         self.discard_number = None
         self.tool_deck = None
@@ -33,21 +41,41 @@ class Game(object):
         self.players = players
         self.round = 1
         self.current_player_idx = 0
+        # 每筆事件：[round, 玩家 index, 種類, 目標 index（沒有為 -1）, 內容, A, B]
+        self.events = []
+
+        # 每場遊戲自己的亂數來源：同一個 seed 加上相同的事件順序，一定得到相同的牌局
+        self.seed = random.SystemRandom().getrandbits(48) if seed is None else seed
+        self._rng = None
+        self._rng_round = None
+
         self.build_decks()
         self.deal_initial_hands()
 
+    @property
+    def rng(self):
+        """
+        本回合的亂數產生器，每回合由 (seed, round) 重新導出。
+        回合開始時不需要保存亂數狀態，checkpoint 只要記錄牌局本身。
+        """
+        if self._rng_round != self.round:
+            self._rng = random.Random((self.seed << 16) + self.round)
+            self._rng_round = self.round
+        return self._rng
+
     def build_decks(self):
-        # 建立數字牌堆與道具牌堆
-        self.number_deck = [d for d in '0123456789' for _ in range(self.NUM_CARD_COPIES)]
-        self.tool_deck = [t for t, n in self.TOOL_CARDS.items() for _ in range(n)]
-        random.shuffle(self.number_deck)
-        random.shuffle(self.tool_deck)
+        # 建立數字牌堆與道具牌堆，每多兩位玩家多加一副牌
+        scale = max(1, (len(self.players) + 1) // 2)
+        self.number_deck = [d for d in self.variant.alphabet for _ in range(self.NUM_CARD_COPIES * scale)]
+        self.tool_deck = [t for t, n in sorted(self.TOOL_CARDS.items()) for _ in range(n * scale)]
+        self.rng.shuffle(self.number_deck)
+        self.rng.shuffle(self.tool_deck)
         self.discard_number = []
         self.discard_tool = []
 
     def deal_initial_hands(self):
         for player in self.players:
-            player.answer = random.sample(list('0123456789'), self.NUM_GUESS_DIGITS)  # 隱藏答案
+            player.answer = self.variant.random_code(self.rng)  # 隱藏答案
             player.number_hand = []
             player.tool_hand = []
             player.best_A = 0
@@ -55,27 +83,137 @@ class Game(object):
             self.draw_up(player)  # 補牌
 
     @staticmethod
-    def draw(hand, deck, discard, max_hand):
+    def draw(hand, deck, discard, max_hand, rng=random):
         while len(hand) < max_hand:
             if not deck:
                 if not discard:
                     break
                 deck.extend(discard)
                 del discard[:]
-                random.shuffle(deck)
+                rng.shuffle(deck)
             hand.append(deck.pop())
         hand.sort()
 
     def draw_up(self, player):
-        Game.draw(player.number_hand, self.number_deck, self.discard_number, self.MAX_NUM_HAND)
-        Game.draw(player.tool_hand, self.tool_deck, self.discard_tool, self.MAX_TOOL_HAND)
+        Game.draw(player.number_hand, self.number_deck, self.discard_number, self.MAX_NUM_HAND, self.rng)
+        Game.draw(player.tool_hand, self.tool_deck, self.discard_tool, self.MAX_TOOL_HAND, self.rng)
+
+    def use_tool(self, player, target, tool):
+        """
+        打出一張道具卡並套用效果（POS 不改變牌局，由呼叫端以 ToolCard.pos 查詢）。
+
+        :return: SHUFFLE 為洗牌後的答案，EXCLUDE 為排除的數字，其餘為 None
+        """
+        player.tool_hand.remove(tool)
+        self.discard_tool.append(tool)
+        self.record("TOOL", player, target, tool)
+        if tool == "SHUFFLE":
+            ToolCard.shuffle(player.answer, self.rng)
+            return player.answer
+        if tool == "EXCLUDE":
+            return ToolCard.exclude(target.answer, self.rng, self.variant.alphabet)
+        if tool == "RESHUFFLE":
+            ToolCard.reshuffle(player.number_hand, self.number_deck, self.rng)
+        return None
+
+    def make_guess(self, player, target, guess):
+        """
+        打出猜測的數字牌、補牌並計算結果。
+
+        :return: (A, B)
+        """
+        for d in guess:
+            player.number_hand.remove(d)
+            self.discard_number.append(d)
+        self.draw_up(player)
+        a, b = self.check_guess(target.answer, list(guess))
+        self.update_best(player, a, b)
+        self.record("GUESS", player, target, guess, a, b)
+        return a, b
+
+    def apply(self, event):
+        """依事件紀錄重做一次動作（重建牌局與 replay 使用），事件會重新記錄到 self.events。"""
+        round_no, player_idx, kind, target_idx, value, a, b = event
+        self.round = round_no
+        player = self.players[player_idx]
+        target = self.players[target_idx] if target_idx >= 0 else None
+        if kind == "TOOL" and value:
+            self.use_tool(player, target, value)
+        elif kind == "GUESS":
+            self.make_guess(player, target, value)
+        else:
+            self.record(kind, player, target, value, a, b)
 
     @staticmethod
     def check_guess(answer, guess):
         # 計算 A 與 B 的數量
         a = sum(a == g for a, g in zip(answer, guess))
-        b = len(set(answer) & set(guess)) - a
-        return a, b
+        digits = set(answer)
+        if len(digits) == len(answer):
+            return a, len(digits & set(guess)) - a
+        # 答案有重複數字（可重複的變體）：每個數字以兩邊張數較少者計算
+        return a, sum(min(answer.count(d), guess.count(d)) for d in digits) - a
+
+    @staticmethod
+    def update_best(player, a, b):
+        # 記錄玩家最好的一次猜測，回合用盡時用來比較名次
+        if a > player.best_A:
+            player.best_A = a
+            player.best_B = b
+        elif a == player.best_A and b > player.best_B:
+            player.best_B = b
+
+    def record(self, kind, player, target=None, value="", a=-1, b=-1):
+        """
+        記錄一筆對局事件（TOOL / GUESS / TIMEOUT / FORFEIT），遊戲結束後寫入封存檔。
+        """
+        self.events.append([self.round, self.players.index(player), kind,
+                            self.players.index(target) if target is not None else -1,
+                            value, a, b])
+
+    def standings(self, winner=None):
+        """
+        依名次排序的玩家 list：猜中者第一，其餘依 best_A、best_B 由高到低。
+        """
+        ranked = sorted((p for p in self.players if p is not winner),
+                        key=lambda p: (p.best_A, p.best_B), reverse=True)
+        if winner is not None:
+            ranked.insert(0, winner)
+        return ranked
+
+    def to_log(self):
+        """
+        每回合存檔用的精簡格式：只有 seed、事件紀錄與目前進度，
+        牌堆與手牌在復原時由 seed 重播事件導出。
+        """
+        return {
+            "seed": self.seed,
+            "variant": self.variant.to_dict(),
+            "events": self.events,
+            "round": self.round,
+            "MAX_ROUNDS": self.MAX_ROUNDS,
+            "NUM_GUESS_DIGITS": self.NUM_GUESS_DIGITS,
+            "current_player_idx": self.current_player_idx,
+            # 重連時只需要最後一個動作
+            "players": [{"name": str(p.name), "action_histories": p.action_histories[-1:]}
+                        for p in self.players],
+        }
+
+    def can_checkpoint(self):
+        """本回合還沒用到亂數（回合開始，或剛從完整快照復原）時才能建立 checkpoint。"""
+        return self._rng_round != self.round
+
+    def checkpoint(self):
+        """
+        完整快照，從它重播之後的事件可得到相同牌局。只能在 can_checkpoint() 為 True 時建立。
+
+        :return: {"events": 快照時的事件數, "last_event": 最後一筆事件, "state": to_dict()}
+        """
+        return {
+            "events": len(self.events),
+            "last_event": self.events[-1] if self.events else None,
+            "state": self.to_dict(),
+        }
 
     def to_dict(self):
         """
@@ -89,6 +227,9 @@ class Game(object):
                  - round: 當前遊戲進行到的回合數
                  - MAX_ROUNDS: 遊戲總回合數上限
                  - NUM_GUESS_DIGITS: 每次猜測的數字長度
+                 - variant: 遊戲變體（見 variant.Variant.to_dict()）
+                 - seed: 亂數種子
+                 - events: 對局事件紀錄（見 record()）
                  - players: 玩家狀態清單（每個 player 會呼叫其自身的 to_dict()）
         """
         return {
@@ -100,30 +241,93 @@ class Game(object):
             "MAX_ROUNDS": self.MAX_ROUNDS,
             "NUM_GUESS_DIGITS": self.NUM_GUESS_DIGITS,
             "current_player_idx": self.current_player_idx,
+            "seed": self.seed,
+            "variant": self.variant.to_dict(),
+            "events": self.events,
             "players": [p.to_dict() for p in self.players],
         }
 
     @classmethod
-    def from_dict(cls, state_dict, players=None):
+    def from_dict(cls, state_dict, players=None, checkpoint=None):
+        """
+        由 to_dict() 快照或 to_log() 精簡格式復原。
 
+        :param checkpoint: checkpoint() 的結果；與事件紀錄一致時從它開始重播，不必從頭重播
+        """
+        if "number_deck" not in state_dict:
+            return cls._from_log(state_dict, players, checkpoint)
+
+        return cls.restore(state_dict, players)
+
+    @classmethod
+    def restore(cls, state_dict, players=None):
+        """
+        由 to_dict() 快照直接建立 Game，不洗牌、不發牌：牌堆、手牌與答案都沿用存檔中的 list。
+        state_dict 之後歸這個 Game 所有，呼叫端不可再修改。
+
+        :param players: 已有的 Player 物件（例如重連中的玩家）；存檔中的答案、手牌與分數會套用到它們身上
+        """
+        player_states = state_dict['players']
         if players is None:
-            if state_dict['players']:
-                players = [Player.from_dict(p) for p in state_dict['players']]
-            else:
+            if not player_states:
                 raise Exception('No players specified')
+            players = [Player.from_dict(p) for p in player_states]
+        else:
+            for player, data in zip(players, player_states):
+                player.load_state(data)
 
-        game = cls(players)
+        game = cls.__new__(cls)
+        game.variant = Variant.from_state(state_dict)
         game.number_deck = state_dict.get("number_deck", [])
         game.tool_deck = state_dict.get("tool_deck", [])
         game.discard_number = state_dict.get("discard_number", [])
         game.discard_tool = state_dict.get("discard_tool", [])
+        game.players = players
         game.round = state_dict.get("round", 1)
-        game.MAX_ROUNDS = state_dict.get("MAX_ROUNDS", Game.MAX_ROUNDS)
-        game.NUM_GUESS_DIGITS = state_dict.get("NUM_GUESS_DIGITS", Game.NUM_GUESS_DIGITS)
         game.current_player_idx = state_dict.get("current_player_idx", 0)
+        game.events = state_dict.get("events", [])
+        game.MAX_ROUNDS = state_dict.get("MAX_ROUNDS", Game.MAX_ROUNDS)
+        game.NUM_GUESS_DIGITS = game.variant.digits
+        seed = state_dict.get("seed")
+        # 舊版快照沒有 seed：之後的亂數改由新的 seed 導出
+        game.seed = random.SystemRandom().getrandbits(48) if seed is None else seed
+        game._rng = None
+        game._rng_round = None
+        return game
 
+    @classmethod
+    def _from_log(cls, state_dict, players=None, checkpoint=None):
+        events = state_dict.get("events", [])
+        if players is None and checkpoint is not None and cls._checkpoint_matches(state_dict, checkpoint):
+            game = cls.from_dict(checkpoint["state"], players)
+            start = checkpoint["events"]
+        else:
+            variant = Variant.from_state(state_dict)
+            if players is None:
+                if not state_dict['players']:
+                    raise Exception('No players specified')
+                players = [Player(p["name"], variant=variant) for p in state_dict['players']]
+            game = cls(players, seed=state_dict["seed"], variant=variant)
+            start = 0
+
+        game.MAX_ROUNDS = state_dict.get("MAX_ROUNDS", Game.MAX_ROUNDS)
+        for event in events[start:]:
+            game.apply(event)
+        game.round = state_dict.get("round", 1)
+        game.current_player_idx = state_dict.get("current_player_idx", 0)
+        for player, data in zip(game.players, state_dict['players']):
+            player.action_histories = data.get("action_histories", [])
         return game
 
+    @staticmethod
+    def _checkpoint_matches(state_dict, checkpoint):
+        # checkpoint 可能來自已失去 lease 的舊節點，必須是目前事件紀錄的前綴才能使用
+        events = state_dict.get("events", [])
+        count = checkpoint.get("events", -1)
+        if checkpoint["state"].get("seed") != state_dict.get("seed") or not 0 <= count <= len(events):
+            return False
+        return count == 0 or events[count - 1] == checkpoint.get("last_event")
+
     # def apply_tool(self, player, opponent):
     #     if not player.tool_hand:
     #         print("沒有道具卡可使用。")
@@ -235,6 +439,7 @@ class Game(object):
     #     print("勝利者: {0}！".format(winner.name))
 
 class ToolCard:
+    """道具效果。rng 傳入 Game.rng，牌局才能由 seed 重現。"""
     def __init__(self):
         pass
 
@@ -243,21 +448,21 @@ class ToolCard:
         return answer[pos]
 
     @staticmethod
-    def shuffle(answer):
-        random.shuffle(answer)
+    def shuffle(answer, rng=random):
+        rng.shuffle(answer)
 
     @staticmethod
-    def exclude(answer):
-        non_answer = [d for d in '0123456789' if d not in answer]
+    def exclude(answer, rng=random, alphabet='0123456789'):
+        non_answer = [d for d in alphabet if d not in answer]
         if non_answer:
-            return random.choice(non_answer)
+            return rng.choice(non_answer)
         else:
             return ''
     @staticmethod
-    def reshuffle(number_hand, number_deck):
+    def reshuffle(number_hand, number_deck, rng=random):
         n = len(number_hand)
         merged = number_hand + number_deck
-        random.shuffle(merged)
+        rng.shuffle(merged)
 
         del number_deck[:]
         del number_hand[:]
@@ -0,0 +1,124 @@
+# inbound.py
+# -*- coding: utf-8 -*-
+"""
+每條連線收到的資料在進入 cmd_queue 之前的檢查。
+
+  - LineBuffer：固定上限的接收緩衝區，超過 max_line 還沒有換行的資料整段丟棄
+  - TokenBucket：每條連線每秒可送的行數上限，超過的行直接丟棄
+  - Expectation：遊戲執行緒目前在等這位玩家的哪個階段；只有符合該階段格式的指令才會放進佇列，
+    不在任何階段時送來的指令一律丟棄，不會被之後的 TOOL / GUESS 誤用
+"""
+from __future__ import unicode_literals
+
+import collections
+import threading
+import time
+
+
+class InboundMetrics(object):
+    """所有連線共用的接收統計。"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lines = 0
+        self.commands = 0
+        self.oversized = 0
+        self.rate_limited = 0
+        self.rejected = 0
+
+    def record(self, field, count=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + count)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "lines": self.lines,
+                "commands": self.commands,
+                "oversized": self.oversized,
+                "rate_limited": self.rate_limited,
+                "rejected": self.rejected,
+            }
+
+
+class LineBuffer(object):
+    """
+    :param max_line: 單行的最大 bytes 數（不含換行）
+    """
+    def __init__(self, max_line=256):
+        self.max_line = max_line
+        self._buf = bytearray()
+        # 正在丟棄一行過長的資料，直到下一個換行
+        self._skipping = False
+
+    def feed(self, data):
+        """
+        :return: (完整的行 list, 這次因過長而丟棄的行數)
+        """
+        lines = []
+        oversized = 0
+        self._buf.extend(data)
+        while True:
+            end = self._buf.find(b"\n")
+            if end < 0:
+                break
+            if self._skipping:
+                self._skipping = False
+            elif end > self.max_line:
+                oversized += 1
+            else:
+                lines.append(bytes(self._buf[:end]))
+            del self._buf[:end + 1]
+        if len(self._buf) > self.max_line:
+            if not self._skipping:
+                oversized += 1
+            self._skipping = True
+            del self._buf[:]
+        return lines, oversized
+
+
+class TokenBucket(object):
+    """
+    :param rate: 每秒補充的 token 數
+    :param burst: token 上限
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.time()
+
+    def take(self):
+        """:return: 還有 token 時扣一個並回傳 True"""
+        now = time.time()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class Expectation(object):
+    """
+    遊戲執行緒等待某位玩家回應的一個階段。
+
+    :param phase: TOOL / POS / TARGET / GUESS
+    :param limit: TOOL 為道具數、POS 與 GUESS 為答案位數、TARGET 為可選目標數
+    """
+    __slots__ = ("phase", "limit")
+
+    def __init__(self, phase, limit):
+        self.phase = phase
+        self.limit = limit
+
+    def accepts(self, text, player):
+        if self.phase == "GUESS":
+            if len(text) != self.limit:
+                return False
+            # 猜測的每個數字都要在手牌中（含重複的張數），字母表由手牌決定
+            need = collections.Counter(text)
+            have = collections.Counter(player.number_hand)
+            return all(have[d] >= n for d, n in need.items())
+        if self.phase == "TOOL" and text == "-1":
+            return True
+        return text.isdigit() and 1 <= int(text) <= self.limit
@@ -0,0 +1,107 @@
+# lease.py
+# -*- coding: utf-8 -*-
+"""
+多節點部署時的 session 擁有權。
+
+每個 session 同時只由一個節點執行：節點取得 lease 後才能開房，並由背景執行緒定期續約。
+每次取得 lease 都會拿到遞增的 fencing token，存檔時帶著 token 做 compare-and-set，
+節點當機或網路中斷導致 lease 過期、被其他節點接手後，舊節點的寫入一律被拒絕。
+節點同時登記自己的轉送位址，其他節點收到該 session 玩家的連線時可轉送過來。
+"""
+from __future__ import print_function, unicode_literals
+
+import threading
+import time
+
+from package.utils import format_log
+
+
+class Lease(object):
+    def __init__(self, session_id, token, expires_at, on_lost=None):
+        self.session_id = str(session_id)
+        self.token = token
+        self.expires_at = expires_at
+        self.lost = False
+        self.on_lost = on_lost
+
+
+class LeaseManager(object):
+    """
+    :param store: 提供 acquire_lease / renew_lease 等操作的 store
+    :param node_id: 本節點的唯一名稱
+    :param address: 其他節點轉送玩家連線用的 "host:port"
+    :param ttl: lease 有效秒數，節點失聯後最多這麼久會被其他節點接手
+    :param renew_interval: 續約間隔，預設 ttl / 3
+    """
+    def __init__(self, store, node_id, address, ttl=10.0, renew_interval=None):
+        self.store = store
+        self.node_id = node_id
+        self.address = address
+        self.ttl = ttl
+        self.renew_interval = renew_interval if renew_interval is not None else ttl / 3.0
+
+        self._held = {}
+        self._lock = threading.Lock()
+
+        self.store.register_node(node_id, address, ttl)
+        t = threading.Thread(target=self._renew_loop)
+        t.daemon = True
+        t.start()
+
+    def acquire(self, session_id, on_lost=None):
+        """
+        :return: (Lease, 擁有者 node id)；已由其他節點持有時 Lease 為 None
+        """
+        result = self.store.acquire_lease(session_id, self.node_id, self.ttl)
+        if result is None:
+            return None, None
+        token, owner = result
+        if token is None:
+            return None, owner
+        lease = Lease(session_id, token, time.time() + self.ttl, on_lost)
+        with self._lock:
+            self._held[lease.session_id] = lease
+        return lease, owner
+
+    def release(self, lease):
+        with self._lock:
+            if self._held.get(lease.session_id) is lease:
+                del self._held[lease.session_id]
+        if not lease.lost:
+            self.store.release_lease(lease.session_id, self.node_id, lease.token)
+
+    def owner_address(self, session_id):
+        """:return: (擁有者 node id, 轉送位址)；沒有擁有者時皆為 None，擁有者已離線時位址為 None"""
+        owner = self.store.lease_owner(session_id)
+        if owner is None or owner == self.node_id:
+            return owner, None
+        return owner, self.store.node_address(owner)
+
+    def held(self):
+        with self._lock:
+            return list(self._held.values())
+
+    def mark_lost(self, lease):
+        """lease 已被其他節點取得（續約失敗或存檔被 fencing 拒絕）。"""
+        if lease.lost:
+            return
+        with self._lock:
+            if self._held.get(lease.session_id) is lease:
+                del self._held[lease.session_id]
+        lease.lost = True
+        print(format_log("遊戲房間 %s 的 lease 已失效" % lease.session_id))
+        if lease.on_lost is not None:
+            lease.on_lost(lease)
+
+    def _renew_loop(self):
+        while True:
+            time.sleep(self.renew_interval)
+            self.store.register_node(self.node_id, self.address, self.ttl)
+            for lease in self.held():
+                now = time.time()
+                ok = self.store.renew_lease(lease.session_id, self.node_id, lease.token, self.ttl)
+                if ok:
+                    lease.expires_at = now + self.ttl
+                elif ok is False or now >= lease.expires_at:
+                    # store 明確拒絕，或一直連不上直到 lease 到期
+                    self.mark_lost(lease)
@@ -0,0 +1,96 @@
+# lifecycle.py
+# -*- coding: utf-8 -*-
+"""
+遊戲房間的生命週期管理。
+
+SessionRegistry 同時以 session id 與玩家 id 建立索引，重連時可直接查到玩家所在的房間，
+不必逐一掃描 session.players。房間結束時立即移除；所有玩家都離線超過寬限時間的房間
+由 reaper 執行緒回收（狀態仍留在 store，玩家之後仍可從 store 復原）。
+"""
+from __future__ import print_function, unicode_literals
+
+import threading
+import time
+
+from package.utils import format_log
+
+
+class SessionRegistry(object):
+    def __init__(self):
+        self._by_id = {}
+        self._by_player = {}
+        self._lock = threading.Lock()
+
+    def register(self, session):
+        now = time.time()
+        with self._lock:
+            self._by_id[str(session.id)] = session
+            for player in session.players:
+                self._by_player[player.name] = session
+                if not player.is_alive and player.disconnected_at is None:
+                    player.disconnected_at = now
+
+    def unregister(self, session):
+        with self._lock:
+            if self._by_id.get(str(session.id)) is session:
+                del self._by_id[str(session.id)]
+            for player in session.players:
+                if self._by_player.get(player.name) is session:
+                    del self._by_player[player.name]
+
+    def get(self, session_id):
+        with self._lock:
+            return self._by_id.get(str(session_id))
+
+    def find_by_player(self, player_id):
+        with self._lock:
+            return self._by_player.get(player_id)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._by_id.values())
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return str(session_id) in self._by_id
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+    def reap(self, grace_period, now=None):
+        """
+        回收所有玩家都已離線超過 grace_period 秒的房間。
+
+        :return: 被回收的 session list
+        """
+        now = time.time() if now is None else now
+        abandoned = []
+        for session in self.sessions():
+            players = session.players
+            if any(p.is_alive for p in players):
+                continue
+            last_seen = max(p.disconnected_at or now for p in players)
+            if now - last_seen >= grace_period:
+                abandoned.append(session)
+
+        for session in abandoned:
+            print(format_log("回收閒置遊戲房間 %s" % session.id))
+            self.unregister(session)
+            session.flush()
+            session.stop()
+        return abandoned
+
+    def start_reaper(self, grace_period, interval):
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reap(grace_period)
+                except Exception as e:
+                    print(format_log("回收遊戲房間失敗: %s" % e))
+
+        t = threading.Thread(target=loop)
+        t.daemon = True
+        t.start()
+        return t
@@ -0,0 +1,106 @@
+# memory_store.py
+# -*- coding: utf-8 -*-
+"""
+程序內的 store，適合單機部署與測試。
+
+key 依 hash 分散到多個 stripe，每個 stripe 各有一把鎖，
+不同房間同時存檔時通常落在不同 stripe，不會互相等待。
+值以 JSON 字串保存，讀出來的 dict 與遊戲中的物件互不影響（與 Redis 行為一致）。
+"""
+from __future__ import unicode_literals
+
+import json
+import threading
+
+from package.store import BaseStore
+
+
+class _Stripe(object):
+    __slots__ = ("lock", "data")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+
+
+class MemoryStore(BaseStore):
+    """
+    :param stripes: stripe 數量
+    """
+    def __init__(self, stripes=16):
+        super(MemoryStore, self).__init__()
+        self._stripes = [_Stripe() for _ in range(max(1, stripes))]
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _set(self, key, value):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            stripe.data[key] = value
+
+    def _get(self, key):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            return stripe.data.get(key)
+
+    def _delete(self, key):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            stripe.data.pop(key, None)
+
+    def save_player_state(self, player_id, state_dict):
+        self._set(self._player_key(player_id), json.dumps(state_dict))
+
+    def read_player_state(self, player_id):
+        data = self._get(self._player_key(player_id))
+        return json.loads(data) if data else None
+
+    def delete_player_state(self, player_id):
+        self._delete(self._player_key(player_id))
+
+    def save_player_game(self, player_id, game_session_id):
+        self._set(self._player_key(player_id) + ":game", game_session_id)
+
+    def read_player_game(self, player_id):
+        return self._get(self._player_key(player_id) + ":game")
+
+    def delete_player_game(self, player_id):
+        self._delete(self._player_key(player_id) + ":game")
+
+    def save_game_state(self, game_session_id, game_state_dict):
+        self._set(self._game_key(game_session_id), json.dumps(game_state_dict))
+
+    def read_game_state(self, game_session_id):
+        data = self._get(self._game_key(game_session_id))
+        return json.loads(data) if data else None
+
+    def _delete_game_key(self, game_session_id):
+        self._delete(self._game_key(game_session_id))
+
+    def save_checkpoint(self, game_session_id, checkpoint):
+        self._set(self._checkpoint_key(game_session_id), json.dumps(checkpoint))
+
+    def read_checkpoint(self, game_session_id):
+        data = self._get(self._checkpoint_key(game_session_id))
+        return json.loads(data) if data else None
+
+    def _delete_checkpoint(self, game_session_id):
+        self._delete(self._checkpoint_key(game_session_id))
+
+    def scan_game_ids(self, batch_size=100):
+        prefix = self._game_key("")
+        batch = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                keys = list(stripe.data)
+            for key in keys:
+                game_session_id = key[len(prefix):]
+                if not key.startswith(prefix) or ":" in game_session_id:
+                    continue
+                batch.append(game_session_id)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
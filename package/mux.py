@@ -0,0 +1,246 @@
+# mux.py
+# -*- coding: utf-8 -*-
+"""
+多工閘道：多位邏輯玩家共用一條 TCP 連線。
+
+網頁 / 手機前端、機器人與壓測程式可以只開幾條長連線，每位玩家佔一個 channel：
+  1. 連線收到 CHECK_ID 後送出 MUX，server 回覆 MUX 表示進入多工模式
+  2. 之後每一行都是一個 frame：
+       OPEN <channel> <player id>   閘道 → server：玩家加入（等同一般連線送出玩家 ID）
+       DATA <channel> <訊息>        雙向：原本單一連線上的一行訊息
+       CLOSE <channel>              雙向：玩家離開 / server 關閉該玩家的連線
+       HEARTBEAT / HEARTBEAT_ACK    每條閘道連線一組，不再每位玩家各自心跳
+server 端每條閘道連線只用一條讀取執行緒、一條心跳執行緒與一個送出佇列，
+不論承載多少玩家；channel 上的指令照常進入 Player.cmd_queue。
+"""
+from __future__ import print_function, unicode_literals
+
+import socket
+import threading
+
+import six
+
+from package import protocol
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def frame(channel_id, data):
+    """把一段已編碼的訊息（可能多行）包成 DATA frame。"""
+    head = ("DATA %d " % channel_id).encode(protocol.ENCODING)
+    return b"".join(head + line + protocol.NEWLINE for line in data.splitlines() if line)
+
+
+def is_channel(sock):
+    return isinstance(sock, Channel)
+
+
+class Channel(object):
+    """
+    server 端：閘道連線上的一位玩家。
+    介面與 socket 相同（sendall / close），可以直接交給 ConnectionManager 的既有流程。
+
+    :ivar on_close: on_close(channel)，channel 關閉時呼叫一次
+    """
+    def __init__(self, gateway, channel_id):
+        self.gateway = gateway
+        self.id = channel_id
+        self.player = None
+        self.outbound = None
+        self.bucket = None
+        self.closed = False
+        self.on_close = None
+
+    def sendall(self, data, droppable=False):
+        if not self.closed:
+            self.gateway.outbound.put(frame(self.id, data), droppable)
+
+    def close(self):
+        with self.gateway.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.gateway.channels.pop(self.id, None)
+        self.gateway.outbound.put(protocol.encode("CLOSE", self.id))
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def shutdown(self, how=None):
+        self.close()
+
+
+class ChannelOutbound(object):
+    """channel 的送出端，介面與 OutboundQueue 相同；訊息直接放進閘道連線共用的送出佇列。"""
+    def __init__(self, channel):
+        self.socket = channel
+
+    @property
+    def closed(self):
+        return self.socket.closed or self.socket.gateway.outbound.closed
+
+    def __len__(self):
+        return 0
+
+    def put(self, data, droppable=False):
+        if self.closed:
+            return False
+        self.socket.sendall(data, droppable)
+        return True
+
+    def close(self):
+        self.socket.close()
+
+    def join(self, timeout=None):
+        pass
+
+
+class Gateway(object):
+    """
+    server 端：一條閘道連線。
+
+    :param outbound: 這條連線的 OutboundQueue
+    """
+    def __init__(self, sock, address, outbound):
+        self.socket = sock
+        self.address = address
+        self.outbound = outbound
+        self.channels = {}
+        self.lock = threading.Lock()
+        self.heartbeat_queue = queue.Queue()
+
+    def open(self, channel_id):
+        """:return: 新的 Channel；channel id 已在使用中時回傳 None"""
+        with self.lock:
+            if channel_id in self.channels:
+                return None
+            channel = Channel(self, channel_id)
+            self.channels[channel_id] = channel
+            return channel
+
+    def get(self, channel_id):
+        with self.lock:
+            return self.channels.get(channel_id)
+
+    def close(self):
+        """閘道連線中斷：關閉所有 channel。"""
+        with self.lock:
+            channels = list(self.channels.values())
+        for channel in channels:
+            channel.close()
+        self.outbound.close()
+
+
+class MuxClient(object):
+    """
+    client 端：以一條連線承載多位玩家。
+
+        mux = MuxClient(("localhost", 12345))
+        channel = mux.open("player1")
+        channel.send("1234")
+        line = channel.recv()       # 一行訊息（已去掉換行），連線關閉時為 None
+
+    :param on_line: on_line(channel_id, line)；指定時由讀取執行緒直接回呼，不放進各 channel 的佇列
+    """
+    def __init__(self, address, on_line=None, timeout=10.0):
+        self.on_line = on_line
+        self.socket = socket.create_connection(address, timeout)
+        self._send_lock = threading.Lock()
+        self._channels = {}
+        self._next_id = 1
+        self._buf = b""
+
+        self._expect_line(protocol.CHECK_ID)
+        self.socket.sendall(protocol.encode("MUX"))
+        self._expect_line(protocol.encode("MUX"))
+        self.socket.settimeout(None)
+
+        self._reader = threading.Thread(target=self._read_loop)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read_line(self):
+        while protocol.NEWLINE not in self._buf:
+            data = self.socket.recv(65536)
+            if not data:
+                return None
+            self._buf += data
+        line, self._buf = self._buf.split(protocol.NEWLINE, 1)
+        return line
+
+    def _expect_line(self, expected):
+        line = self._read_line()
+        if line is None or line + protocol.NEWLINE != expected:
+            raise IOError("unexpected mux handshake: %r" % line)
+
+    def open(self, player_id):
+        with self._send_lock:
+            channel_id = self._next_id
+            self._next_id += 1
+            channel = ClientChannel(self, channel_id)
+            self._channels[channel_id] = channel
+            self.socket.sendall(protocol.encode("OPEN", channel_id, player_id))
+        return channel
+
+    def _send(self, data):
+        with self._send_lock:
+            self.socket.sendall(data)
+
+    def _read_loop(self):
+        try:
+            while True:
+                line = self._read_line()
+                if line is None:
+                    break
+                name, args = protocol.decode(line.decode(protocol.ENCODING))
+                if name == "HEARTBEAT":
+                    self._send(protocol.HEARTBEAT_ACK)
+                elif name == "DATA":
+                    channel_id = int(args[0])
+                    text = args[1] if len(args) > 1 else ""
+                    if self.on_line is not None:
+                        self.on_line(channel_id, text)
+                    else:
+                        channel = self._channels.get(channel_id)
+                        if channel is not None:
+                            channel.lines.put(text)
+                elif name == "CLOSE":
+                    channel = self._channels.pop(int(args[0]), None)
+                    if self.on_line is not None:
+                        self.on_line(int(args[0]), None)
+                    elif channel is not None:
+                        channel.lines.put(None)
+        except Exception:
+            pass
+        for channel_id, channel in list(self._channels.items()):
+            if self.on_line is not None:
+                self.on_line(channel_id, None)
+            else:
+                channel.lines.put(None)
+        self._channels.clear()
+
+    def close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        self.socket.close()
+
+
+class ClientChannel(object):
+    def __init__(self, client, channel_id):
+        self.client = client
+        self.id = channel_id
+        self.lines = queue.Queue()
+
+    def send(self, text):
+        self.client._send(protocol.encode("DATA", self.id, six.text_type(text)))
+
+    def recv(self, timeout=None):
+        return self.lines.get(timeout=timeout)
+
+    def close(self):
+        self.client._channels.pop(self.id, None)
+        self.client._send(protocol.encode("CLOSE", self.id))
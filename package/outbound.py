@@ -0,0 +1,171 @@
+# outbound.py
+# -*- coding: utf-8 -*-
+"""
+每條連線的送出佇列。
+
+遊戲執行緒與心跳執行緒都只把訊息放進佇列，由該連線專屬的 writer 執行緒依序 sendall，
+同一個 socket 不會被兩條執行緒交錯寫入，遊戲執行緒也不會因為對方 TCP window 滿了而卡住。
+
+佇列滿時的處理方式（policy）：
+  - drop_heartbeat：丟掉心跳訊息騰出空間，仍然放不下才斷線
+  - disconnect：直接斷開這個慢速連線
+斷線後 session 仍保留，玩家可以重新連回。
+"""
+from __future__ import print_function
+
+import collections
+import socket
+import threading
+import time
+
+POLICY_DROP_HEARTBEAT = "drop_heartbeat"
+POLICY_DISCONNECT = "disconnect"
+
+
+class OutboundMetrics(object):
+    """所有連線共用的送出統計。"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.dropped = 0
+        self.overflow_disconnects = 0
+        self.max_depth = 0
+        self.writes = 0
+        self.write_seconds = 0.0
+        self.max_write_seconds = 0.0
+
+    def record_put(self, depth):
+        with self._lock:
+            self.messages += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def record_drop(self, count=1):
+        with self._lock:
+            self.dropped += count
+
+    def record_disconnect(self):
+        with self._lock:
+            self.overflow_disconnects += 1
+
+    def record_write(self, seconds):
+        with self._lock:
+            self.writes += 1
+            self.write_seconds += seconds
+            if seconds > self.max_write_seconds:
+                self.max_write_seconds = seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "messages": self.messages,
+                "dropped": self.dropped,
+                "overflow_disconnects": self.overflow_disconnects,
+                "max_depth": self.max_depth,
+                "writes": self.writes,
+                "write_seconds": self.write_seconds,
+                "max_write_seconds": self.max_write_seconds,
+            }
+
+
+class OutboundQueue(object):
+    """
+    :param sock: 要寫入的 socket
+    :param maxsize: 佇列最多暫存幾則訊息
+    :param policy: POLICY_DROP_HEARTBEAT 或 POLICY_DISCONNECT
+    :param metrics: 共用的 OutboundMetrics
+    """
+    def __init__(self, sock, maxsize=256, policy=POLICY_DROP_HEARTBEAT, metrics=None):
+        self.socket = sock
+        self.maxsize = maxsize
+        self.policy = policy
+        self.metrics = metrics if metrics is not None else OutboundMetrics()
+        self.closed = False
+
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(target=self._write_loop)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, data, droppable=False):
+        """
+        放入一則已編碼的訊息，永遠不會阻塞。
+
+        :param droppable: 是否可在佇列滿時丟棄（心跳）
+        :return: 是否成功放入
+        """
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                if self.policy == POLICY_DROP_HEARTBEAT:
+                    if droppable:
+                        self.metrics.record_drop()
+                        return False
+                    kept = [item for item in self._items if not item[1]]
+                    if len(kept) < len(self._items):
+                        self.metrics.record_drop(len(self._items) - len(kept))
+                        self._items.clear()
+                        self._items.extend(kept)
+                if len(self._items) >= self.maxsize:
+                    self.metrics.record_disconnect()
+                    self._abort()
+                    return False
+            self._items.append((data, droppable))
+            self.metrics.record_put(len(self._items))
+            self._cond.notify()
+            return True
+
+    def close(self):
+        """送完佇列中剩下的訊息後關閉 socket。"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def join(self, timeout=None):
+        self._writer.join(timeout)
+
+    def _abort(self):
+        # 慢速連線：丟掉待送訊息並立即中斷，讓讀取執行緒偵測到斷線
+        self.closed = True
+        self._items.clear()
+        self._cond.notify()
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._items and not self.closed:
+                    self._cond.wait()
+                if not self._items:
+                    break
+                # 一次把目前累積的訊息合併送出
+                data = b"".join(item[0] for item in self._items)
+                self._items.clear()
+
+            start = time.time()
+            try:
+                self.socket.sendall(data)
+            except Exception:
+                with self._cond:
+                    self.closed = True
+                    self._items.clear()
+                break
+            self.metrics.record_write(time.time() - start)
+
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        try:
+            self.socket.close()
+        except Exception:
+            pass
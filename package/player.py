@@ -1,9 +1,14 @@
 import random
 
+from package.variant import CLASSIC
+
 class Player(object):
-    def __init__(self, name):
+    def __init__(self, name, answer=None, variant=CLASSIC):
+        """
+        :param variant: 沒有指定 answer 時，依這個變體抽一組答案（開局時 Game 會再依本局變體重新發）
+        """
         self.name = name
-        self.answer = random.sample(list('0123456789'), 4)
+        self.answer = variant.random_code(random) if answer is None else answer
         self.number_hand = []   # players draw number cards
         self.tool_hand = []     # players draw tool cards
         self.best_A = 0
@@ -12,10 +17,14 @@ class Player(object):
 
         self.cmd_queue = None
         self.heartbeat_queue = None
+        # 遊戲執行緒目前等待的階段（inbound.Expectation），None 表示不接受指令
+        self.expecting = None
 
         self.socket = None
+        self.outbound = None
         self.address = None
         self.is_alive = False
+        self.disconnected_at = None
 
     def to_dict(self):
         return {
@@ -33,15 +42,20 @@ class Player(object):
 
     @classmethod
     def from_dict(cls, data):
-        player = cls(data.get("name", "Unknown"))
-        player.answer = data.get("answer", [])
-        player.number_hand = data.get("number_hand", [])
-        player.tool_hand = data.get("tool_hand", [])
-        player.best_A = data.get("best_A", 0)
-        player.best_B = data.get("best_B", 0)
-        player.action_histories = data.get("action_histories", [])
+        # 直接帶入存檔中的答案，不另外抽一組再覆寫
+        player = cls(data.get("name", "Unknown"), data.get("answer", []))
+        player.load_state(data)
         return player
 
+    def load_state(self, data):
+        """套用 to_dict() 存檔中的答案、手牌、分數與動作紀錄。"""
+        self.answer = data.get("answer", [])
+        self.number_hand = data.get("number_hand", [])
+        self.tool_hand = data.get("tool_hand", [])
+        self.best_A = data.get("best_A", 0)
+        self.best_B = data.get("best_B", 0)
+        self.action_histories = data.get("action_histories", [])
+
     def __str__(self):
         return self.name
 
@@ -0,0 +1,219 @@
+# protocol.py
+# -*- coding: utf-8 -*-
+"""
+Server 與 Client 共用的訊息協定。
+
+每則訊息為一行文字（以 \\n 結尾），第一個欄位是指令名稱，其餘欄位以空白分隔，
+例如 ``RESULT 1 2``。也接受整行 JSON：``{"type": "RESULT", "args": [1, 2]}``。
+
+  - 所有訊息型別都登記在 MESSAGES，啟動時就預先編好 encoder / decoder
+  - 沒有參數的常用訊息（HEARTBEAT、TOOL…）直接快取成 bytes，送出時不需再格式化或編碼
+  - Dispatcher 以 dict 對應指令名稱到 handler，查表 O(1)
+"""
+from __future__ import unicode_literals
+
+import json
+
+import six
+
+ENCODING = "utf-8"
+NEWLINE = b"\n"
+
+
+def _join(values):
+    return ",".join(values)
+
+
+def _split(text):
+    return text.split(",") if text else []
+
+
+class MessageType(object):
+    """
+    一種訊息的格式定義。
+
+    :param name: 指令名稱
+    :param fmt: 參數部分的格式字串（% 格式），None 表示沒有參數
+    :param maxsplit: 解碼時參數最多切成幾段，-1 表示不限
+    :param encode_args: 編碼前對參數的轉換（例如把 list join 成字串）
+    :param decode_args: 解碼後對參數字串的轉換，回傳參數 list
+    """
+    def __init__(self, name, fmt=None, maxsplit=-1, encode_args=None, decode_args=None):
+        self.name = name
+        self.fmt = fmt
+        self.maxsplit = maxsplit
+        self._encode_args = encode_args
+        self._decode_args = decode_args
+
+        self.prefix = name.encode(ENCODING)
+        # 沒有參數的訊息直接快取整行 bytes
+        self.constant = None if fmt else self.prefix + NEWLINE
+        self._head = name + " "
+
+    def encode(self, *args):
+        if self.constant is not None:
+            return self.constant
+        if self._encode_args is not None:
+            args = self._encode_args(*args)
+        return (self._head + self.fmt % args + "\n").encode(ENCODING)
+
+    def decode(self, body):
+        if self._decode_args is not None:
+            return self._decode_args(body)
+        if not body:
+            return []
+        return body.split(None, self.maxsplit)
+
+
+MESSAGES = {}
+
+
+def register(name, fmt=None, maxsplit=-1, encode_args=None, decode_args=None):
+    message_type = MessageType(name, fmt, maxsplit, encode_args, decode_args)
+    MESSAGES[name] = message_type
+    return message_type
+
+
+def _decode_hand(body):
+    nums, _, tools = body.partition(";")
+    return [_split(nums), _split(tools)]
+
+
+# Server → Client
+register("CHECK_ID")
+# 本局的變體：答案位數、可用數字、答案可否重複（0 / 1）
+register("VARIANT", "%d %s %d",
+         encode_args=lambda variant: (variant.digits, variant.alphabet, int(variant.repeats)))
+register("HAND", "%s;%s",
+         encode_args=lambda nums, tools: (_join(nums), _join(tools)),
+         decode_args=_decode_hand)
+register("TOOL")
+register("USED_TOOL", "%s")
+register("POS", "%s %s")
+register("POS_RESULT", "%d %s")
+register("SHUFFLE_RESULT", "%s", encode_args=lambda answer: ("".join(answer),))
+register("EXCLUDE_RESULT", "%s")
+register("DOUBLE_ACTIVE")
+register("RESHUFFLE_DONE")
+register("GUESS", "%s",
+         encode_args=lambda nums: (_join(nums),),
+         decode_args=lambda body: [_split(body)])
+register("RESULT", "%d %d")
+register("OPP_TOOL", "%s %s")
+register("OPP_GUESS", "%s %s %d %d")
+register("STATUS", "%s")
+register("WINNER", "%s")
+register("DRAW")
+register("DISCONNECTED", "%s")
+register("FULL", "%d")
+register("SERVER_DRAIN", "%d")
+register("HEARTBEAT")
+register("SPECTATING", "%s")
+register("NO_SESSION")
+register("TARGET", "%s",
+         encode_args=lambda names: (_join(names),),
+         decode_args=lambda body: [_split(body)])
+register("OPP_TARGET", "%s %s")
+register("DEADLINE", "%s %s %d")
+register("TIMEOUT", "%s")
+# 猜測階段逾時時伺服器代為出的猜測
+register("AUTO_GUESS", "%s")
+register("FORFEIT", "%s")
+register("BRACKET", "%d")
+register("ELIMINATED")
+register("CHAMPION", "%s")
+
+# Client → Server
+register("HEARTBEAT_ACK")
+register("SPECTATE", "%s")
+
+# 多工閘道（見 package/mux.py），MUX 雙向各送一次完成交握
+register("MUX")
+register("OPEN", "%d %s", maxsplit=1)
+register("DATA", "%d %s", maxsplit=1)
+register("CLOSE", "%d")
+
+# 快取好的常數訊息
+CHECK_ID = MESSAGES["CHECK_ID"].constant
+TOOL = MESSAGES["TOOL"].constant
+DOUBLE_ACTIVE = MESSAGES["DOUBLE_ACTIVE"].constant
+RESHUFFLE_DONE = MESSAGES["RESHUFFLE_DONE"].constant
+DRAW = MESSAGES["DRAW"].constant
+HEARTBEAT = MESSAGES["HEARTBEAT"].constant
+HEARTBEAT_ACK = MESSAGES["HEARTBEAT_ACK"].constant
+NO_SESSION = MESSAGES["NO_SESSION"].constant
+ELIMINATED = MESSAGES["ELIMINATED"].constant
+
+
+def encode(name, *args):
+    """依登記的格式把訊息編成一行 bytes。"""
+    return MESSAGES[name].encode(*args)
+
+
+def to_bytes(msg):
+    """
+    把任意格式的訊息轉成可直接 sendall 的 bytes：
+      - bytes：原樣使用
+      - str / unicode：以 utf-8 編碼
+      - dict / list：轉成 JSON
+    結尾沒有換行時自動補上。
+    """
+    if isinstance(msg, six.binary_type):
+        data = msg
+    elif isinstance(msg, six.text_type):
+        data = msg.encode(ENCODING)
+    elif isinstance(msg, (dict, list)):
+        data = json.dumps(msg).encode(ENCODING)
+    else:
+        data = six.text_type(msg).encode(ENCODING)
+    if not data.endswith(NEWLINE):
+        data += NEWLINE
+    return data
+
+
+def decode(line):
+    """
+    解析一行訊息（bytes、str 或 JSON 皆可）。
+
+    :return: (name, args)，未登記的指令 args 為以空白切開的字串 list；
+             格式錯誤的 JSON（或不是 object）回傳 ("", [])，交給預設 handler 處理
+    """
+    if isinstance(line, six.binary_type):
+        line = line.decode(ENCODING)
+    line = line.strip()
+    if line.startswith("{"):
+        try:
+            obj = json.loads(line)
+            return six.text_type(obj.get("type", "")), list(obj.get("args", []))
+        except (ValueError, TypeError, AttributeError):
+            return "", []
+
+    name, _, body = line.partition(" ")
+    message_type = MESSAGES.get(name)
+    if message_type is None:
+        return name, body.split()
+    return name, message_type.decode(body)
+
+
+class Dispatcher(object):
+    """
+    指令名稱 → handler 的對應表。
+
+    handler 以 handler(args, line) 呼叫，回傳值原樣交給呼叫端。
+    """
+    def __init__(self, default=None):
+        self._handlers = {}
+        self._default = default
+
+    def on(self, name):
+        def decorator(func):
+            self._handlers[name] = func
+            return func
+        return decorator
+
+    def dispatch(self, line):
+        name, args = decode(line)
+        handler = self._handlers.get(name, self._default)
+        if handler is None:
+            return None
+        return handler(args, line)
@@ -1,23 +1,73 @@
 # redis_store.py
 import redis
 import json
+import six
 
-from package.utils import safe_call, format_log
+from package.store import BaseStore
+from package.utils import safe_call
 
 
-class RedisStore(object):
-    def __init__(self, host='localhost', port=6379, db=0):
-        self.r = redis.StrictRedis(host=host,
-                                   port=port,
-                                   db=db)
+# lease 值為 "<node id> <fencing token>"，fencing token 由 game:<id>:fence 遞增產生
+_ACQUIRE_LEASE = """
+local cur = redis.call('GET', KEYS[1])
+if cur then
+    local node, token = string.match(cur, '^(.*) (%d+)$')
+    if node ~= ARGV[1] then
+        return {0, node}
+    end
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return {tonumber(token), node}
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ' ' .. token, 'PX', ARGV[2])
+return {token, ARGV[1]}
+"""
 
-    @staticmethod
-    def _player_key(player_id):
-        return "player:%s" % player_id
+_RENEW_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_SAVE_FENCED = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2])
+return 1
+"""
+
+# 各節點依使用率排序的 sorted set
+_NODES_LOAD = "nodes:load"
+
+
+class RedisStore(BaseStore):
+    supports_events = True
+
+    def __init__(self, host='localhost', port=6379, db=0, client=None):
+        """
+        :param client: 已建立的 StrictRedis 相容連線（例如 benchmark 用的替代品），指定時忽略 host / port / db
+        """
+        super(RedisStore, self).__init__()
+        self.r = client if client is not None else redis.StrictRedis(host=host,
+                                                                    port=port,
+                                                                    db=db)
+        self._acquire_lease = self.r.register_script(_ACQUIRE_LEASE)
+        self._renew_lease = self.r.register_script(_RENEW_LEASE)
+        self._release_lease = self.r.register_script(_RELEASE_LEASE)
+        self._save_fenced = self.r.register_script(_SAVE_FENCED)
 
     @staticmethod
-    def _game_key(game_session_id):
-        return "game:%s" % game_session_id
+    def _spectate_channel(game_session_id):
+        return "spectate:%s" % game_session_id
 
     @safe_call
     def save_player_state(self, player_id, state_dict):
@@ -32,15 +82,6 @@ class RedisStore(object):
             return json.loads(data)
         return None
     
-    @safe_call
-    def restore_player_state(self, game_session_id, player_id):
-        data = self.read_game_state(game_session_id)
-        if data:
-            for p in data["players"]:
-                if p["name"] == player_id:
-                    return p
-        return None
-
     @safe_call
     def save_player_game(self, player_id, game_session_id):
         key = RedisStore._player_key(player_id)
@@ -74,14 +115,175 @@ class RedisStore(object):
             return json.loads(data)
         return None
 
+    def scan_game_ids(self, batch_size=100):
+        """
+        以 SCAN 逐批列出所有 game:<id> 的 session id，不會像 KEYS 一樣阻塞 Redis。
+
+        :param batch_size: 每批回傳的 id 數量，同時作為 SCAN 的 COUNT 提示
+        :return: generator，每次產生一個 session id list
+        """
+        prefix = self._game_key("")
+        batch = []
+        for key in self.r.scan_iter(match=prefix + "*", count=batch_size):
+            game_session_id = six.ensure_str(key)[len(prefix):]
+            # 只收 game:<id>，跳過 game:<id>:xxx 之類的附屬 key
+            if ":" in game_session_id:
+                continue
+            batch.append(game_session_id)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
     @safe_call
-    def delete_game_state(self, game_session_id):
-        key = self._game_key(game_session_id)
-        game_data = self.read_game_state(game_session_id)
-        if game_data is None:
-            print(format_log("Game state not found when deleting."))
-            return
+    def read_game_states(self, game_session_ids):
+        """
+        用一次 pipeline 讀取多個 game state。
 
-        for p in game_data["players"]:
-            self.delete_player_game(p["name"])
-        self.r.delete(key)
+        :return: dict {game_session_id: state_dict}，不存在的 id 不會出現在結果中
+        """
+        pipe = self.r.pipeline(transaction=False)
+        for game_session_id in game_session_ids:
+            pipe.get(self._game_key(game_session_id))
+        states = {}
+        for game_session_id, data in zip(game_session_ids, pipe.execute()):
+            if data:
+                states[game_session_id] = json.loads(data)
+        return states
+
+    @safe_call
+    def read_restore_data(self, game_session_ids):
+        """
+        用一次 pipeline 讀取多個 game state 與它們的 checkpoint。
+
+        :return: dict {game_session_id: (state_dict, checkpoint 或 None)}，不存在的 id 不會出現在結果中
+        """
+        pipe = self.r.pipeline(transaction=False)
+        for game_session_id in game_session_ids:
+            pipe.get(self._game_key(game_session_id))
+            pipe.get(self._checkpoint_key(game_session_id))
+        replies = pipe.execute()
+        states = {}
+        for i, game_session_id in enumerate(game_session_ids):
+            data, checkpoint = replies[2 * i], replies[2 * i + 1]
+            if data:
+                states[game_session_id] = (json.loads(data), json.loads(checkpoint) if checkpoint else None)
+        return states
+
+    @safe_call
+    def _delete_game_key(self, game_session_id):
+        self.r.delete(self._game_key(game_session_id))
+
+    @safe_call
+    def save_checkpoint(self, game_session_id, checkpoint):
+        self.r.set(self._checkpoint_key(game_session_id), json.dumps(checkpoint))
+
+    @safe_call
+    def read_checkpoint(self, game_session_id):
+        data = self.r.get(self._checkpoint_key(game_session_id))
+        if data:
+            return json.loads(data)
+        return None
+
+    @safe_call
+    def _delete_checkpoint(self, game_session_id):
+        self.r.delete(self._checkpoint_key(game_session_id))
+
+    @staticmethod
+    def _owner_key(game_session_id):
+        return "game:%s:owner" % game_session_id
+
+    @staticmethod
+    def _fence_key(game_session_id):
+        return "game:%s:fence" % game_session_id
+
+    @staticmethod
+    def _node_key(node_id):
+        return "node:%s" % node_id
+
+    @safe_call
+    def acquire_lease(self, game_session_id, node_id, ttl):
+        token, owner = self._acquire_lease(
+            keys=[self._owner_key(game_session_id), self._fence_key(game_session_id)],
+            args=[node_id, int(ttl * 1000)])
+        return (int(token) or None), six.ensure_str(owner)
+
+    @safe_call
+    def renew_lease(self, game_session_id, node_id, token, ttl):
+        return bool(self._renew_lease(keys=[self._owner_key(game_session_id)],
+                                      args=["%s %d" % (node_id, token), int(ttl * 1000)]))
+
+    @safe_call
+    def release_lease(self, game_session_id, node_id, token):
+        self._release_lease(keys=[self._owner_key(game_session_id)],
+                            args=["%s %d" % (node_id, token)])
+
+    @safe_call
+    def lease_owner(self, game_session_id):
+        data = self.r.get(self._owner_key(game_session_id))
+        if not data:
+            return None
+        return six.ensure_str(data).rsplit(" ", 1)[0]
+
+    @safe_call
+    def save_game_state_fenced(self, game_session_id, game_state_dict, token):
+        return bool(self._save_fenced(
+            keys=[self._game_key(game_session_id), self._fence_key(game_session_id)],
+            args=[token, json.dumps(game_state_dict)]))
+
+    @safe_call
+    def _delete_lease(self, game_session_id):
+        self.r.delete(self._owner_key(game_session_id), self._fence_key(game_session_id))
+
+    @safe_call
+    def register_node(self, node_id, address, ttl):
+        self.r.set(self._node_key(node_id), address, px=int(ttl * 1000))
+
+    @safe_call
+    def node_address(self, node_id):
+        data = self.r.get(self._node_key(node_id))
+        return six.ensure_str(data) if data else None
+
+    @safe_call
+    def publish_load(self, node_id, load, ttl):
+        # node:<id>:load 存完整負載並隨 ttl 過期；nodes:load 依使用率排序，前端取分數最低且仍未過期的節點
+        pipe = self.r.pipeline()
+        pipe.set(self._node_key(node_id) + ":load", json.dumps(load), px=int(ttl * 1000))
+        pipe.zadd(_NODES_LOAD, {node_id: load["score"]})
+        pipe.execute()
+
+    @safe_call
+    def node_loads(self):
+        node_ids = [six.ensure_str(n) for n in self.r.zrange(_NODES_LOAD, 0, -1)]
+        if not node_ids:
+            return {}
+        values = self.r.mget([self._node_key(n) + ":load" for n in node_ids])
+        expired = [n for n, v in zip(node_ids, values) if v is None]
+        if expired:
+            self.r.zrem(_NODES_LOAD, *expired)
+        return dict((n, json.loads(v)) for n, v in zip(node_ids, values) if v is not None)
+
+    @safe_call
+    def publish_event(self, game_session_id, data):
+        self.r.publish(self._spectate_channel(game_session_id), data)
+
+    @safe_call
+    def event_subscribers(self, game_session_id):
+        channel = self._spectate_channel(game_session_id)
+        return self.r.pubsub_numsub(channel)[0][1]
+
+    def subscribe_events(self, game_session_id):
+        """
+        訂閱某個 session 的觀戰頻道。
+
+        :return: generator，逐一產生頻道上收到的 bytes
+        """
+        pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self._spectate_channel(game_session_id))
+        try:
+            for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+        finally:
+            pubsub.close()
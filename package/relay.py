@@ -0,0 +1,75 @@
+# relay.py
+# -*- coding: utf-8 -*-
+"""
+把玩家連線轉送到擁有該 session 的節點。
+
+轉送節點扮演 client：連到擁有者的遊戲 port，等 CHECK_ID 後送出玩家 ID，
+之後雙向原樣轉送 bytes。擁有者看到的就是一般的重新連線，不需要額外協定。
+"""
+from __future__ import print_function, unicode_literals
+
+import socket
+import threading
+import time
+
+from package import protocol
+from package.utils import format_log
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host, int(port)
+
+
+def _pump(src, dst):
+    try:
+        while True:
+            data = src.recv(4096)
+            if not data:
+                break
+            dst.sendall(data)
+    except Exception:
+        pass
+    # 一邊結束就關閉兩邊，另一條 pump 的 recv 會隨之返回
+    for s in (src, dst):
+        try:
+            s.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        try:
+            s.close()
+        except Exception:
+            pass
+
+
+def forward(client_socket, address, player_id, timeout=2.0):
+    """
+    在呼叫端的執行緒上連到擁有者並完成交握，最多阻塞約 timeout 秒（連線與等待 CHECK_ID 各自計時）。
+
+    :param address: 擁有者節點的 "host:port"
+    :return: 是否成功建立轉送
+    """
+    started = time.time()
+    try:
+        upstream = socket.create_connection(parse_address(address), timeout)
+        # 讀到 CHECK_ID 為止，多讀到的部分直接轉給玩家
+        buf = b""
+        while protocol.CHECK_ID not in buf:
+            data = upstream.recv(1024)
+            if not data:
+                raise IOError("upstream closed before CHECK_ID")
+            buf += data
+        rest = buf.split(protocol.CHECK_ID, 1)[1]
+        upstream.sendall(protocol.to_bytes(player_id))
+        upstream.settimeout(None)
+        if rest:
+            client_socket.sendall(rest)
+    except Exception as e:
+        print(format_log("轉送 %s 到 %s 失敗（%.1f 秒）: %s" % (player_id, address, time.time() - started, e)))
+        return False
+
+    for src, dst in ((client_socket, upstream), (upstream, client_socket)):
+        t = threading.Thread(target=_pump, args=(src, dst))
+        t.daemon = True
+        t.start()
+    return True
@@ -0,0 +1,130 @@
+# renderer.py
+# -*- coding: utf-8 -*-
+"""
+Client 的終端機畫面輸出。
+
+畫面分成兩塊：
+  - 上方為只會往下長的訊息與歷史紀錄
+  - 最下方為手牌區（數字手牌、道具手牌）
+
+AnsiRenderer 以 ANSI 游標控制只重畫有變動的那一行，不呼叫 cls / clear，
+每次更新的成本固定，不會隨歷史紀錄變長而變慢。
+不支援 ANSI 的終端機（或輸出被導向檔案）則使用 PlainRenderer 逐行附加輸出。
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import threading
+
+HAND_FORMAT = "你的數字手牌: %s"
+TOOL_FORMAT = "你的道具手牌: %s"
+
+_CURSOR_UP = "\x1b[%dA"
+_CURSOR_DOWN = "\x1b[%dB"
+_CLEAR_LINE = "\r\x1b[2K"
+_CLEAR_BELOW = "\r\x1b[J"
+
+
+class PlainRenderer(object):
+    """逐行附加輸出，適用於 dumb terminal 或非 tty。"""
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+        # 目前手牌區的內容（最後一行為空白分隔行）
+        self._block = None
+        # 手牌區是否仍是畫面上最後輸出的內容
+        self._block_at_bottom = False
+
+    def _write(self, text):
+        print(text, end="", file=self.stream)
+        self.stream.flush()
+
+    @staticmethod
+    def _hand_lines(nums, tools):
+        return [HAND_FORMAT % ",".join(nums), TOOL_FORMAT % ",".join(tools), ""]
+
+    def set_hand(self, nums, tools):
+        """更新手牌區，內容沒變且仍在畫面底部時不輸出。"""
+        lines = self._hand_lines(nums, tools)
+        with self._lock:
+            if self._block_at_bottom and lines == self._block:
+                return
+            self._write("\n".join(lines) + "\n")
+            self._block = lines
+            self._block_at_bottom = True
+
+    def message(self, text):
+        """輸出一般訊息。"""
+        with self._lock:
+            self._write(text + "\n")
+            self._block_at_bottom = False
+
+    def add_history(self, text):
+        """輸出一筆新的歷史紀錄（每筆只會輸出一次）。"""
+        self.message(text)
+
+    def before_prompt(self):
+        """即將呼叫 input()，之後的游標位置不再由 renderer 掌握。"""
+        with self._lock:
+            self._block_at_bottom = False
+
+
+class AnsiRenderer(PlainRenderer):
+    """以 ANSI 游標控制就地更新手牌區。"""
+
+    def set_hand(self, nums, tools):
+        lines = self._hand_lines(nums, tools)
+        with self._lock:
+            if not self._block_at_bottom:
+                self._write("\n".join(lines) + "\n")
+            else:
+                # 游標在手牌區下一行的行首，只改寫有變動的行
+                out = []
+                n = len(self._block)
+                for i, line in enumerate(lines):
+                    if line != self._block[i]:
+                        up = n - i
+                        out.append(_CURSOR_UP % up + _CLEAR_LINE + line + _CURSOR_DOWN % up + "\r")
+                if out:
+                    self._write("".join(out))
+            self._block = lines
+            self._block_at_bottom = True
+
+    def message(self, text):
+        with self._lock:
+            if not self._block_at_bottom:
+                self._write(text + "\n")
+                return
+            # 在手牌區上方插入訊息，再把手牌區畫回底部
+            self._write(_CURSOR_UP % len(self._block) + _CLEAR_BELOW
+                        + text + "\n" + "\n".join(self._block) + "\n")
+
+
+def _enable_windows_vt():
+    """在 Windows 10 以上的 console 開啟 ANSI 控制碼支援，失敗回傳 False。"""
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+    except Exception:
+        return False
+
+
+def create_renderer(stream=None):
+    """依終端機能力選擇 AnsiRenderer 或 PlainRenderer。"""
+    stream = stream or sys.stdout
+    try:
+        is_tty = stream.isatty()
+    except Exception:
+        is_tty = False
+    if not is_tty or os.environ.get("TERM") == "dumb":
+        return PlainRenderer(stream)
+    if os.name == "nt" and not _enable_windows_vt():
+        return PlainRenderer(stream)
+    return AnsiRenderer(stream)
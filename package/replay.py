@@ -0,0 +1,110 @@
+# replay.py
+# -*- coding: utf-8 -*-
+"""
+由 (seed, 事件紀錄) 重播一場對局。
+
+每筆事件都會重新執行一次，並與原本記錄的結果（A/B、道具）比對；
+來源是完整快照時，另外比對重播後的手牌與答案，確認牌局可由 seed 完整重現。
+可用來重現玩家回報的問題，也可用來確認 benchmark 的對局每次都相同。
+
+用法：
+  python -m package.replay <存檔 JSON 檔>
+  python -m package.replay <session id> [--backend redis|memory|sqlite]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import os
+import sys
+
+from package.game import Game
+from package.player import Player
+from package.store import create_store
+from package.variant import Variant
+
+
+def replay(state_dict, on_event=None):
+    """
+    :param on_event: on_event(game, index, event)，每重播一筆事件後呼叫
+    :return: (Game, mismatches)；mismatches 為 [(index, 原始事件, 重播結果), ...]
+    """
+    variant = Variant.from_state(state_dict)
+    players = [Player(p["name"], variant=variant) for p in state_dict["players"]]
+    game = Game(players, seed=state_dict["seed"], variant=variant)
+    game.MAX_ROUNDS = state_dict.get("MAX_ROUNDS", Game.MAX_ROUNDS)
+
+    mismatches = []
+    for index, event in enumerate(state_dict.get("events", [])):
+        game.apply(event)
+        replayed = game.events[-1]
+        if replayed != list(event):
+            mismatches.append((index, event, replayed))
+        if on_event is not None:
+            on_event(game, index, event)
+    return game, mismatches
+
+
+def compare_snapshot(game, state_dict):
+    """:return: 重播結果與完整快照不同的欄位描述 list"""
+    diffs = []
+    for player, data in zip(game.players, state_dict["players"]):
+        for field in ("answer", "number_hand", "tool_hand", "best_A", "best_B"):
+            if field in data and getattr(player, field) != data[field]:
+                diffs.append("%s.%s: replay=%s saved=%s" % (player.name, field, getattr(player, field), data[field]))
+    for field in ("number_deck", "tool_deck", "discard_number", "discard_tool"):
+        if field in state_dict and getattr(game, field) != state_dict[field]:
+            diffs.append("%s differs" % field)
+    return diffs
+
+
+def format_event(game, index, event):
+    round_no, player_idx, kind, target_idx, value, a, b = event
+    player = game.players[player_idx]
+    target = game.players[target_idx].name if target_idx >= 0 else "-"
+    line = "#%-4d r%-3d %-10s %-8s -> %-10s %-10s" % (index, round_no, player.name, kind, target, value or "")
+    if kind == "GUESS":
+        line += " %dA%dB  hand=%s" % (a, b, "".join(player.number_hand))
+    return line
+
+
+def load(source, backend=None):
+    if os.path.exists(source):
+        with open(source) as f:
+            return json.load(f)
+    return create_store(backend).read_game_state(source)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", help="存檔 JSON 檔，或 store 中的 session id")
+    parser.add_argument("--backend", default=None, help="讀取 session id 時使用的 store，預設為 config.STORE_BACKEND")
+    parser.add_argument("--quiet", action="store_true", help="只輸出比對結果")
+    args = parser.parse_args()
+
+    state = load(args.source, args.backend)
+    if not state:
+        print("找不到存檔: %s" % args.source)
+        sys.exit(2)
+    if "seed" not in state:
+        print("存檔沒有 seed，無法重播（舊格式）")
+        sys.exit(2)
+
+    on_event = None if args.quiet else lambda game, index, event: print(format_event(game, index, event))
+    game, mismatches = replay(state, on_event)
+
+    print("seed=%d, events=%d, round=%d" % (game.seed, len(game.events), state.get("round", game.round)))
+    for player in game.players:
+        print("  %-10s answer=%s best=%dA%dB" % (player.name, "".join(player.answer), player.best_A, player.best_B))
+    for index, event, replayed in mismatches:
+        print("MISMATCH #%d: saved=%s replay=%s" % (index, event, replayed))
+    diffs = compare_snapshot(game, state) if "number_deck" in state else []
+    for diff in diffs:
+        print("MISMATCH %s" % diff)
+    if mismatches or diffs:
+        sys.exit(1)
+    print("replay OK")
+
+
+if __name__ == "__main__":
+    main()
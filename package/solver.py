@@ -0,0 +1,280 @@
+# solver.py
+# -*- coding: utf-8 -*-
+"""
+大型答案空間的計分與候選答案追蹤，供提示、機器人玩家與道具效果評估使用。
+
+每位數字以 4 bit 存放（第 i 位在第 i 個 nibble），一組答案就是一個整數：
+  - A：guess 與候選答案 XOR 後，值為 0 的 nibble 數
+  - 共同數字數：答案不重複時，是兩邊數字集合（每種數字一個 bit 的 mask）交集的 bit 數；
+    可重複時，對 guess 中的每種數字，把它複製到每個 nibble 後與候選答案 XOR，0 的 nibble 數即出現次數
+整個候選陣列一次計算（有 numpy 時以 numpy 陣列運算，否則逐一以 Python 整數運算），
+每得到一次結果就只保留回應相同的候選答案，之後的計算量隨候選數一起縮小。
+
+6 位 16 進位的答案空間有數百萬到一千多萬種，需要 numpy；沒有 numpy 時只適合 classic 等較小的變體。
+
+    candidates = Candidates(CodeSpace(variant))
+    candidates.guess("01a3f", 1, 2)     # 猜 01a3f 得到 1A2B
+    candidates.exclude("7")             # EXCLUDE：7 不在答案中
+    guess = candidates.pick(hand)       # 用手牌挑一個仍可能是答案的猜測
+"""
+from __future__ import division, unicode_literals
+
+import array
+import collections
+import itertools
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# 0 ~ 65535 每個數的 bit 數
+_POPCOUNT16 = bytearray(bin(i).count("1") for i in range(1 << 16))
+_POPCOUNT16_ARRAY = numpy.frombuffer(bytes(_POPCOUNT16), dtype=numpy.uint8) if numpy is not None else None
+
+
+class CodeSpace(object):
+    """
+    一個變體的所有答案，以及對整批候選答案的計分。
+
+    :param use_numpy: 預設有 numpy 就使用
+    """
+    # 以 uint32 存放，最多 8 位
+    MAX_DIGITS = 8
+
+    def __init__(self, variant, use_numpy=None):
+        if variant.digits > self.MAX_DIGITS:
+            raise ValueError("solver supports at most %d digits" % self.MAX_DIGITS)
+        if use_numpy and numpy is None:
+            raise ValueError("numpy is not installed")
+        self.variant = variant
+        self.digits = variant.digits
+        self.use_numpy = numpy is not None if use_numpy is None else use_numpy
+        self._index = dict((d, i) for i, d in enumerate(variant.alphabet))
+        # 每個 nibble 的最低位；乘上它可以把各 nibble 的值加總到最高的 nibble
+        self._low = sum(1 << (4 * i) for i in range(self.digits))
+        self._top = 4 * (self.digits - 1)
+
+    @property
+    def size(self):
+        return self.variant.size
+
+    def pack(self, code):
+        packed = 0
+        for i, d in enumerate(code):
+            packed |= self._index[d] << (4 * i)
+        return packed
+
+    def unpack(self, packed):
+        alphabet = self.variant.alphabet
+        return "".join(alphabet[(packed >> (4 * i)) & 0xF] for i in range(self.digits))
+
+    def mask(self, digits):
+        """數字集合的 mask（每種數字一個 bit）。"""
+        mask = 0
+        for d in digits:
+            mask |= 1 << self._index[d]
+        return mask
+
+    def response(self, a, b):
+        """把 (A, B) 編成一個整數，方便整批比較。"""
+        return a * (self.digits + 1) + b
+
+    def enumerate(self):
+        """
+        :return: (codes, masks)：所有答案的 packed code 與數字集合 mask。
+                 numpy 為 uint32 / uint16 陣列，否則為 array('L') / array('H')
+        """
+        if self.use_numpy:
+            return self._enumerate_numpy()
+        n = len(self.variant.alphabet)
+        if self.variant.repeats:
+            codes_iter = itertools.product(range(n), repeat=self.digits)
+        else:
+            codes_iter = itertools.permutations(range(n), self.digits)
+        codes = array.array("L")
+        masks = array.array("H")
+        for digits in codes_iter:
+            packed = mask = 0
+            for i, d in enumerate(digits):
+                packed |= d << (4 * i)
+                mask |= 1 << d
+            codes.append(packed)
+            masks.append(mask)
+        return codes, masks
+
+    def _enumerate_numpy(self):
+        # 逐位展開：每個前綴接上每一種數字，不可重複時去掉前綴已用過的數字
+        n = len(self.variant.alphabet)
+        symbols = numpy.arange(n, dtype=numpy.uint32)
+        bits = numpy.uint32(1) << symbols
+        codes, masks = symbols.copy(), bits.copy()
+        for i in range(1, self.digits):
+            prefix_masks = numpy.repeat(masks, n)
+            new_bits = numpy.tile(bits, len(codes))
+            codes = numpy.repeat(codes, n) | numpy.tile(symbols << (4 * i), len(codes))
+            masks = prefix_masks | new_bits
+            if not self.variant.repeats:
+                fresh = (prefix_masks & new_bits) == 0
+                codes, masks = codes[fresh], masks[fresh]
+        return codes, masks.astype(numpy.uint16)
+
+    def _nonzero_nibbles(self, x):
+        """每個 nibble 非 0 的個數；x 可以是整數或 numpy uint32 陣列（乘法溢位不影響結果所在的 nibble）。"""
+        flags = (x | (x >> 1) | (x >> 2) | (x >> 3)) & self._low
+        return ((flags * self._low) >> self._top) & 0xF
+
+    def count(self, codes, digit):
+        """每個 code 中 digit 出現的次數。"""
+        return self.digits - self._nonzero_nibbles(codes ^ (self._index[digit] * self._low))
+
+    def score(self, codes, masks, guess):
+        """
+        :return: 每個候選答案對 guess 的回應 response(A, B)，numpy 陣列或 list。
+                 以 A * k + 共同數字數計算，等於 A * k + (A + B) = A * (k + 1) + B
+        """
+        packed = self.pack(guess)
+        if self.use_numpy:
+            hits = self.digits - self._nonzero_nibbles(codes ^ numpy.uint32(packed))
+            if self.variant.repeats:
+                common = 0
+                for d, need in collections.Counter(guess).items():
+                    common = common + numpy.minimum(self.count(codes, d), need)
+            else:
+                common = _POPCOUNT16_ARRAY[masks & self.mask(guess)]
+            return hits * self.digits + common
+
+        nonzero = self._nonzero_nibbles
+        digits = self.digits
+        if self.variant.repeats:
+            needs = [(self._index[d] * self._low, need) for d, need in collections.Counter(guess).items()]
+            responses = []
+            for code in codes:
+                hits = digits - nonzero(code ^ packed)
+                common = sum(min(digits - nonzero(code ^ pattern), need) for pattern, need in needs)
+                responses.append(hits * digits + common)
+            return responses
+        guess_mask = self.mask(guess)
+        return [(digits - nonzero(code ^ packed)) * digits + _POPCOUNT16[mask & guess_mask]
+                for code, mask in zip(codes, masks)]
+
+    def multiset_keys(self, codes):
+        """
+        每個 code 的數字組成（不論順序）：第 s 個 nibble 為數字 s 的個數。
+        用 uint64 存放，最多 16 種數字。
+        """
+        if self.use_numpy:
+            keys = numpy.zeros(len(codes), dtype=numpy.uint64)
+            for i in range(self.digits):
+                symbols = ((codes >> (4 * i)) & 0xF).astype(numpy.uint64)
+                keys += numpy.uint64(1) << (symbols * numpy.uint64(4))
+            return keys
+        keys = []
+        for code in codes:
+            key = 0
+            for i in range(self.digits):
+                key += 1 << (4 * ((code >> (4 * i)) & 0xF))
+            keys.append(key)
+        return keys
+
+
+class Candidates(object):
+    """依目前得到的資訊，對手答案仍可能是哪些 code。"""
+    def __init__(self, space):
+        self.space = space
+        self.codes, self.masks = space.enumerate()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _keep(self, keep):
+        if self.space.use_numpy:
+            self.codes, self.masks = self.codes[keep], self.masks[keep]
+        else:
+            self.codes = array.array("L", itertools.compress(self.codes, keep))
+            self.masks = array.array("H", itertools.compress(self.masks, keep))
+        return len(self)
+
+    def guess(self, guess, a, b):
+        """
+        猜 guess 得到 aAbB：只保留對 guess 回應相同的候選答案。
+
+        :return: 剩餘的候選數
+        """
+        expected = self.space.response(a, b)
+        responses = self.space.score(self.codes, self.masks, guess)
+        if self.space.use_numpy:
+            return self._keep(responses == expected)
+        return self._keep([r == expected for r in responses])
+
+    def exclude(self, digit):
+        """EXCLUDE：digit 不在答案中。"""
+        bit = self.space.mask(digit)
+        if self.space.use_numpy:
+            return self._keep((self.masks & bit) == 0)
+        return self._keep([not mask & bit for mask in self.masks])
+
+    def reveal(self, pos, digit):
+        """POS：答案第 pos 位（從 0 起算）是 digit。"""
+        shift, symbol = 4 * pos, self.space.pack(digit)
+        if self.space.use_numpy:
+            return self._keep(((self.codes >> shift) & 0xF) == symbol)
+        return self._keep([(code >> shift) & 0xF == symbol for code in self.codes])
+
+    def shuffled(self):
+        """
+        SHUFFLE：答案被重新排列，只剩數字組成可以沿用。
+        重新展開整個答案空間，保留數字組成與任一個目前候選答案相同的 code。
+        """
+        space = self.space
+        codes, masks = space.enumerate()
+        if space.variant.repeats:
+            known, keys = space.multiset_keys(self.codes), space.multiset_keys(codes)
+        else:
+            # 不重複時數字集合就是數字組成
+            known, keys = self.masks, masks
+        if space.use_numpy:
+            keep = numpy.isin(keys, numpy.unique(known))
+        else:
+            known = set(known)
+            keep = [key in known for key in keys]
+        self.codes, self.masks = codes, masks
+        return self._keep(keep)
+
+    def pick(self, hand=None, rng=random):
+        """
+        挑一個仍可能是答案的 code 作為下一次猜測（機器人玩家與提示使用）。
+
+        :param hand: 數字手牌；指定時只挑手牌組得出來的 code
+        :return: str，沒有符合的候選答案時回傳 None
+        """
+        space = self.space
+        keep = None
+        if hand is not None:
+            have = collections.Counter(hand)
+            if space.variant.repeats:
+                for d in space.variant.alphabet:
+                    if have[d] < space.digits:
+                        fits = space.count(self.codes, d) <= have[d] if space.use_numpy else \
+                            [space.count(code, d) <= have[d] for code in self.codes]
+                        keep = fits if keep is None else (
+                            keep & fits if space.use_numpy else [x and y for x, y in zip(keep, fits)])
+            else:
+                missing = ((1 << len(space.variant.alphabet)) - 1) & ~space.mask(have)
+                keep = (self.masks & missing) == 0 if space.use_numpy else \
+                    [not mask & missing for mask in self.masks]
+
+        if keep is None:
+            indices = range(len(self))
+        elif space.use_numpy:
+            indices = numpy.flatnonzero(keep)
+        else:
+            indices = [i for i, ok in enumerate(keep) if ok]
+        if not len(indices):
+            return None
+        return space.unpack(int(self.codes[indices[rng.randrange(len(indices))]]))
+
+    def sample(self, limit=10):
+        """:return: 前 limit 個候選答案（str list），顯示提示用"""
+        return [self.space.unpack(int(code)) for code in self.codes[:limit]]
@@ -0,0 +1,220 @@
+# spectator.py
+# -*- coding: utf-8 -*-
+"""
+觀戰功能的事件廣播。
+
+遊戲執行緒只把事件 append 進該 session 的 FanoutBuffer（O(1)，不碰 socket），
+實際送給觀戰者的工作由 SpectatorHub 的 I/O worker 執行緒負責，
+觀戰者再多、網路再慢也不會拖慢兩位玩家的回合。
+
+觀戰者連在其他伺服器程序時，事件會經由 Redis pub/sub 轉送。
+是否有其他程序訂閱由 worker 查詢（有快取），沒有任何觀戰者時 worker 直接丟棄事件，不做任何 I/O。
+"""
+from __future__ import print_function, unicode_literals
+
+import collections
+import threading
+import time
+
+from package.utils import format_log
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class Spectator(object):
+    def __init__(self, sock, address):
+        self.socket = sock
+        self.address = address
+        self.is_alive = True
+
+    def close(self):
+        self.is_alive = False
+        try:
+            self.socket.close()
+        except Exception:
+            pass
+
+
+class FanoutBuffer(object):
+    """
+    單一 session 的觀戰事件緩衝區。
+
+    :param capacity: 最多暫存幾則尚未送出的事件，超過時丟掉最舊的
+    """
+    def __init__(self, session_id, capacity=1024):
+        self.session_id = session_id
+        self.spectators = []
+        self.closed = False
+        self.scheduled = False
+        self.remote = False
+
+        self._events = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def append(self, data):
+        with self._lock:
+            self._events.append(data)
+
+    def pending(self):
+        with self._lock:
+            return bool(self._events)
+
+    def drain(self):
+        """取出目前累積的全部事件，合併成一段 bytes。"""
+        with self._lock:
+            if not self._events:
+                return b""
+            data = b"".join(self._events)
+            self._events.clear()
+            return data
+
+
+class SpectatorHub(object):
+    """
+    管理所有 session 的 FanoutBuffer，並以固定數量的 worker 執行緒送出事件。
+
+    :param store: 有 publish_event / subscribe_events 的 store（RedisStore），None 則只在本機廣播
+    :param workers: I/O worker 執行緒數量
+    :param send_timeout: 單一觀戰者送出的逾時秒數，逾時視為斷線
+    :param remote_check_interval: 查詢其他程序訂閱數的快取秒數
+    """
+    def __init__(self, store=None, workers=4, send_timeout=1.0, remote_check_interval=1.0):
+        self._store = store
+        self._send_timeout = send_timeout
+        self._remote_check_interval = remote_check_interval
+        self._buffers = {}
+        # session_id → (查詢時間, 其他程序的訂閱數)
+        self._remote_watchers = {}
+        self._lock = threading.Lock()
+        self._ready = queue.Queue()
+
+        for _ in range(workers):
+            t = threading.Thread(target=self._worker)
+            t.daemon = True
+            t.start()
+
+    def _buffer(self, session_id, create=True):
+        session_id = str(session_id)
+        with self._lock:
+            buf = self._buffers.get(session_id)
+            if buf is None and create:
+                buf = FanoutBuffer(session_id)
+                self._buffers[session_id] = buf
+            return buf
+
+    def _schedule(self, buf):
+        # 同一個 buffer 同時只會排進佇列一次，由單一 worker 依序送出
+        with self._lock:
+            if buf.scheduled:
+                return
+            buf.scheduled = True
+        self._ready.put(buf)
+
+    def _has_remote_watchers(self, session_id, refresh=False):
+        """其他程序是否有人訂閱這個 session（只由 worker 呼叫）；查詢結果快取 remote_check_interval 秒。"""
+        if self._store is None:
+            return False
+        session_id = str(session_id)
+        now = time.time()
+        with self._lock:
+            checked = self._remote_watchers.get(session_id)
+        if refresh or checked is None or now - checked[0] >= self._remote_check_interval:
+            checked = (now, self._store.event_subscribers(session_id) or 0)
+            with self._lock:
+                self._remote_watchers[session_id] = checked
+        return checked[1] > 0
+
+    def publish(self, session_id, data):
+        """遊戲執行緒呼叫：只在記憶體中放入事件後立即返回，不做任何 I/O。"""
+        buf = self._buffer(session_id)
+        buf.append(data)
+        self._schedule(buf)
+
+    def close_session(self, session_id):
+        """
+        session 結束：送完剩下的事件後關閉所有觀戰連線（由 worker 處理）。
+        遊戲執行緒呼叫也不會阻塞；重複呼叫沒有作用。
+        """
+        buf = self._buffer(session_id)
+        if buf.closed:
+            return
+        buf.closed = True
+        self._schedule(buf)
+
+    def add_spectator(self, session_id, sock, address, remote=False):
+        """
+        加入一位觀戰者。
+
+        :param remote: session 不在本機，需訂閱 Redis 頻道接收事件
+        """
+        sock.settimeout(self._send_timeout)
+        buf = self._buffer(session_id)
+        with self._lock:
+            buf.spectators.append(Spectator(sock, address))
+            subscribe = remote and not buf.remote
+            if subscribe:
+                buf.remote = True
+        if subscribe:
+            t = threading.Thread(target=self._remote_reader, args=(buf,))
+            t.daemon = True
+            t.start()
+
+    def spectator_count(self, session_id):
+        buf = self._buffer(session_id, create=False)
+        return len(buf.spectators) if buf is not None else 0
+
+    def _remote_reader(self, buf):
+        """把其他伺服器程序透過 Redis 發布的事件轉進本機 buffer。"""
+        try:
+            for data in self._store.subscribe_events(buf.session_id):
+                if not data:
+                    # 空訊息代表 session 已結束
+                    buf.closed = True
+                else:
+                    buf.append(data)
+                self._schedule(buf)
+                if buf.closed:
+                    return
+        except Exception as e:
+            print(format_log("訂閱觀戰頻道 %s 失敗: %s" % (buf.session_id, e)))
+
+    def _worker(self):
+        while True:
+            buf = self._ready.get()
+            data = buf.drain()
+
+            # 本機產生的事件才往 Redis 發布（避免轉送迴圈），而且要有其他程序訂閱
+            forward = (self._store is not None and not buf.remote
+                       and (data or buf.closed) and self._has_remote_watchers(buf.session_id, refresh=not data))
+            if data:
+                if forward:
+                    self._store.publish_event(buf.session_id, data)
+                for spectator in list(buf.spectators):
+                    try:
+                        spectator.socket.sendall(data)
+                    except Exception:
+                        spectator.close()
+
+            # 處理期間又有新事件就重新排隊，同一個 buffer 不會被兩個 worker 同時處理
+            with self._lock:
+                buf.spectators = [s for s in buf.spectators if s.is_alive]
+                requeue = buf.pending()
+                finished = buf.closed and not requeue
+                if not requeue:
+                    buf.scheduled = False
+                if finished:
+                    self._buffers.pop(buf.session_id, None)
+
+            if requeue:
+                self._ready.put(buf)
+            elif finished:
+                with self._lock:
+                    self._remote_watchers.pop(buf.session_id, None)
+                if forward:
+                    # 空訊息通知其他程序的觀戰者 session 已結束
+                    self._store.publish_event(buf.session_id, b"")
+                for spectator in buf.spectators:
+                    spectator.close()
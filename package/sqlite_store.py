@@ -0,0 +1,173 @@
+# sqlite_store.py
+# -*- coding: utf-8 -*-
+"""
+單機用的內嵌 SQLite store。
+
+  - 資料庫開在 WAL 模式，讀取不會被寫入擋住
+  - 寫入先放進 pending，由背景執行緒每 flush_interval 秒（或累積 batch_size 筆）
+    在同一個 transaction 內一次 commit，每回合存檔不必各自等一次 fsync
+  - 讀取先看 pending，自己剛寫入但還沒 commit 的資料也讀得到
+程序異常結束時最多遺失 flush_interval 秒內的寫入；drain 關機時會先 flush()。
+"""
+from __future__ import print_function, unicode_literals
+
+import json
+import sqlite3
+import threading
+
+import six
+
+from package.store import BaseStore
+from package.utils import safe_call, format_log
+
+_DELETED = None
+
+
+class SQLiteStore(BaseStore):
+    """
+    :param path: 資料庫檔案路徑
+    :param flush_interval: 背景 commit 的間隔秒數
+    :param batch_size: pending 累積到這麼多筆就提早 commit
+    """
+    def __init__(self, path="game_state.db", flush_interval=0.05, batch_size=500):
+        super(SQLiteStore, self).__init__()
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        with self._writer:
+            self._writer.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._write_lock = threading.Lock()
+
+        # key → value，_DELETED 表示待刪除
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._local = threading.local()
+
+        self._flusher = threading.Thread(target=self._flush_loop)
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def _reader(self):
+        # sqlite3 連線不能跨執行緒共用，每條執行緒各開一條讀取連線
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def _set(self, key, value):
+        with self._cond:
+            self._pending[key] = value
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _get(self, key):
+        with self._cond:
+            if key in self._pending:
+                return self._pending[key]
+        row = self._reader().execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _delete(self, key):
+        self._set(key, _DELETED)
+
+    def flush(self):
+        """把 pending 的寫入在同一個 transaction 內 commit。"""
+        with self._write_lock:
+            with self._cond:
+                batch = dict(self._pending)
+            if not batch:
+                return
+            upserts = [(k, v) for k, v in batch.items() if v is not _DELETED]
+            deletes = [(k,) for k, v in batch.items() if v is _DELETED]
+            with self._writer:
+                if upserts:
+                    self._writer.executemany("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", upserts)
+                if deletes:
+                    self._writer.executemany("DELETE FROM kv WHERE key = ?", deletes)
+            # commit 後才移出 pending；期間又被改寫的 key 留到下一批
+            with self._cond:
+                for key, value in batch.items():
+                    if key in self._pending and self._pending[key] is value:
+                        del self._pending[key]
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                self._cond.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(format_log("SQLite 寫入失敗: %s" % e))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        self.flush()
+        self._writer.close()
+
+    def save_player_state(self, player_id, state_dict):
+        self._set(self._player_key(player_id), json.dumps(state_dict))
+
+    @safe_call
+    def read_player_state(self, player_id):
+        data = self._get(self._player_key(player_id))
+        return json.loads(data) if data else None
+
+    def delete_player_state(self, player_id):
+        self._delete(self._player_key(player_id))
+
+    def save_player_game(self, player_id, game_session_id):
+        self._set(self._player_key(player_id) + ":game", six.text_type(game_session_id))
+
+    @safe_call
+    def read_player_game(self, player_id):
+        return self._get(self._player_key(player_id) + ":game")
+
+    def delete_player_game(self, player_id):
+        self._delete(self._player_key(player_id) + ":game")
+
+    def save_game_state(self, game_session_id, game_state_dict):
+        self._set(self._game_key(game_session_id), json.dumps(game_state_dict))
+
+    @safe_call
+    def read_game_state(self, game_session_id):
+        data = self._get(self._game_key(game_session_id))
+        return json.loads(data) if data else None
+
+    def _delete_game_key(self, game_session_id):
+        self._delete(self._game_key(game_session_id))
+
+    def save_checkpoint(self, game_session_id, checkpoint):
+        self._set(self._checkpoint_key(game_session_id), json.dumps(checkpoint))
+
+    @safe_call
+    def read_checkpoint(self, game_session_id):
+        data = self._get(self._checkpoint_key(game_session_id))
+        return json.loads(data) if data else None
+
+    def _delete_checkpoint(self, game_session_id):
+        self._delete(self._checkpoint_key(game_session_id))
+
+    def scan_game_ids(self, batch_size=100):
+        self.flush()
+        prefix = self._game_key("")
+        # "game;" 是緊接在所有 "game:..." 之後的字串，走主鍵的範圍查詢
+        cursor = self._reader().execute("SELECT key FROM kv WHERE key >= ? AND key < ? ORDER BY key",
+                                        (prefix, prefix[:-1] + ";"))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            batch = [row[0][len(prefix):] for row in rows if ":" not in row[0][len(prefix):]]
+            if batch:
+                yield batch
@@ -0,0 +1,268 @@
+# store.py
+# -*- coding: utf-8 -*-
+"""
+遊戲狀態儲存的共用介面。
+
+  - BaseStore：所有 store 共用的 key 命名與衍生操作，子類別只需實作少數幾個基本讀寫
+  - get_store()：依 config.STORE_BACKEND 建立程序共用的 store
+      redis  → RedisStore（多台伺服器共用狀態，支援跨程序觀戰）
+      memory → MemoryStore（單機、測試用，程序結束即消失）
+      sqlite → SQLiteStore（單機，寫入本機檔案，批次 commit）
+"""
+from __future__ import print_function, unicode_literals
+
+import threading
+import time
+
+from package import config
+from package.utils import format_log
+
+BACKENDS = ("redis", "memory", "sqlite")
+
+
+class BaseStore(object):
+    """
+    子類別需實作：
+      save_player_state / read_player_state / delete_player_state
+      save_player_game / read_player_game / delete_player_game
+      save_game_state / read_game_state / _delete_game_key / scan_game_ids
+      save_checkpoint / read_checkpoint / _delete_checkpoint
+
+    :cvar supports_events: 是否能在程序間轉送觀戰事件（publish_event / subscribe_events）
+    """
+    supports_events = False
+
+    def __init__(self):
+        # 單機 store 的 lease 狀態：session id → (node id, fencing token, 到期時間)，以及各 session 最新的 token
+        self._leases = {}
+        self._fences = {}
+        self._lease_lock = threading.Lock()
+
+    @staticmethod
+    def _player_key(player_id):
+        return "player:%s" % player_id
+
+    @staticmethod
+    def _game_key(game_session_id):
+        return "game:%s" % game_session_id
+
+    @staticmethod
+    def _checkpoint_key(game_session_id):
+        return "game:%s:checkpoint" % game_session_id
+
+    def save_player_state(self, player_id, state_dict):
+        raise NotImplementedError
+
+    def read_player_state(self, player_id):
+        raise NotImplementedError
+
+    def delete_player_state(self, player_id):
+        raise NotImplementedError
+
+    def save_player_game(self, player_id, game_session_id):
+        raise NotImplementedError
+
+    def read_player_game(self, player_id):
+        raise NotImplementedError
+
+    def delete_player_game(self, player_id):
+        raise NotImplementedError
+
+    def save_game_state(self, game_session_id, game_state_dict):
+        raise NotImplementedError
+
+    def read_game_state(self, game_session_id):
+        raise NotImplementedError
+
+    def _delete_game_key(self, game_session_id):
+        raise NotImplementedError
+
+    def save_checkpoint(self, game_session_id, checkpoint):
+        """保存 Game.checkpoint() 的完整快照，與每回合的精簡存檔分開存放。"""
+        raise NotImplementedError
+
+    def read_checkpoint(self, game_session_id):
+        raise NotImplementedError
+
+    def _delete_checkpoint(self, game_session_id):
+        raise NotImplementedError
+
+    def scan_game_ids(self, batch_size=100):
+        """
+        逐批列出所有 game:<id> 的 session id。
+
+        :return: generator，每次產生一個 session id list
+        """
+        raise NotImplementedError
+
+    def restore_player_state(self, game_session_id, player_id):
+        data = self.read_game_state(game_session_id)
+        if data:
+            for p in data["players"]:
+                if p["name"] == player_id:
+                    return p
+        return None
+
+    def read_game_states(self, game_session_ids):
+        """
+        讀取多個 game state。
+
+        :return: dict {game_session_id: state_dict}，不存在的 id 不會出現在結果中
+        """
+        states = {}
+        for game_session_id in game_session_ids:
+            data = self.read_game_state(game_session_id)
+            if data:
+                states[game_session_id] = data
+        return states
+
+    def read_restore_data(self, game_session_ids):
+        """
+        讀取多個 game state 連同各自的 checkpoint，供批次復原使用。
+
+        :return: dict {game_session_id: (state_dict, checkpoint 或 None)}，不存在的 id 不會出現在結果中
+        """
+        states = {}
+        for game_session_id, data in self.read_game_states(game_session_ids).items():
+            states[game_session_id] = (data, self.read_checkpoint(game_session_id))
+        return states
+
+    def delete_game_state(self, game_session_id):
+        game_data = self.read_game_state(game_session_id)
+        if game_data is None:
+            print(format_log("Game state not found when deleting."))
+            return
+
+        for p in game_data["players"]:
+            self.delete_player_game(p["name"])
+        self._delete_game_key(game_session_id)
+        self._delete_checkpoint(game_session_id)
+        self._delete_lease(game_session_id)
+
+    # --- session 擁有權（lease）---
+    # 單機 store 只有本程序會存取，以程序內的 dict 模擬；RedisStore 以 Lua script 實作成叢集共用。
+
+    def _delete_lease(self, game_session_id):
+        with self._lease_lock:
+            self._leases.pop(str(game_session_id), None)
+            self._fences.pop(str(game_session_id), None)
+
+    def acquire_lease(self, game_session_id, node_id, ttl):
+        """
+        取得 session 的 lease，已由本節點持有時只延長期限。
+
+        :return: (fencing token, 目前擁有者 node id)；被其他節點持有時 token 為 None
+        """
+        key = str(game_session_id)
+        now = time.time()
+        with self._lease_lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease[2] > now:
+                if lease[0] != node_id:
+                    return None, lease[0]
+                self._leases[key] = (node_id, lease[1], now + ttl)
+                return lease[1], node_id
+            token = self._fences.get(key, 0) + 1
+            self._fences[key] = token
+            self._leases[key] = (node_id, token, now + ttl)
+            return token, node_id
+
+    def renew_lease(self, game_session_id, node_id, token, ttl):
+        key = str(game_session_id)
+        now = time.time()
+        with self._lease_lock:
+            lease = self._leases.get(key)
+            if lease is None or lease[2] <= now or lease[:2] != (node_id, token):
+                return False
+            self._leases[key] = (node_id, token, now + ttl)
+            return True
+
+    def release_lease(self, game_session_id, node_id, token):
+        with self._lease_lock:
+            lease = self._leases.get(str(game_session_id))
+            if lease is not None and lease[:2] == (node_id, token):
+                del self._leases[str(game_session_id)]
+
+    def lease_owner(self, game_session_id):
+        with self._lease_lock:
+            lease = self._leases.get(str(game_session_id))
+            if lease is None or lease[2] <= time.time():
+                return None
+            return lease[0]
+
+    def save_game_state_fenced(self, game_session_id, game_state_dict, token):
+        """
+        只有 token 仍是最新的 fencing token 時才寫入（compare-and-set）。
+
+        :return: 是否寫入成功；False 表示 session 已被其他節點接手
+        """
+        with self._lease_lock:
+            if self._fences.get(str(game_session_id), 0) != token:
+                return False
+            self.save_game_state(game_session_id, game_state_dict)
+            return True
+
+    def register_node(self, node_id, address, ttl):
+        """登記節點的轉送位址，ttl 秒內沒有再登記即視為離線。"""
+
+    def node_address(self, node_id):
+        return None
+
+    def publish_load(self, node_id, load, ttl):
+        """
+        公開節點目前的負載，供前端把新玩家導向較空閒的節點。
+
+        :param load: {"score": 0~1 的使用率, 其餘為各項計數}
+        """
+
+    def node_loads(self):
+        """:return: {node_id: load}，只含 ttl 內有公開負載的節點"""
+        return {}
+
+    def publish_event(self, game_session_id, data):
+        pass
+
+    def subscribe_events(self, game_session_id):
+        return iter(())
+
+    def event_subscribers(self, game_session_id):
+        """:return: 其他程序中訂閱此 session 觀戰頻道的數量"""
+        return 0
+
+    def flush(self):
+        """把尚未寫入的資料寫出（有批次寫入的 store 才需要）。"""
+
+    def close(self):
+        self.flush()
+
+
+def create_store(backend=None):
+    """依 backend 名稱（預設 config.STORE_BACKEND）建立新的 store。"""
+    backend = config.STORE_BACKEND if backend is None else backend
+    if backend == "redis":
+        from package.redis_store import RedisStore
+        return RedisStore(config.REDIS_HOST, config.REDIS_PORT, config.REDIS_DB)
+    if backend == "memory":
+        from package.memory_store import MemoryStore
+        return MemoryStore(config.MEMORY_STORE_STRIPES)
+    if backend == "sqlite":
+        from package.sqlite_store import SQLiteStore
+        return SQLiteStore(config.SQLITE_PATH, config.SQLITE_FLUSH_INTERVAL,
+                           config.SQLITE_BATCH_SIZE)
+    raise ValueError("unknown store backend %r, expected one of %s" % (backend, ", ".join(BACKENDS)))
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_store():
+    """
+    程序共用的 store。
+    memory store 只存在於單一程序內，所有 session 必須用同一個實例。
+    """
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = create_store()
+        return _shared_store
@@ -0,0 +1,77 @@
+# timer.py
+# -*- coding: utf-8 -*-
+"""
+所有 session 共用的期限排程器。
+
+一條執行緒搭配一個 heap 管理全部的期限，不必每次等待都開 timer 執行緒
+或在每個 queue.get() 上各自帶 timeout。取消只是做標記，等它浮到 heap 頂端時再丟掉。
+"""
+from __future__ import print_function
+
+import heapq
+import itertools
+import threading
+import time
+
+from package.utils import format_log
+
+
+class Deadline(object):
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def remaining(self):
+        return max(0.0, self.when - time.time())
+
+
+class DeadlineScheduler(object):
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        t = threading.Thread(target=self._run)
+        t.daemon = True
+        t.start()
+
+    def schedule(self, delay, callback, *args):
+        """delay 秒後在排程執行緒上呼叫 callback(*args)，回傳可 cancel() 的 Deadline。"""
+        deadline = Deadline(time.time() + delay, callback, args)
+        with self._cond:
+            heapq.heappush(self._heap, (deadline.when, next(self._seq), deadline))
+            if self._heap[0][2] is deadline:
+                self._cond.notify()
+        return deadline
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def _next_due(self):
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                wait = self._heap[0][0] - time.time()
+                if wait <= 0:
+                    return heapq.heappop(self._heap)[2]
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            deadline = self._next_due()
+            if deadline.cancelled:
+                continue
+            try:
+                deadline.callback(*deadline.args)
+            except Exception as e:
+                print(format_log("Deadline callback failed: %s" % e))
@@ -0,0 +1,188 @@
+# tournament.py
+# -*- coding: utf-8 -*-
+"""
+賽程排程：單淘汰（EliminationBracket）與瑞士制（SwissBracket）。
+
+排程器只負責「誰跟誰在哪一場」，實際開房交給 start_room(room) callback，
+房間結束後由呼叫端回報 room_finished(room, standings)。
+下一輪的房間在它需要的前一輪房間全部結束時立刻開始，不必等整輪打完，
+因此數百個房間可以同時在不同輪次進行。
+"""
+from __future__ import print_function, unicode_literals
+
+import threading
+
+
+class Room(object):
+    def __init__(self, room_id, round_no, players=None):
+        self.id = room_id
+        self.round = round_no
+        self.players = list(players or [])
+        self.standings = None
+        # 單淘汰：還沒結束的上游房間數
+        self.feeders_left = 0
+
+    def __repr__(self):
+        return "Room(%s, round=%d, players=%d)" % (self.id, self.round, len(self.players))
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class EliminationBracket(object):
+    """
+    單淘汰賽：每房 room_size 人，前 advance 名晉級下一輪。
+
+    :param start_room: start_room(room)，開始一場比賽
+    :param on_eliminated: on_eliminated(player)，玩家被淘汰時呼叫
+    :param on_complete: on_complete(champion)，產生冠軍時呼叫
+    """
+    def __init__(self, players, start_room, room_size=4, advance=1,
+                 on_eliminated=None, on_complete=None):
+        if not 1 <= advance < room_size:
+            raise ValueError("advance must be between 1 and room_size - 1")
+        self.room_size = room_size
+        self.advance = advance
+        self.champion = None
+        self._start_room = start_room
+        self._on_eliminated = on_eliminated
+        self._on_complete = on_complete
+        self._lock = threading.Lock()
+
+        # 建好整棵賽程樹：每 fan_in 個房間的晉級者組成下一輪的一個房間
+        fan_in = max(2, room_size // advance)
+        self._parents = {}
+        self.rounds = [[Room("r1-%d" % i, 1, chunk)
+                        for i, chunk in enumerate(_chunks(list(players), room_size))]]
+        while len(self.rounds[-1]) > 1:
+            round_no = len(self.rounds) + 1
+            children = self.rounds[-1]
+            parents = [Room("r%d-%d" % (round_no, i), round_no)
+                       for i in range((len(children) + fan_in - 1) // fan_in)]
+            for i, child in enumerate(children):
+                parent = parents[i // fan_in]
+                parent.feeders_left += 1
+                self._parents[child.id] = parent
+            self.rounds.append(parents)
+
+    def start(self):
+        for room in self.rounds[0]:
+            self._launch(room)
+
+    def _launch(self, room):
+        if len(room.players) < 2:
+            # 輪空：直接晉級
+            self.room_finished(room, list(room.players))
+        else:
+            self._start_room(room)
+
+    def room_finished(self, room, standings):
+        """某一場結束，standings 為依名次排序的玩家。"""
+        with self._lock:
+            room.standings = standings
+            parent = self._parents.get(room.id)
+            if parent is None:
+                self.champion = standings[0] if standings else None
+                ready = False
+            else:
+                parent.players.extend(standings[:self.advance])
+                parent.feeders_left -= 1
+                ready = parent.feeders_left == 0
+
+        eliminated = standings[1:] if parent is None else standings[self.advance:]
+        if self._on_eliminated is not None:
+            for player in eliminated:
+                self._on_eliminated(player)
+
+        if parent is None:
+            if self._on_complete is not None:
+                self._on_complete(self.champion)
+        elif ready:
+            self._launch(parent)
+
+
+class SwissBracket(object):
+    """
+    瑞士制：打固定 rounds 輪，每輪依積分把同分玩家分在同一房。
+
+    房間第 r 名得 (人數 - 1 - r) 分，輪空得 room_size - 1 分。
+    同一輪同積分的玩家只要湊滿 room_size 人就立刻開房；
+    某一輪全部結束後，剩下湊不滿的玩家再依積分高低併房。
+
+    :param on_complete: on_complete(standings)，standings 為 [(player, score), ...] 由高到低
+    """
+    def __init__(self, players, start_room, rounds=3, room_size=4, on_complete=None):
+        if room_size < 2:
+            raise ValueError("room_size must be at least 2")
+        self.room_size = room_size
+        self.num_rounds = rounds
+        self.players = list(players)
+        self.scores = dict((p, 0) for p in self.players)
+        self._start_room = start_room
+        self._on_complete = on_complete
+        self._lock = threading.Lock()
+
+        # (round_no, score) → 等待開房的玩家
+        self._pools = {}
+        # round_no → 尚未打完該輪的玩家數
+        self._pending = dict((r, len(self.players)) for r in range(1, rounds + 1))
+        self._room_seq = 0
+
+    def start(self):
+        with self._lock:
+            rooms = self._make_rooms(1, self.players)
+        for room in rooms:
+            self._launch(room)
+
+    def _make_rooms(self, round_no, players):
+        rooms = []
+        for chunk in _chunks(players, self.room_size):
+            self._room_seq += 1
+            rooms.append(Room("r%d-%d" % (round_no, self._room_seq), round_no, chunk))
+        return rooms
+
+    def _launch(self, room):
+        if len(room.players) < 2:
+            self.room_finished(room, list(room.players))
+        else:
+            self._start_room(room)
+
+    def room_finished(self, room, standings):
+        to_launch = []
+        complete = False
+        with self._lock:
+            room.standings = standings
+            n = len(standings)
+            for rank, player in enumerate(standings):
+                self.scores[player] += (self.room_size - 1) if n == 1 else (n - 1 - rank)
+
+            self._pending[room.round] -= n
+            next_round = room.round + 1
+            if next_round <= self.num_rounds:
+                for player in standings:
+                    key = (next_round, self.scores[player])
+                    pool = self._pools.setdefault(key, [])
+                    pool.append(player)
+                    if len(pool) >= self.room_size:
+                        to_launch.extend(self._make_rooms(next_round, pool))
+                        del self._pools[key]
+
+                if self._pending[room.round] == 0:
+                    # 本輪全部結束，剩餘玩家依積分高低併房
+                    leftovers = []
+                    for key in sorted(k for k in self._pools if k[0] == next_round):
+                        leftovers.extend(self._pools.pop(key))
+                    leftovers.sort(key=lambda p: self.scores[p], reverse=True)
+                    to_launch.extend(self._make_rooms(next_round, leftovers))
+            elif self._pending[room.round] == 0:
+                complete = True
+
+        for next_room in to_launch:
+            self._launch(next_room)
+
+        if complete and self._on_complete is not None:
+            self._on_complete(self.final_standings())
+
+    def final_standings(self):
+        return sorted(self.scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,130 @@
+# variant.py
+# -*- coding: utf-8 -*-
+"""
+遊戲變體：答案位數、可用的數字（字母表）以及答案是否可以有重複數字。
+
+  classic        4 位、0-9、不重複（5,040 種答案，原本的玩法）
+  hard           5 位、0-9a-f、不重複（524,160 種）
+  expert         6 位、0-9a-f、不重複（5,765,760 種）
+  expert_repeat  6 位、0-9a-f、可重複（16,777,216 種）
+
+變體會跟著 Game 一起存檔（to_dict / to_log 的 "variant"），開局時以 VARIANT 訊息通知 client。
+"""
+from __future__ import unicode_literals
+
+import random
+
+HEX = "0123456789abcdef"
+
+
+class Variant(object):
+    """
+    :param digits: 答案位數
+    :param alphabet: 可用的數字，依序排列；數字牌堆每個數字各放一組
+    :param repeats: 答案是否可以有重複數字
+    """
+    # solver 以 4 bit 存一位數字，最多 16 種數字
+    MAX_ALPHABET = 16
+
+    def __init__(self, digits=4, alphabet="0123456789", repeats=False):
+        if not 1 <= len(alphabet) <= self.MAX_ALPHABET or len(set(alphabet)) != len(alphabet):
+            raise ValueError("invalid alphabet: %r" % alphabet)
+        if digits < 1 or (not repeats and digits > len(alphabet)):
+            raise ValueError("invalid digits: %r" % digits)
+        self.digits = digits
+        self.alphabet = alphabet
+        self.repeats = repeats
+
+    def random_code(self, rng=random):
+        """隨機產生一組答案（list of str）。"""
+        if self.repeats:
+            return [rng.choice(self.alphabet) for _ in range(self.digits)]
+        return rng.sample(list(self.alphabet), self.digits)
+
+    def is_code(self, code):
+        """code 的長度、數字與重複規則是否符合這個變體。"""
+        return (len(code) == self.digits and all(d in self.alphabet for d in code)
+                and (self.repeats or len(set(code)) == len(code)))
+
+    @property
+    def size(self):
+        """答案空間的大小。"""
+        n = len(self.alphabet)
+        if self.repeats:
+            return n ** self.digits
+        total = 1
+        for i in range(self.digits):
+            total *= n - i
+        return total
+
+    @property
+    def name(self):
+        for name, variant in VARIANTS.items():
+            if variant == self:
+                return name
+        return "%dx%d%s" % (self.digits, len(self.alphabet), "r" if self.repeats else "")
+
+    def to_dict(self):
+        return {"digits": self.digits, "alphabet": self.alphabet, "repeats": self.repeats}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls.shared(data["digits"], data["alphabet"], data.get("repeats", False))
+
+    @classmethod
+    def from_state(cls, state_dict):
+        """由 Game 存檔取得變體；沒有 "variant" 的舊存檔是 0-9 不重複、位數為 NUM_GUESS_DIGITS。"""
+        if "variant" in state_dict:
+            return cls.from_dict(state_dict["variant"])
+        return cls.shared(state_dict.get("NUM_GUESS_DIGITS", CLASSIC.digits), CLASSIC.alphabet, False)
+
+    @classmethod
+    def shared(cls, digits, alphabet, repeats):
+        """變體建立後不會修改，復原大量房間時共用同一個物件。"""
+        key = (digits, alphabet, repeats)
+        variant = _shared.get(key)
+        if variant is None:
+            variant = _shared.setdefault(key, cls(digits, alphabet, repeats))
+        return variant
+
+    def __eq__(self, other):
+        return isinstance(other, Variant) and (self.digits, self.alphabet, self.repeats) == (
+            other.digits, other.alphabet, other.repeats)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.digits, self.alphabet, self.repeats))
+
+    def __repr__(self):
+        return "Variant(%d, %r, %r)" % (self.digits, self.alphabet, self.repeats)
+
+
+CLASSIC = Variant()
+_shared = {(CLASSIC.digits, CLASSIC.alphabet, CLASSIC.repeats): CLASSIC}
+
+VARIANTS = {
+    "classic": CLASSIC,
+    "hard": Variant(5, HEX),
+    "expert": Variant(6, HEX),
+    "expert_repeat": Variant(6, HEX, repeats=True),
+}
+
+
+def get(name):
+    """
+    依名稱取得變體：VARIANTS 中的名稱，或 "<位數>x<數字種類>[r]"（例如 5x16、6x10r，數字取 0-9a-f 的前幾個）。
+    """
+    if name in VARIANTS:
+        return VARIANTS[name]
+    spec = name.lower()
+    repeats = spec.endswith("r")
+    digits, _, size = spec.rstrip("r").partition("x")
+    try:
+        digits, size = int(digits), int(size)
+        if size > len(HEX):
+            raise ValueError(size)
+        return Variant(digits, HEX[:size], repeats)
+    except ValueError:
+        raise ValueError("unknown variant: %r" % name)
@@ -4,6 +4,8 @@
 from __future__ import print_function, unicode_literals
 
 import json
+import signal
+import sys
 import threading
 import socket
 import time
@@ -12,8 +14,18 @@ from datetime import datetime
 from uuid import uuid4
 
 from package.game import ToolCard, Game
+from package import config, mux, protocol, relay, variant
+from package.admission import AdmissionController
+from package.archive import Archiver
+from package.inbound import Expectation, InboundMetrics, LineBuffer, TokenBucket
+from package.lease import LeaseManager
+from package.lifecycle import SessionRegistry
+from package.outbound import OutboundMetrics, OutboundQueue
 from package.player import Player
-from package.redis_store import RedisStore
+from package.store import get_store
+from package.spectator import SpectatorHub
+from package.timer import DeadlineScheduler
+from package.tournament import EliminationBracket, SwissBracket
 from package.utils import format_log
 
 # Python2/3 兼容 Queue
@@ -38,76 +50,515 @@ class ConnectionManager(object):
       - 啟動「讀取指令」執行緒與「心跳檢測」執行緒
       - 斷線時通知遊戲主持
     """
-    def __init__(self, host, port):
+    def __init__(self, host, port, room_size=2):
+        if not Game.MIN_PLAYERS <= room_size <= Game.MAX_PLAYERS:
+            raise ValueError("room_size must be between %d and %d" % (Game.MIN_PLAYERS, Game.MAX_PLAYERS))
         # 建立 listener socket
         self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.listener.bind((host, port))
-        self.listener.listen(5)
-
-        self._redis_handler = RedisStore()
-
-        # 等待配對的玩家佇列
+        self.listener.listen(config.LISTEN_BACKLOG)
+
+        self._store = get_store()
+        # 多節點部署：以 lease 確保每個 session 只在一個節點上執行
+        self.node_id = config.NODE_ID or "%s:%d" % (socket.gethostname(), port)
+        self.leases = LeaseManager(self._store, self.node_id,
+                                   config.NODE_ADDRESS or "%s:%d" % (socket.gethostname(), port),
+                                   config.LEASE_TTL)
+        # 只有能跨程序轉送事件的 store（Redis）才用來轉送觀戰事件
+        self.spectator_hub = SpectatorHub(store=self._store if self._store.supports_events else None)
+        # 所有房間共用一個作答期限排程器
+        self.scheduler = DeadlineScheduler()
+        # 所有連線送出佇列的統計
+        self.outbound_metrics = OutboundMetrics()
+        # 所有連線接收資料的統計（過長、超速、不符階段而丟棄的行數）
+        self.inbound_metrics = InboundMetrics()
+        # 多工閘道連線
+        self.gateways = set()
+        self._gateways_lock = threading.Lock()
+        # 連線時的准入控制，超過上限的新玩家收到 FULL
+        self.admission = AdmissionController(config.MAX_CONNECTIONS, config.MAX_SESSIONS, config.MAX_WAITING,
+                                             config.MAX_RSS_MB, config.MAX_THREADS, config.RECONNECT_RESERVE)
+        # 交握執行緒的數量上限：尚未准入的連線最多佔用這麼多執行緒
+        self._handshake_slots = threading.BoundedSemaphore(config.MAX_HANDSHAKES)
+        # 結束的對局封存到 segment 檔
+        self.archiver = Archiver(config.ARCHIVE_DIR, config.ARCHIVE_SEGMENT_BYTES) if config.ARCHIVE_DIR else None
+
+        # 等待配對的玩家佇列，湊滿 room_size 人開一房
+        self.room_size = room_size
+        # 新房間使用的遊戲變體
+        self.variant = variant.get(config.VARIANT)
         self._waiting_queue = queue.Queue()
         self._reconnect_queue = queue.Queue()
 
-        # Active game sessions
-        self.active_sessions = {}
-        self._lock = threading.Lock()
+        # 進行中（以及暖啟動後等待玩家連回）的 game sessions
+        self.sessions = SessionRegistry()
+        self.sessions.start_reaper(config.SESSION_GRACE_PERIOD, config.SESSION_REAP_INTERVAL)
+
+        # drain 模式：不再接受新配對，等待關機
+        self.draining = False
+        self._drain_retry_after = 5
+
+    def warm_restore(self, batch_size=100, workers=4):
+        """
+        啟動時的暖啟動階段：
+          - 以 scan_game_ids 分批列出 store 中所有 game:<id>
+          - 多條 worker 執行緒以 pipeline 讀取存檔與 checkpoint，並平行重建 GameSession
+        重建好的 session 先登記但不啟動，等玩家連回時直接取用，
+        不必在 accept 路徑上逐一從 store 冷復原。
+        """
+        batches = queue.Queue()
+        restored = [0]
+
+        def worker():
+            while True:
+                ids = batches.get()
+                if ids is None:
+                    return
+                # 存檔與 checkpoint 在同一次 pipeline 中讀回
+                states = self._store.read_restore_data(ids) or {}
+                for game_session_id, (game_state, checkpoint) in states.items():
+                    try:
+                        session = self._new_session(Game.from_dict(game_state, checkpoint=checkpoint),
+                                                    game_session_id)
+                    except Exception as e:
+                        print(format_log("復原遊戲房間 %s 失敗: %s" % (game_session_id, e)))
+                        continue
+                    if session is None:
+                        # 由其他節點執行中
+                        continue
+                    self.sessions.register(session)
+                    restored[0] += 1
+
+        threads = []
+        for _ in range(workers):
+            t = threading.Thread(target=worker)
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+        start = time.time()
+        try:
+            for ids in self._store.scan_game_ids(batch_size):
+                batches.put(ids)
+        except Exception as e:
+            print(format_log("暖啟動掃描 store 失敗: %s" % e))
+        for _ in threads:
+            batches.put(None)
+        for t in threads:
+            t.join()
+
+        print(format_log("暖啟動完成，共復原 %d 個遊戲房間，耗時 %.3f 秒"
+                         % (restored[0], time.time() - start)))
+
+    def drain(self, retry_after=5):
+        """
+        進入 drain 模式準備關機：
+          - 關閉 listener，不再接受新連線與新配對
+          - 把每個進行中 session 的狀態寫回 store
+          - 通知所有玩家伺服器即將關閉，稍後可重新連線
+        """
+        if self.draining:
+            return
+        self.draining = True
+        self._drain_retry_after = retry_after
+        print(format_log("伺服器進入 drain 模式…"))
+        try:
+            self.listener.close()
+        except Exception:
+            pass
+
+        drain_msg = protocol.encode("SERVER_DRAIN", retry_after)
+        sessions = self.sessions.sessions()
+        closing = []
+        for session in sessions:
+            session.flush()
+            session.broadcast(drain_msg)
+            for p in session.players:
+                ConnectionManager._close_player(p)
+                closing.append(p)
+
+        # 還在等待配對的玩家也一併通知
+        while True:
+            try:
+                player = self._waiting_queue.get_nowait()
+            except queue.Empty:
+                break
+            ConnectionManager.send_to(player, drain_msg)
+            ConnectionManager._close_player(player)
+            closing.append(player)
+
+        # 閘道上的玩家都已送出 CLOSE，關閉閘道連線
+        with self._gateways_lock:
+            gateways = list(self.gateways)
+        for gateway in gateways:
+            gateway.outbound.close()
+
+        # 等 writer 把通知送出去再結束程序
+        give_up = time.time() + 2
+        for outbound in [p.outbound for p in closing] + [g.outbound for g in gateways]:
+            if outbound is not None:
+                outbound.join(max(0, give_up - time.time()))
+
+        self._store.flush()
+        if self.archiver is not None:
+            self.archiver.close(timeout=2)
+        # 交出 lease，讓玩家連到其他節點時可以立刻接手
+        for lease in self.leases.held():
+            self.leases.release(lease)
+        print(format_log("已保存 %d 個遊戲房間狀態" % len(sessions)))
+
+    def _new_session(self, game, session_id=None, on_finish=None, **kwargs):
+        """
+        建立 GameSession 並取得它的 lease。
+
+        :return: GameSession；session 已由其他節點持有時回傳 None
+        """
+        def finished(session, standings):
+            # 結束的房間立即移出 registry，釋放 Game / Player / queue
+            self.sessions.unregister(session)
+            if on_finish is not None:
+                on_finish(session, standings)
+
+        session_id = uuid4() if session_id is None else session_id
+        lease, owner = self.leases.acquire(session_id)
+        if lease is None and owner is not None:
+            return None
+
+        session = GameSession(game, session_id, spectator_hub=self.spectator_hub, store=self._store,
+                              scheduler=self.scheduler, on_finish=finished,
+                              lease=lease, lease_manager=self.leases, archiver=self.archiver, **kwargs)
+        if lease is not None:
+            def lost(lease):
+                # 已被其他節點接手：本機不再執行，玩家重連後會轉送到新的擁有者
+                self.sessions.unregister(session)
+                session.lease_lost()
+            lease.on_lost = lost
+        return session
+
+    def _forward_to_owner(self, game_session_id, player_id, client_socket):
+        """
+        session 由其他節點執行時，把玩家連線轉送過去。
+
+        :return: 是否已處理這條連線（轉送成功，或請玩家稍後重連）
+        """
+        owner, address = self.leases.owner_address(game_session_id)
+        if owner is None or owner == self.node_id:
+            return False
+        # 閘道上的玩家無法以 socket 轉送，請閘道稍後重連（由前端依 nodes:load 改連擁有者節點）
+        if address is not None and not mux.is_channel(client_socket):
+            print(format_log("%s 的房間 %s 由 %s 執行，轉送到 %s" % (player_id, game_session_id, owner, address)))
+            if relay.forward(client_socket, address, player_id, config.RELAY_TIMEOUT):
+                return True
+        # 擁有者已離線但 lease 尚未過期：請玩家等 lease 過期後重連
+        try:
+            client_socket.sendall(protocol.encode("SERVER_DRAIN", int(config.LEASE_TTL) + 1))
+            client_socket.close()
+        except Exception:
+            pass
+        return True
+
+    @staticmethod
+    def _close_player(player):
+        # 有送出佇列時先送完剩下的訊息再關閉
+        try:
+            if player.outbound is not None:
+                player.outbound.close()
+            else:
+                player.socket.close()
+        except Exception:
+            pass
+        player.is_alive = False
+
+    def outbound_stats(self):
+        """送出佇列統計，加上目前所有連線佇列中的訊息總數。"""
+        stats = self.outbound_metrics.snapshot()
+        stats["depth"] = sum(len(p.outbound) for s in self.sessions.sessions()
+                             for p in s.players if p.outbound is not None)
+        with self._gateways_lock:
+            stats["gateways"] = len(self.gateways)
+            stats["depth"] += sum(len(g.outbound) for g in self.gateways)
+        return stats
+
+    def _metrics_logger(self, interval):
+        while True:
+            time.sleep(interval)
+            print(format_log("outbound %s" % json.dumps(self.outbound_stats(), sort_keys=True)))
+            print(format_log("inbound %s" % json.dumps(self.inbound_metrics.snapshot(), sort_keys=True)))
+            print(format_log("admission %s" % json.dumps(self.admission.snapshot(), sort_keys=True)))
+
+    def current_load(self):
+        return self.admission.load(len(self.sessions), self._waiting_queue.qsize())
+
+    def _load_publisher(self, interval):
+        # 定期把本節點負載寫到 store，過期時間為間隔的 3 倍，節點停止後自動消失
+        while not self.draining:
+            self._store.publish_load(self.node_id, self.current_load(), interval * 3)
+            time.sleep(interval)
+
+    def _reject(self, client_socket, player_id, reason):
+        print(format_log("%s 無法加入：%s 已達上限" % (player_id, reason)))
+        try:
+            client_socket.sendall(protocol.encode("FULL", config.ADMISSION_RETRY_AFTER))
+            client_socket.close()
+        except Exception:
+            pass
 
     def serve_forever(self):
         """
-        不斷 accept 新連線，為每位玩家建立 Player，
-        並啟動兩條執行緒：_cmd_reader、_heartbeat。
+        不斷 accept 新連線，每條連線交給 _handshake 執行緒讀取 ID，
+        accept 迴圈本身不做任何可能阻塞的 I/O。
         """
         print(format_log("伺服器已啟動，開始接受連線…"))
-        while True:
-            client_socket, client_address = self.listener.accept()
+        while not self.draining:
+            try:
+                client_socket, client_address = self.listener.accept()
+            except socket.error:
+                if self.draining:
+                    break
+                raise
             print(format_log("client_socket={}, client_address={}".format(client_socket, client_address)))
-            client_socket.sendall("CHECK_ID\n".encode("utf-8"))
-            player_id = client_socket.recv(1024).strip()
+            if not self._handshake_slots.acquire(False):
+                self._reject(client_socket, client_address, "handshakes")
+                continue
+            t = threading.Thread(target=self._handshake, args=(client_socket, client_address))
+            t.daemon = True
+            t.start()
+
+    def _handshake(self, client_socket, client_address):
+        """
+        送出 CHECK_ID 並在 HANDSHAKE_TIMEOUT 秒內讀取 ID，
+        再依 ID 進入觀戰、多工閘道或玩家准入（含轉送到其他節點）的流程。
+        逾時或沒送 ID 就斷線（例如埠號健康檢查）。結束時歸還 serve_forever 佔用的交握名額。
+        """
+        try:
+            try:
+                client_socket.settimeout(config.HANDSHAKE_TIMEOUT)
+                client_socket.sendall(protocol.CHECK_ID)
+                player_id = six.ensure_str(client_socket.recv(1024).strip())
+                client_socket.settimeout(None)
+            except (socket.error, UnicodeDecodeError):
+                player_id = ""
             print(format_log("player_id={}".format(player_id)))
-            game_session_id = self._redis_handler.read_player_game(player_id)
-            print(format_log("game_session_id={}".format(game_session_id)))
-            if game_session_id is None:
-                self._redis_handler.delete_game_state(game_session_id)
-                player = self._init_player_connection(Player(player_id), client_socket, client_address)
-                self._waiting_queue.put(player)
-                print(format_log("%s 已連線，放入等待佇列" % player.name))
+            if not player_id:
+                client_socket.close()
+                return
+            name, args = protocol.decode(player_id)
+            if name == "SPECTATE":
+                self._add_spectator(args[0] if args else None, client_socket, client_address)
+            elif name == "MUX":
+                self._add_gateway(client_socket, client_address)
+            else:
+                self._admit_player(player_id, client_socket, client_address)
+        finally:
+            self._handshake_slots.release()
+
+    def _admit_player(self, player_id, client_socket, client_address):
+        """
+        玩家送出 ID 之後的流程：准入檢查，接著重連回原本的房間或放入等待佇列。
+        client_socket 可以是一般 socket 或閘道上的 mux.Channel。
+        """
+        # 本機已有此玩家的房間（進行中或暖啟動復原），不必查 Redis
+        session = self.sessions.find_by_player(player_id)
+        game_session_id = None if session is not None else self._store.read_player_game(player_id)
+        print(format_log("game_session_id={}".format(game_session_id)))
+
+        # 有進行中房間的玩家優先：不受房間數與等待人數限制，並可使用保留的連線空間
+        # 准入時已佔用一個連線名額，之後沒有建立玩家連線的路徑要歸還
+        reason = self.admission.try_admit(len(self.sessions), self._waiting_queue.qsize(),
+                                          reconnecting=session is not None or game_session_id is not None)
+        if reason is not None:
+            self._reject(client_socket, player_id, reason)
+            return
+
+        if session is not None:
+            print(format_log("%s 已找到斷線房間 %s" % (player_id, session.id)))
+            if not self._reconnect(session, player_id, client_socket, client_address):
+                self.admission.connection_closed()
+            return
+
+        if game_session_id is None:
+            self._store.delete_game_state(game_session_id)
+            player = self._init_player_connection(Player(player_id, variant=self.variant), client_socket, client_address)
+            self._waiting_queue.put(player)
+            print(format_log("%s 已連線，放入等待佇列" % player.name))
+
+        else:
+            game_session_id = six.ensure_str(game_session_id)
+            if self._forward_to_owner(game_session_id, player_id, client_socket):
+                self.admission.connection_closed()
+                return
+            print(format_log("%s 正在重新連回 %s" % (player_id, game_session_id)))
+            # 從 redis 復原 game session
+            game_state = self._store.read_game_state(game_session_id)
+            # print(format_log("%s 正在從 Redis 復原資料:\n %s" % (player_id, game_state)))
+            session = self._new_session(self._restore_game(game_session_id, game_state), game_session_id)
+            if session is None:
+                # 剛好被其他節點搶先接手
+                self._forward_to_owner(game_session_id, player_id, client_socket)
+                self.admission.connection_closed()
+                return
+            self.sessions.register(session)
+            if not self._reconnect(session, player_id, client_socket, client_address):
+                self.admission.connection_closed()
+
+    def _add_gateway(self, client_socket, client_address):
+        """多工閘道連線：一條讀取執行緒與一條心跳執行緒服務這條連線上的所有玩家。"""
+        print(format_log("%s 以多工閘道連線" % (client_address,)))
+        outbound = OutboundQueue(client_socket, config.GATEWAY_QUEUE_SIZE, config.OUTBOUND_POLICY,
+                                 self.outbound_metrics)
+        gateway = mux.Gateway(client_socket, client_address, outbound)
+        with self._gateways_lock:
+            self.gateways.add(gateway)
+        outbound.put(protocol.encode("MUX"))
+        for target in (self._gateway_reader, self._gateway_heartbeat):
+            t = threading.Thread(target=target, args=(gateway,))
+            t.daemon = True
+            t.start()
+
+    def _gateway_reader(self, gateway):
+        """
+        讀取閘道連線上的 frame：
+          - OPEN → 與一般連線送出玩家 ID 相同的流程
+          - DATA → 依 channel 找到玩家，套用與 _cmd_reader 相同的限速與階段檢查
+          - CLOSE → 該玩家斷線
+        """
+        metrics = self.inbound_metrics
+        # frame 多了 "DATA <channel> " 的開頭
+        buf = LineBuffer(config.INBOUND_MAX_LINE + 32)
+        try:
+            while True:
+                try:
+                    data = gateway.socket.recv(65536)
+                except Exception:
+                    data = None
+                if not data:
+                    return
+                lines, oversized = buf.feed(data)
+                if oversized:
+                    metrics.record("oversized", oversized)
+                for line in lines:
+                    try:
+                        name, args = protocol.decode(line.decode(protocol.ENCODING).strip())
+                        if name in ("OPEN", "DATA", "CLOSE"):
+                            channel_id = int(args[0])
+                    except (UnicodeDecodeError, ValueError, IndexError, AttributeError, TypeError):
+                        metrics.record("rejected")
+                        continue
+                    if name == "HEARTBEAT_ACK":
+                        gateway.heartbeat_queue.put(True)
+                    elif name == "OPEN" and len(args) > 1:
+                        self._open_channel(gateway, channel_id, args[1])
+                    elif name == "DATA":
+                        self._channel_data(gateway.get(channel_id), args[1] if len(args) > 1 else "")
+                    elif name == "CLOSE":
+                        channel = gateway.get(channel_id)
+                        if channel is not None:
+                            channel.close()
+                    else:
+                        metrics.record("rejected")
+        finally:
+            with self._gateways_lock:
+                self.gateways.discard(gateway)
+            gateway.close()
+
+    def _open_channel(self, gateway, channel_id, player_id):
+        channel = gateway.open(channel_id)
+        if channel is None:
+            self.inbound_metrics.record("rejected")
+            return
+        channel.bucket = TokenBucket(config.INBOUND_RATE, config.INBOUND_BURST)
+        print(format_log("player_id={} (channel {})".format(player_id, channel_id)))
+        self._admit_player(player_id, channel, gateway.address)
+
+    def _channel_data(self, channel, text):
+        metrics = self.inbound_metrics
+        metrics.record("lines")
+        if channel is None or channel.player is None:
+            metrics.record("rejected")
+        elif not channel.bucket.take():
+            metrics.record("rate_limited")
+        else:
+            self._accept_command(channel.player, text)
+
+    def _channel_closed(self, channel):
+        self.admission.connection_closed()
+        ConnectionManager._connection_lost(channel.player, channel.outbound)
+
+    def _gateway_heartbeat(self, gateway, interval=5, timeout=10):
+        """整條閘道連線共用一組心跳；逾時視為所有 channel 斷線。"""
+        outbound = gateway.outbound
+        while not outbound.closed:
+            if outbound.put(protocol.HEARTBEAT, droppable=True):
+                try:
+                    gateway.heartbeat_queue.get(timeout=timeout)
+                except Exception:
+                    print(format_log("%s 閘道心跳逾時" % (gateway.address,)))
+                    gateway.close()
+                    return
+            time.sleep(interval)
+
+    def _restore_game(self, game_session_id, game_state):
+        """由精簡存檔與最近的 checkpoint 重建 Game。"""
+        return Game.from_dict(game_state, checkpoint=self._store.read_checkpoint(game_session_id))
+
+    def _reconnect(self, session, player_id, client_socket, client_address):
+        """
+        把重新連線的玩家接回房間；房間尚未啟動（剛從 Redis 復原）時一併啟動。
+
+        :return: 是否在房間中找到這位玩家並接上連線
+        """
+        found = False
+        for player in session.players:
+            if player.name == player_id:
+                self._init_player_connection(player, client_socket, client_address)
+                print(format_log("%s 已重新連線" % player.name))
+                ConnectionManager.send_to(player, protocol.encode("VARIANT", session.game.variant))
+                ConnectionManager._send_last_action(player)
+                found = True
+                break
+        if not session.started:
+            self.match_maker(session)
+        return found
 
+    def _add_spectator(self, game_session_id, client_socket, client_address):
+        """
+        加入觀戰者；未指定 session 時觀看任一進行中的房間。
+        session 不在本機但 Redis 中存在時，改由 Redis pub/sub 接收事件；
+        其他 store 無法跨程序轉送，視為找不到房間。
+        """
+        remote = False
+        if game_session_id is None:
+            running = [s for s in self.sessions.sessions() if s.started]
+            game_session_id = str(running[0].id) if running else None
+        elif game_session_id not in self.sessions:
+            if not self._store.supports_events or self._store.read_game_state(game_session_id) is None:
+                game_session_id = None
             else:
-                print(format_log("%s 正在重新連回 %s" % (player_id, game_session_id)))
-                if game_session_id in self.active_sessions:
-                    session = self.active_sessions[game_session_id]
-                    print(format_log("%s 已找到斷線房間 %s" % (player_id, game_session_id)))
-                    for i in range(len(session.players)):
-                        player = session.players[i]
-                        if player.name == player_id:
-                            player = self._init_player_connection(player, client_socket, client_address)
-                            session.players[i] = player
-                            print(format_log("%s 已重新連線" % player.name))
-                            ConnectionManager._send_last_action(player)
-                            break
-                else:
-                    # 從 redis 復原 game session
-                    game_state = self._redis_handler.read_game_state(game_session_id)
-                    # print(format_log("%s 正在從 Redis 復原資料:\n %s" % (player_id, game_state)))
-                    session = GameSession(Game.from_dict(game_state), game_session_id)
-                    for p in session.players:
-                        if p.name == player_id:
-                            self._init_player_connection(p, client_socket, client_address)
-                            ConnectionManager._send_last_action(p)
-                            break
-                    self.match_maker(session)
+                remote = True
+
+        if game_session_id is None:
+            try:
+                client_socket.sendall(protocol.NO_SESSION)
+                client_socket.close()
+            except Exception:
+                pass
+            return
+
+        print(format_log("%s 開始觀戰 %s" % (client_address, game_session_id)))
+        try:
+            client_socket.sendall(protocol.encode("SPECTATING", game_session_id))
+        except Exception:
+            return
+        self.spectator_hub.add_spectator(game_session_id, client_socket, client_address, remote=remote)
 
     @staticmethod
     def _send_last_action(player):
-        nums = ",".join(player.number_hand)
-        tools = ",".join(player.tool_hand)
         print(format_log("%s - HAND" % player.name))
-        ConnectionManager.send_to(player, "HAND %s;%s\n" % (nums, tools))
+        ConnectionManager.send_to(player, protocol.encode("HAND", player.number_hand, player.tool_hand))
 
 
+        # 最後一個動作可能是 RESULT：client 只用它補上還在等結果的猜測，重複收到也不影響
         if len(player.action_histories) > 0:
             last_action = player.action_histories[-1]["action"]
             print(format_log("%s - %s" % (player.name, last_action[:-1])))
@@ -117,118 +568,308 @@ class ConnectionManager(object):
         # 建立 Player
         player.socket = client_socket
         player.address = client_address
-        player.cmd_queue = queue.Queue()
+        if player.cmd_queue is None:
+            player.cmd_queue = queue.Queue()
+        else:
+            # 重連時沿用原本的 cmd_queue（遊戲執行緒可能正在等它），只清掉舊連線留下的斷線通知
+            with player.cmd_queue.mutex:
+                pending = [m for m in player.cmd_queue.queue if m["type"] != "DISCONNECTED"]
+                player.cmd_queue.queue.clear()
+                player.cmd_queue.queue.extend(pending)
         player.heartbeat_queue = queue.Queue()
         player.is_alive = True
+        player.disconnected_at = None
+
+        # 每條連線一個送出佇列。先換上新的佇列再關閉舊的，
+        # 舊連線關閉時（例如 channel 的 on_close）才不會把已重連的玩家標成斷線
+        # 連線名額已在准入時（AdmissionController.try_admit）佔用
+        old_outbound = player.outbound
+
+        if mux.is_channel(client_socket):
+            # 閘道上的玩家：讀取與心跳都由閘道連線的執行緒負責
+            client_socket.player = player
+            client_socket.outbound = player.outbound = mux.ChannelOutbound(client_socket)
+            client_socket.on_close = self._channel_closed
+            if old_outbound is not None:
+                old_outbound.close()
+            return player
+
+        player.outbound = OutboundQueue(client_socket, config.OUTBOUND_QUEUE_SIZE,
+                                        config.OUTBOUND_POLICY, self.outbound_metrics)
+        if old_outbound is not None:
+            old_outbound.close()
 
         # 啟動讀命令執行緒
-        t1 = threading.Thread(target=self._cmd_reader, args=(player,))
+        t1 = threading.Thread(target=self._cmd_reader, args=(player, player.outbound))
         t1.daemon = True
         t1.start()
         # 啟動心跳檢測執行緒
-        t2 = threading.Thread(target=self._heartbeat, args=(player,))
+        t2 = threading.Thread(target=self._heartbeat, args=(player, player.outbound))
         t2.daemon = True
         t2.start()
 
         return player
 
-    def _cmd_reader(self, player):
+    def _cmd_reader(self, player, outbound):
         """
         永遠從 socket.recv() 讀資料：
           - 收到空 bytes → 推入 DISCONNECTED
           - 收到 HEARTBEAT_ACK → heartbeat_queue
-          - 否則推入 cmd_queue
+          - 否則檢查是否符合遊戲目前等待的階段，符合才推入 cmd_queue
+        超過 INBOUND_MAX_LINE 的行、超過每秒行數上限的行都直接丟棄。
         """
-        sock = player.socket
-        buf = b""
-        while True:
-            try:
-                data = sock.recv(1024)
-            except Exception:
-                player.cmd_queue.put({'type': 'DISCONNECTED'})
-                return
-            if not data:
-                player.cmd_queue.put({'type': 'DISCONNECTED'})
-                return
-            buf += data
-            while b"\n" in buf:
-                line, buf = buf.split(b"\n", 1)
-                text = line.decode('utf-8').strip()
-                if text == "HEARTBEAT_ACK":
-                    player.heartbeat_queue.put(True)
-                else:
-                    player.cmd_queue.put({'type': 'COMMAND', 'data': text})
+        sock = outbound.socket
+        heartbeat_queue = player.heartbeat_queue
+        metrics = self.inbound_metrics
+        dispatcher = protocol.Dispatcher(default=lambda args, text: self._accept_command(player, text))
+        dispatcher.on("HEARTBEAT_ACK")(lambda args, text: heartbeat_queue.put(True))
+
+        buf = LineBuffer(config.INBOUND_MAX_LINE)
+        bucket = TokenBucket(config.INBOUND_RATE, config.INBOUND_BURST)
+        try:
+            while True:
+                try:
+                    data = sock.recv(1024)
+                except Exception:
+                    data = None
+                if not data:
+                    ConnectionManager._connection_lost(player, outbound)
+                    return
+                lines, oversized = buf.feed(data)
+                if oversized:
+                    metrics.record("oversized", oversized)
+                for line in lines:
+                    metrics.record("lines")
+                    if not bucket.take():
+                        metrics.record("rate_limited")
+                        continue
+                    try:
+                        text = line.decode(protocol.ENCODING).strip()
+                    except UnicodeDecodeError:
+                        metrics.record("rejected")
+                        continue
+                    dispatcher.dispatch(text)
+        finally:
+            self.admission.connection_closed()
+
+    def _accept_command(self, player, text):
+        expecting = player.expecting
+        if expecting is None or not expecting.accepts(text, player):
+            self.inbound_metrics.record("rejected")
+            # 等待中收到格式錯誤的回答：重送提示讓 client 重新輸入
+            if expecting is not None:
+                ConnectionManager._send_last_action(player)
+            return
+        self.inbound_metrics.record("commands")
+        player.cmd_queue.put({'type': 'COMMAND', 'data': text, 'expect': expecting})
+
+    @staticmethod
+    def _connection_lost(player, outbound):
+        # 玩家已經換了新連線時，舊連線的斷線不影響遊戲
+        outbound.close()
+        if player.outbound is outbound:
+            ConnectionManager._mark_disconnected(player)
+
+    @staticmethod
+    def _mark_disconnected(player):
+        player.is_alive = False
+        if player.disconnected_at is None:
+            player.disconnected_at = time.time()
+        player.cmd_queue.put({'type': 'DISCONNECTED'})
 
     @staticmethod
-    def send_to(player, msg):
-        if isinstance(msg, (dict, list)):
-            msg = json.dumps(msg)  # 轉成 JSON 字串
-        elif isinstance(msg, six.binary_type):  # bytes → decode 成 unicode
-            msg = msg.decode('utf-8')
-        elif not isinstance(msg, six.text_type):  # 其他不可辨識型別
-            msg = unicode(msg) if six.PY2 else str(msg)
+    def send_to(player, msg, droppable=False):
+        """
+        送訊息給玩家。有送出佇列時只放進佇列，不會阻塞呼叫端。
+
+        :param droppable: 佇列滿時可以丟棄（心跳）
+        """
+        # 已編碼好的 bytes（protocol.encode 或快取常數）直接送出，其餘交給 protocol 轉換
+        if not isinstance(msg, six.binary_type):
+            msg = protocol.to_bytes(msg)
+        if player.outbound is not None:
+            player.outbound.put(msg, droppable)
+            return
         try:
-            player.socket.sendall(msg.encode('utf-8'))
+            player.socket.sendall(msg)
         except Exception:
             try:
                 player.socket.close()
             except Exception:
                 player.is_alive = False
 
-    def _heartbeat(self, player, interval=5, timeout=10):
+    def _heartbeat(self, player, outbound, interval=5, timeout=10):
         """
         每隔 interval 秒發 HEARTBEAT，並在 timeout 秒內等 ACK；
-        否則推入 DISCONNECTED。
+        否則推入 DISCONNECTED。連線關閉或被新連線取代時結束。
         """
-        while True:
-            try:
-                print(format_log("%s - HEARTBEAT" % player.name))
-                ConnectionManager.send_to(player, "HEARTBEAT\n")
-            except Exception:
-                player.cmd_queue.put({'type': 'DISCONNECTED'})
-                return
-            try:
-                # 等待 ACK
-                player.heartbeat_queue.get(timeout=timeout)
-            except Exception:
-                player.cmd_queue.put({'type': 'DISCONNECTED'})
-                return
+        heartbeat_queue = player.heartbeat_queue
+        while not outbound.closed and player.outbound is outbound:
+            print(format_log("%s - HEARTBEAT" % player.name))
+            if outbound.put(protocol.HEARTBEAT, droppable=True):
+                try:
+                    # 等待 ACK
+                    heartbeat_queue.get(timeout=timeout)
+                except Exception:
+                    ConnectionManager._connection_lost(player, outbound)
+                    return
             time.sleep(interval)
 
     def match_maker(self, game_session=None):
-        """不斷配對兩人一組，並開 Thread 執行"""
+        """不斷湊滿 room_size 人一組，並開 Thread 執行"""
         if game_session is not None:
-            self.active_sessions[str(game_session.id)] = game_session
+            self.sessions.register(game_session)
             print(format_log("重新啟動遊戲房間: %s" % ",".join([p.name for p in game_session.players])))
-            t = threading.Thread(target=game_session.run, )
-            t.daemon = True
-            t.start()
+            game_session.start()
             return
 
         while True:
-            p1 = self._waiting_queue.get()
-            p2 = self._waiting_queue.get()
-            game_session = GameSession(Game([p1, p2]))
+            players = [self._waiting_queue.get() for _ in range(self.room_size)]
+            if self.draining:
+                # drain 中不再開新房間
+                for p in players:
+                    ConnectionManager.send_to(p, protocol.encode("SERVER_DRAIN", self._drain_retry_after))
+                    ConnectionManager._close_player(p)
+                continue
+            game_session = self._new_session(Game(players, variant=self.variant))
 
-            self.active_sessions[str(game_session.id)] = game_session
-            print(format_log("配對 %s 和 %s 到新遊戲房間" % (p1.name, p2.name)))
-            t = threading.Thread(target=game_session.run, )
-            t.daemon = True
-            t.start()
+            self.sessions.register(game_session)
+            print(format_log("配對 %s 到新遊戲房間" % ",".join([p.name for p in players])))
+            game_session.start()
+
+    def tournament_maker(self, num_players, bracket_cls, **bracket_kwargs):
+        """
+        湊滿 num_players 位等待中的玩家後開一場賽事。
+
+        :param bracket_cls: EliminationBracket 或 SwissBracket
+        """
+        while True:
+            players = [self._waiting_queue.get() for _ in range(num_players)]
+            print(format_log("開始賽事: %s" % ",".join([p.name for p in players])))
+            self.start_bracket(bracket_cls, players, **bracket_kwargs)
+
+    def start_matching(self, tournament=None):
+        """
+        依 tournament 啟動配對執行緒：None / "" 為一般配對（match_maker），
+        "elimination" / "swiss" 則以 config.TOURNAMENT_* 的設定不斷開賽事（tournament_maker）。
+        """
+        if not tournament:
+            target, args, kwargs = self.match_maker, (), {}
+        elif tournament == "elimination":
+            target, args = self.tournament_maker, (config.TOURNAMENT_PLAYERS, EliminationBracket)
+            kwargs = {"room_size": self.room_size, "advance": config.TOURNAMENT_ADVANCE}
+        elif tournament == "swiss":
+            target, args = self.tournament_maker, (config.TOURNAMENT_PLAYERS, SwissBracket)
+            kwargs = {"room_size": self.room_size, "rounds": config.TOURNAMENT_ROUNDS}
+        else:
+            raise ValueError("unknown tournament mode: %r" % tournament)
+        t = threading.Thread(target=target, args=args, kwargs=kwargs)
+        t.daemon = True
+        t.start()
+        return t
+
+    def start_bracket(self, bracket_cls, players, **bracket_kwargs):
+        """建立賽程並開始第一輪，之後每個房間結束時自動排下一場。"""
+        bracket = None
+
+        def start_room(room):
+            for p in room.players:
+                p.action_histories = []
+                ConnectionManager.send_to(p, protocol.encode("BRACKET", room.round))
+            session = self._new_session(Game(room.players, variant=self.variant), keep_connections=True,
+                                  on_finish=lambda s, standings: bracket.room_finished(room, standings))
+            self.sessions.register(session)
+            print(format_log("賽事房間 %s: %s" % (room.id, ",".join([p.name for p in room.players]))))
+            session.start()
+
+        def finish_player(player, msg):
+            ConnectionManager.send_to(player, msg)
+            ConnectionManager._close_player(player)
+
+        def on_complete(result):
+            if bracket_cls is SwissBracket:
+                champion = result[0][0] if result else None
+                losers = [p for p, _ in result[1:]]
+            else:
+                champion, losers = result, []
+            for p in losers:
+                finish_player(p, protocol.ELIMINATED)
+            if champion is not None:
+                print(format_log("賽事冠軍: %s" % champion.name))
+                finish_player(champion, protocol.encode("CHAMPION", champion.name))
+
+        kwargs = dict(bracket_kwargs)
+        if bracket_cls is EliminationBracket:
+            kwargs["on_eliminated"] = lambda p: finish_player(p, protocol.ELIMINATED)
+        bracket = bracket_cls(players, start_room, on_complete=on_complete, **kwargs)
+        bracket.start()
+        return bracket
+
+
+class SessionStopped(Exception):
+    """GameSession.stop() 後，用來跳出遊戲執行緒。"""
 
 
 class GameSession(object):
-    """一對玩家的遊戲執行個體（Threaded）"""
-    def __init__(self, game, session_id=None):
+    """
+    一個遊戲房間的執行個體（Threaded），支援 2~8 位玩家。
+
+    :param on_finish: 遊戲結束時呼叫 on_finish(session, standings)，standings 為依名次排序的玩家
+    :param keep_connections: 結束時不關閉玩家連線（賽程中還有下一場）
+    :param scheduler: 共用的 DeadlineScheduler，用來限制每個階段的作答時間
+    :param deadlines: {階段: 秒數}，預設為 config.DEADLINES
+    :param lease: 本節點持有的 Lease，存檔時以它的 fencing token 做 compare-and-set
+    :param lease_manager: 發出 lease 的 LeaseManager，房間結束時交還 lease
+    :param archiver: 結束時把對局交給 Archiver 封存
+    """
+    def __init__(self, game, session_id=None, spectator_hub=None, store=None,
+                 on_finish=None, keep_connections=False, scheduler=None, deadlines=None,
+                 lease=None, lease_manager=None, archiver=None):
         self.players = game.players
         self.game = game
-        self._store_handler = RedisStore()
+        self._store_handler = store if store is not None else get_store()
+        self._spectator_hub = spectator_hub
+        self._on_finish = on_finish
+        self._keep_connections = keep_connections
         self.id = uuid4() if session_id is None else session_id
+        self.started = False
+        self.stopped = False
+        self.finished = False
+
+        # 作答期限：沒有 scheduler 時不限時
+        self._scheduler = scheduler
+        self._deadlines = config.DEADLINES if deadlines is None else deadlines
+        self._expiries = {}
+        self._forfeited = set()
+
+        self._lease = lease
+        self._lease_manager = lease_manager
+        self._archiver = archiver
+
+    def start(self):
+        self.started = True
+        t = threading.Thread(target=self.run, )
+        t.daemon = True
+        t.start()
+
+    def stop(self):
+        """讓遊戲執行緒在下一次等待指令時結束（回收閒置房間時使用）。"""
+        self.stopped = True
+        if not self.started:
+            self._release_lease()
+            self._close_spectators()
+        for p in self.players:
+            if p.cmd_queue is not None:
+                p.cmd_queue.put({'type': 'SHUTDOWN'})
 
     def _handle_disconnect(self, player):
         print(format_log("%s - DISCONNECTED" % player.name))
-        self.broadcast("DISCONNECTED %s\n" % player.name, skip=player)
+        disconnected_msg = protocol.encode("DISCONNECTED", player.name)
+        self.broadcast(disconnected_msg, skip=player)
+        self._spectate(disconnected_msg)
         player.is_alive = False
+        if player.disconnected_at is None:
+            player.disconnected_at = time.time()
 
     def broadcast(self, msg, skip=None):
         for p in self.players:
@@ -236,39 +877,229 @@ class GameSession(object):
                 continue
             ConnectionManager.send_to(p, msg)
 
+    def _spectate(self, msg):
+        """把事件交給觀戰廣播（不會阻塞遊戲執行緒；沒有人觀戰時由 hub 直接丟棄）。"""
+        if self._spectator_hub is not None:
+            self._spectator_hub.publish(self.id, msg)
+
+    def _close_spectators(self):
+        if self._spectator_hub is not None:
+            self._spectator_hub.close_session(self.id)
+
+    def _save_state(self, game_state):
+        if self._lease is None:
+            self._store_handler.save_game_state(self.id, game_state)
+        elif self._store_handler.save_game_state_fenced(self.id, game_state, self._lease.token) is False:
+            # fencing token 已過期：其他節點接手了這個 session
+            self._lease_manager.mark_lost(self._lease)
+
+    def lease_lost(self):
+        """lease 被其他節點取得：停止遊戲並斷開玩家，讓他們重連到新的擁有者。"""
+        print(format_log("遊戲房間 %s 已由其他節點接手" % self.id))
+        self.stop()
+        if not self._keep_connections:
+            for p in self.players:
+                ConnectionManager._close_player(p)
+
+    def _release_lease(self):
+        if self._lease is not None and self._lease_manager is not None:
+            self._lease_manager.release(self._lease)
+
     def _end_turn(self, game_state):
-        self._store_handler.save_game_state(self.id, game_state)
+        self._save_state(game_state)
 
-    def _close_game(self):
-        self._store_handler.delete_game_state(self.id)
+    def _checkpoint(self):
+        """
+        回合開始時保存完整快照；之後的回合只存精簡的事件紀錄，
+        復原時從最近的 checkpoint 重播，不必從第一回合開始。
+        """
+        if self.game.can_checkpoint() and (self._lease is None or not self._lease.lost):
+            self._store_handler.save_checkpoint(self.id, self.game.checkpoint())
+
+    def flush(self):
+        """把目前遊戲狀態完整寫回 store（drain 時使用）。"""
+        self._save_state(self.game.to_log())
+        self._checkpoint()
+        for player in self.players:
+            self._store_handler.save_player_game(player.name, str(self.id))
+
+    def _close_game(self, winner=None):
+        self.finished = True
+        if self._lease is None or not self._lease.lost:
+            # 已被其他節點接手的對局由新的擁有者封存
+            if self._archiver is not None:
+                self._archiver.submit(self.id, self.game, winner)
+            self._store_handler.delete_game_state(self.id)
         # print("Close game: %s" % self.players)
-        for p in self.players:
-            p.socket.close()
+        if not self._keep_connections:
+            for p in self.players:
+                ConnectionManager._close_player(p)
+        if self._on_finish is not None:
+            standings = self.game.standings(winner)
+            # 棄權的玩家排在最後
+            standings = ([p for p in standings if p.name not in self._forfeited]
+                         + [p for p in standings if p.name in self._forfeited])
+            self._on_finish(self, standings)
+
+    def _check_forfeit(self, player):
+        """
+        連續逾時達上限的玩家判定棄權，回傳是否棄權。
+        剩下一位玩家時直接由他獲勝並結束遊戲（self.finished 會變成 True）。
+        """
+        if self._expiries.get(player.name, 0) < config.MAX_DEADLINE_EXPIRIES:
+            return False
+
+        print(format_log("%s - FORFEIT" % player.name))
+        self._forfeited.add(player.name)
+        self.game.record("FORFEIT", player)
+        forfeit_msg = protocol.encode("FORFEIT", player.name)
+        self.broadcast(forfeit_msg)
+        self._spectate(forfeit_msg)
+
+        remaining = [p for p in self.players if p.name not in self._forfeited]
+        if len(remaining) == 1:
+            winner_msg = protocol.encode("WINNER", remaining[0].name)
+            self.broadcast(winner_msg)
+            self._spectate(winner_msg)
+            self._close_game(winner=remaining[0])
+        return True
+
+    def _choose_target(self, current):
+        """
+        選擇本回合要猜誰的答案。兩人房直接是對手；
+        三人以上送出 TARGET 讓玩家挑選，無效輸入則猜下一位玩家。
+        斷線時回傳 None。
+        """
+        others = [p for p in self.players if p is not current and p.name not in self._forfeited]
+        if len(others) == 1:
+            return others[0]
+
+        target_prompt = protocol.encode("TARGET", [p.name for p in others])
+        print(format_log("%s - TARGET" % current.name))
+        current.add_action_history(action=target_prompt.decode(protocol.ENCODING))
+        self._expect(current, "TARGET", len(others))
+        ConnectionManager.send_to(current, target_prompt)
+
+        msg = self._get_cmd(current, "TARGET")
+        if msg is None:
+            return None
+
+        idx = self.players.index(current)
+        target = others[0]
+        for offset in range(1, len(self.players)):
+            p = self.players[(idx + offset) % len(self.players)]
+            if p in others:
+                target = p
+                break
+        if msg["type"] == "COMMAND" and msg["data"].isdigit() and 1 <= int(msg["data"]) <= len(others):
+            target = others[int(msg["data"]) - 1]
+
+        opp_target_msg = protocol.encode("OPP_TARGET", current.name, target.name)
+        self.broadcast(opp_target_msg)
+        self._spectate(opp_target_msg)
+        return target
+
+    def _expect(self, player, phase, choices=None):
+        """
+        標記接下來要等待玩家回答的階段，讀取執行緒只會放行符合此階段的指令。
+        必須在送出提示之前呼叫，避免回答比標記先到。
+
+        :param choices: TARGET 階段的可選目標數
+        """
+        if phase == "TOOL":
+            limit = len(player.tool_hand)
+        elif phase == "TARGET":
+            limit = choices
+        else:
+            limit = self.game.NUM_GUESS_DIGITS
+        player.expecting = Expectation(phase, limit)
+        return player.expecting
+
+    def _get_cmd(self, player, phase=None):
+        """
+        等待玩家的下一個指令。
+
+        指定 phase 且有 scheduler 時套用該階段的期限，並把倒數通知所有玩家；
+        逾時回傳 {'type': 'TIMEOUT'}，斷線回傳 None。
+        """
+        cmd_queue = player.cmd_queue
+        if cmd_queue is None:
+            # 冷復原後尚未連回的玩家
+            self._handle_disconnect(player)
+            return None
+        expecting = player.expecting
+        if phase is not None and (expecting is None or expecting.phase != phase):
+            expecting = self._expect(player, phase)
+        deadline = None
+        token = None
+        seconds = self._deadlines.get(phase, 0) if self._scheduler is not None else 0
+        if seconds > 0:
+            token = object()
+            deadline = self._scheduler.schedule(seconds, cmd_queue.put,
+                                                {'type': 'TIMEOUT', 'phase': phase, 'token': token})
+            deadline_msg = protocol.encode("DEADLINE", player.name, phase, int(seconds))
+            self.broadcast(deadline_msg)
+            self._spectate(deadline_msg)
 
-    def _get_cmd(self, player):
         try:
-            msg = player.cmd_queue.get()
+            while True:
+                msg = cmd_queue.get()
+                # 先前階段留下、已經作廢的逾時通知
+                if msg["type"] == "TIMEOUT" and msg.get("token") is not token:
+                    continue
+                # 同一階段連送的多餘回答
+                if msg["type"] == "COMMAND" and msg.get("expect", expecting) is not expecting:
+                    continue
+                break
         except Exception:
             self._handle_disconnect(player)
             return None
+        finally:
+            player.expecting = None
+            if deadline is not None:
+                deadline.cancel()
+
+        if msg["type"] == "SHUTDOWN" or self.stopped:
+            raise SessionStopped()
 
         if msg["type"] == "DISCONNECTED":
             self._handle_disconnect(player)
             return None
 
+        if msg["type"] == "TIMEOUT":
+            self._expiries[player.name] = self._expiries.get(player.name, 0) + 1
+            print(format_log("%s - TIMEOUT %s" % (player.name, phase)))
+            self.game.record("TIMEOUT", player, value=phase)
+            ConnectionManager.send_to(player, protocol.encode("TIMEOUT", phase))
+        else:
+            self._expiries[player.name] = 0
+
         return msg
 
     def run(self):
+        try:
+            self._play()
+        except SessionStopped:
+            print(format_log("遊戲房間 %s 已停止" % self.id))
+        finally:
+            # 正常結束、被回收或失去 lease 都要釋放觀戰 buffer
+            self._close_spectators()
+            self._release_lease()
+
+    def _play(self):
         game = self.game
-        self._store_handler.save_game_state(self.id, game.to_dict())
+        self._save_state(game.to_log())
+        # 從完整快照（舊格式或 checkpoint）復原的房間先補一個 checkpoint
+        self._checkpoint()
         for player in self.players:
             self._store_handler.save_player_game(player.name, str(self.id))
 
-        # 發初始手牌
+        # 通知本局的變體，再發初始手牌
+        variant_msg = protocol.encode("VARIANT", game.variant)
+        for p in self.players:
+            ConnectionManager.send_to(p, variant_msg)
         for p in self.players[1:]:
-            nums  = ",".join(p.number_hand)
-            tools = ",".join(p.tool_hand)
-            ConnectionManager.send_to(p, "HAND %s;%s\n" % (nums, tools))
+            ConnectionManager.send_to(p, protocol.encode("HAND", p.number_hand, p.tool_hand))
 
         # 回合循環
         while game.round < game.MAX_ROUNDS:
@@ -280,141 +1111,188 @@ class GameSession(object):
 
                 idx = game.current_player_idx
                 current  = self.players[idx]
-                opponent = self.players[(idx+1) % 2]
+                if current.name in self._forfeited:
+                    game.current_player_idx += 1
+                    continue
 
                 # 發送最新手牌
-                nums = ",".join(current.number_hand)
-                tools = ",".join(current.tool_hand)
                 print(format_log("%s - HAND" % current.name))
-                ConnectionManager.send_to(current, "HAND %s;%s\n" % (nums, tools))
+                ConnectionManager.send_to(current, protocol.encode("HAND", current.number_hand, current.tool_hand))
 
                 # 廣播狀態給對手
+                status_msg = protocol.encode("STATUS", current.name)
                 for p in self.players:
                     if p is not current:
                         print(format_log("%s - STATUS" % p.name))
-                        ConnectionManager.send_to(p, "STATUS %s\n" % current.name)
+                        ConnectionManager.send_to(p, status_msg)
+                self._spectate(status_msg)
+
+                # 選擇目標
+                target = self._choose_target(current)
+                if target is None or self._check_forfeit(current):
+                    if self.finished:
+                        return
+                    game.current_player_idx += 1
+                    continue
 
                 # 道具階段
                 print(format_log("%s - TOOL" % current.name))
                 current.add_action_history(action="TOOL\n")
-                ConnectionManager.send_to(current, "TOOL\n")
+                self._expect(current, "TOOL")
+                ConnectionManager.send_to(current, protocol.TOOL)
 
-                msg = self._get_cmd(current)
-                if msg is None:
+                msg = self._get_cmd(current, "TOOL")
+                if msg is None or self._check_forfeit(current):
+                    if self.finished:
+                        return
                     game.current_player_idx += 1
                     continue
 
                 extra_guess = False
                 if msg["type"] == "COMMAND" and msg["data"].isdigit():
                     ci = int(msg["data"]) - 1
-                    tool = current.tool_hand.pop(ci)
+                    tool = current.tool_hand[ci]
                     print(format_log(u"%s - 使用 %s" % (current.name, tool)))
-                    game.discard_tool.append(tool)
+                    tool_result = game.use_tool(current, target, tool)
 
                     print(format_log("%s - USED_TOOL" % current.name))
-                    ConnectionManager.send_to(current, "USED_TOOL %s\n" % tool)
+                    ConnectionManager.send_to(current, protocol.encode("USED_TOOL", tool))
                     print(format_log("BROADCAST(skip %s) - OPP_TOOL" % current.name))
-                    self.broadcast("OPP_TOOL %s %s\n" % (current.name, tool), skip=current)
+                    opp_tool_msg = protocol.encode("OPP_TOOL", current.name, tool)
+                    self.broadcast(opp_tool_msg, skip=current)
+                    self._spectate(opp_tool_msg)
 
                     if tool == "POS":
                         # POS 道具處理
                         print(format_log("%s - POS" % current.name))
                         current.add_action_history(action="POS\n")
-                        ConnectionManager.send_to(current, "POS %s %s\n" % (current.name, tool))
-
-                        pos_msg = self._get_cmd(current)
-                        if pos_msg is None:
+                        self._expect(current, "POS")
+                        ConnectionManager.send_to(current, protocol.encode("POS", current.name, tool))
+
+                        pos_msg = self._get_cmd(current, "POS")
+                        if pos_msg is None or self._check_forfeit(current):
+                            if self.finished:
+                                return
+                            game.current_player_idx += 1
                             continue
 
-                        pos = int(pos_msg["data"])
+                        # 逾時自動查看第 1 個位置
+                        pos = 1 if pos_msg["type"] == "TIMEOUT" else int(pos_msg["data"])
                         if len(self.players) < 2:
-                            ConnectionManager.send_to(current, "WINNER\n")
+                            ConnectionManager.send_to(current, protocol.encode("WINNER", current.name))
                             return
 
-                        opponent = self.players[(idx + 1) % 2]
-                        digit = ToolCard.pos(opponent.answer, pos)
+                        digit = ToolCard.pos(target.answer, pos - 1)
                         print(format_log("%s - POS_RESULT" % current.name))
-                        ConnectionManager.send_to(current, "POS_RESULT %d %s\n" % (pos, digit))
+                        ConnectionManager.send_to(current, protocol.encode("POS_RESULT", pos, digit))
 
                     elif tool == "SHUFFLE":
-                        ToolCard.shuffle(current.answer)
                         print(format_log("%s - SHUFFLE_RESULT" % current.name))
-                        ConnectionManager.send_to(current, "SHUFFLE_RESULT %s\n" % "".join(current.answer))
+                        ConnectionManager.send_to(current, protocol.encode("SHUFFLE_RESULT", tool_result))
 
                     elif tool == "EXCLUDE":
                         if len(self.players) < 2:
-                            ConnectionManager.send_to(current, "WINNER\n")
+                            ConnectionManager.send_to(current, protocol.encode("WINNER", current.name))
                             return
-                        opponent = self.players[(idx + 1) % 2]
-                        exclude_result = ToolCard.exclude(opponent.answer)
                         print(format_log("%s - EXCLUDE_RESULT" % current.name))
-                        ConnectionManager.send_to(current, "EXCLUDE_RESULT %s\n" % exclude_result)
+                        ConnectionManager.send_to(current, protocol.encode("EXCLUDE_RESULT", tool_result))
 
                     elif tool == "DOUBLE":
                         extra_guess = True
                         print(format_log("%s - DOUBLE_ACTIVE" % current.name))
-                        ConnectionManager.send_to(current, "DOUBLE_ACTIVE\n")
+                        ConnectionManager.send_to(current, protocol.DOUBLE_ACTIVE)
 
                     elif tool == "RESHUFFLE":
-                        ToolCard.reshuffle(current.number_hand, game.number_deck)
                         print(format_log("%s - RESHUFFLE_DONE" % current.name))
-                        ConnectionManager.send_to(current, "RESHUFFLE_DONE\n")
+                        ConnectionManager.send_to(current, protocol.RESHUFFLE_DONE)
+                else:
+                    game.record("TOOL", current, target)
 
                 # 猜測階段
                 guesses = 2 if extra_guess else 1
                 for _ in range(guesses):
-                    nums = ",".join(current.number_hand)
-                    tools = ",".join(current.tool_hand)
                     print(format_log("%s - HAND" % current.name))
-                    ConnectionManager.send_to(current, "HAND %s;%s\n" % (nums, tools))
+                    ConnectionManager.send_to(current, protocol.encode("HAND", current.number_hand, current.tool_hand))
                     print(format_log("%s - GUESS" % current.name))
-                    current.add_action_history(action=("GUESS %s\n" % nums))
-                    ConnectionManager.send_to(current, "GUESS %s\n" % nums)
+                    guess_prompt = protocol.encode("GUESS", current.number_hand)
+                    current.add_action_history(action=guess_prompt.decode(protocol.ENCODING))
+                    self._expect(current, "GUESS")
+                    ConnectionManager.send_to(current, guess_prompt)
 
-                    guess_msg = self._get_cmd(current)
+                    guess_msg = self._get_cmd(current, "GUESS")
                     if guess_msg is None:
                         continue
-
-                    guess = str(guess_msg["data"])
+                    if guess_msg["type"] == "TIMEOUT":
+                        if self._check_forfeit(current):
+                            break
+                        # 逾時自動以手牌前幾張出牌，並告知玩家代為出的猜測
+                        guess = "".join(current.number_hand[:game.NUM_GUESS_DIGITS])
+                        ConnectionManager.send_to(current, protocol.encode("AUTO_GUESS", guess))
+                    else:
+                        guess = str(guess_msg["data"])
                     print(format_log(u"%s - 猜了 %s" % (current.name, guess)))
-                    for d in guess:
-                        current.number_hand.remove(d)
-                        game.discard_number.append(d)
-                    game.draw_up(current)
-                    a, b = game.check_guess(opponent.answer, list(guess))
+                    a, b = game.make_guess(current, target, guess)
                     print(format_log("%s - RESULT" % current.name))
                     # RESULT 必須存放，否則GUESS如果玩家有猜完，在重連後會
-                    current.add_action_history(action="RESULT %d %d\n" % (a, b))
-                    ConnectionManager.send_to(current, "RESULT %d %d\n" % (a, b))
-                    print(format_log("%s - OPP_GUESS" % opponent.name))
-                    ConnectionManager.send_to(opponent, "OPP_GUESS %s %s %d %d\n" % (current.name, guess, a, b))
+                    result_msg = protocol.encode("RESULT", a, b)
+                    current.add_action_history(action=result_msg.decode(protocol.ENCODING))
+                    ConnectionManager.send_to(current, result_msg)
+                    print(format_log("BROADCAST(skip %s) - OPP_GUESS" % current.name))
+                    opp_guess_msg = protocol.encode("OPP_GUESS", current.name, guess, a, b)
+                    self.broadcast(opp_guess_msg, skip=current)
+                    self._spectate(opp_guess_msg)
 
                     if a == game.NUM_GUESS_DIGITS:
                         # 猜中，全部玩家廣播勝利
-                        self.broadcast("WINNER %s\n" % current.name)
+                        winner_msg = protocol.encode("WINNER", current.name)
+                        self.broadcast(winner_msg)
+                        self._spectate(winner_msg)
                         print(format_log("%s - WINNER" % "BROADCAST"))
-                        self._close_game()
+                        self._close_game(winner=current)
                         return
 
+                if self.finished:
+                    return
                 game.current_player_idx += 1
-                self._end_turn(game.to_dict())
+                self._end_turn(game.to_log())
 
             game.current_player_idx = 0
             game.round += 1
+            if config.CHECKPOINT_ROUNDS > 0 and (game.round - 1) % config.CHECKPOINT_ROUNDS == 0:
+                self._checkpoint()
 
         # 所有回合跑完，沒人猜中 → 平局
         for p in self.players:
-            ConnectionManager.send_to(p, "DRAW\n")
+            ConnectionManager.send_to(p, protocol.DRAW)
+        self._spectate(protocol.DRAW)
         self._close_game()
 
 if __name__ == "__main__":
     HOST, PORT = '0.0.0.0', 12345
-    connection_manager = ConnectionManager(HOST, PORT)
+    connection_manager = ConnectionManager(HOST, PORT, room_size=config.ROOM_SIZE)
+
+    def _shutdown(signum, frame):
+        connection_manager.drain()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    if config.METRICS_LOG_INTERVAL > 0:
+        lt = threading.Thread(target=connection_manager._metrics_logger, args=(config.METRICS_LOG_INTERVAL,))
+        lt.daemon = True
+        lt.start()
+
+    if config.LOAD_PUBLISH_INTERVAL > 0:
+        pt = threading.Thread(target=connection_manager._load_publisher, args=(config.LOAD_PUBLISH_INTERVAL,))
+        pt.daemon = True
+        pt.start()
+
+    # 暖啟動：先把 store 中尚未結束的房間重建起來
+    connection_manager.warm_restore()
 
-    # 啟動配對器 thread
-    mt = threading.Thread(target=connection_manager.match_maker)
-    mt.daemon = True
-    mt.start()
+    # 啟動配對器 thread（一般配對或賽事，見 GAME_TOURNAMENT）
+    connection_manager.start_matching(config.TOURNAMENT)
 
     # 啟動伺服器
     connection_manager.serve_forever()
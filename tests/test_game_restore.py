@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Game.from_dict 必須還原出與存檔前相同的牌局（完整快照、精簡格式、精簡格式 + checkpoint）。"""
+from __future__ import unicode_literals
+
+import copy
+import json
+
+import pytest
+
+from package.game import Game
+from package.player import Player
+
+
+def _json(data):
+    return json.loads(json.dumps(data))
+
+
+def play(seed, num_players=2, rounds=8):
+    """
+    依 seed 打 rounds 回合：輪流出現 TIMEOUT、POS / SHUFFLE 道具與一般的道具階段，每人每回合猜一次。
+
+    :return: (game, {回合: 該回合開始時的 checkpoint})
+    """
+    players = [Player("p%d" % i) for i in range(num_players)]
+    game = Game(players, seed=seed)
+    checkpoints = {}
+    for r in range(1, rounds + 1):
+        game.round = r
+        if game.can_checkpoint():
+            checkpoints[r] = _json(game.checkpoint())
+        for idx, player in enumerate(players):
+            target = players[(idx + 1) % num_players]
+            player.add_action_history("TOOL\n")
+            tools = [t for t in ("POS", "SHUFFLE") if t in player.tool_hand]
+            if (r + idx) % 3 == 0:
+                game.record("TIMEOUT", player, value="TOOL")
+            elif tools:
+                game.use_tool(player, target, tools[0])
+            else:
+                game.record("TOOL", player, target)
+            player.add_action_history("GUESS %s\n" % ",".join(player.number_hand))
+            a, b = game.make_guess(player, target, "".join(player.number_hand[:game.NUM_GUESS_DIGITS]))
+            player.add_action_history("RESULT %d %d\n" % (a, b))
+    game.round = rounds + 1
+    return game, checkpoints
+
+
+def trimmed(snapshot):
+    """精簡格式只保存每位玩家最後一個動作紀錄。"""
+    snapshot = copy.deepcopy(snapshot)
+    for p in snapshot["players"]:
+        p["action_histories"] = p["action_histories"][-1:]
+    return snapshot
+
+
+SEEDS = range(6)
+
+
+def test_played_games_cover_timeout_pos_and_shuffle():
+    kinds = set()
+    for seed in SEEDS:
+        game, _ = play(seed)
+        kinds.update((e[2], e[4]) for e in game.events)
+    assert ("TIMEOUT", "TOOL") in kinds
+    assert ("TOOL", "POS") in kinds
+    assert ("TOOL", "SHUFFLE") in kinds
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("num_players", [2, 5])
+def test_snapshot_round_trip(seed, num_players):
+    game, _ = play(seed, num_players)
+    expected = _json(game.to_dict())
+    assert Game.from_dict(_json(game.to_dict())).to_dict() == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("num_players", [2, 5])
+def test_log_round_trip(seed, num_players):
+    game, _ = play(seed, num_players)
+    expected = trimmed(_json(game.to_dict()))
+    assert Game.from_dict(_json(game.to_log())).to_dict() == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("num_players", [2, 5])
+def test_checkpoint_round_trip(seed, num_players):
+    game, checkpoints = play(seed, num_players)
+    expected = trimmed(_json(game.to_dict()))
+    log = _json(game.to_log())
+    assert checkpoints
+    for r, checkpoint in sorted(checkpoints.items()):
+        assert Game._checkpoint_matches(log, checkpoint), r
+        assert Game.from_dict(copy.deepcopy(log), checkpoint=checkpoint).to_dict() == expected, r
+
+
+def test_stale_checkpoint_is_ignored():
+    game, checkpoints = play(0)
+    other, other_checkpoints = play(1)
+    log = _json(game.to_log())
+    checkpoint = sorted(other_checkpoints.items())[-1][1]
+    assert not Game._checkpoint_matches(log, checkpoint)
+    assert Game.from_dict(log, checkpoint=checkpoint).to_dict() == trimmed(_json(game.to_dict()))